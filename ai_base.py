@@ -3,11 +3,13 @@ import abc
 
 class AIStrategy(metaclass=abc.ABCMeta):
     @abc.abstractmethod
-    def model(self, cur_board, ai_player) -> [int, int]:
+    def model(self, cur_board, ai_player, history_actions=None) -> [int, int]:
         """
         模型
         Args:
             cur_board:
+            history_actions: 对局的落子历史(GoBangGame.history_actions), 需要在两步之间复用搜索结果的模型使用
+                各模型额外的参数(如think_ms、candidates)都放在history_actions之后, 调用时按关键字传入
 
         Returns:
             落子位置
@@ -17,4 +19,20 @@ class AIStrategy(metaclass=abc.ABCMeta):
     def reset(self):
         pass
 
+    def set_think_time(self, think_ms):
+        """
+        设置之后每步的思考时间(毫秒), 由时间控制调用. 默认不做任何事, 适用于不需要思考时间的模型
+        """
+        pass
+
+    def ponder(self, cur_board, ai_player, stop_event):
+        """
+        后台思考: 轮到对手落子时继续搜索, 直到stop_event被设置, 下一次model调用时复用这部分结果
+        默认不做任何事, 与model不会同时调用
+        Args:
+            cur_board: 当前棋盘, 即对手将要落子的局面
+            stop_event: threading.Event, 被设置后应尽快返回
+        """
+        pass
+
 
@@ -0,0 +1,256 @@
+import time
+
+from ai_base import AIStrategy
+from ai_strategy.fast_board import FastBoard
+from ai_strategy.pattern import FIVE, FOUR, OPEN_FOUR
+from ai_strategy.search_stats import SearchStats
+from ai_strategy.threat_search import SearchLimit, ThreatSearch
+from ai_strategy.transposition_table import TranspositionTable
+from gobang import GoBangBoard
+
+EXACT, LOWER, UPPER = 0, 1, 2  # 置换表中分数的类型: 精确值, 下界, 上界
+
+
+class AlphaBetaStrategy(AIStrategy):
+    """
+    负极大值alpha-beta搜索模型
+    在FastBoard上原地落子和悔棋, 在时间限制内迭代加深
+    着法排序: 置换表最佳着法, 威胁等级(双方在该位置落子后的棋型), 杀手着法, 历史启发
+    对手有活三(可成活四)时只考虑防守点和我方的冲四; 对手有冲四时只能堵
+    静态评估: 双方各等级棋型点的数量按LEVEL_SCORES加权求差, 落子方的棋型乘以INITIATIVE
+    """
+    THINK_MS = 500  # 每步思考时间(毫秒)
+    MAX_DEPTH = 10
+    MOVE_NUM = 12  # 每个节点最多搜索的着法数
+    TT_SIZE = 1 << 18
+    WIN_SCORE = 1000000
+    LEVEL_SCORES = (0, 2, 6, 12, 15, 300, 1000)  # 各棋型等级的点的价值, 下标为pattern模块的等级
+    INITIATIVE = 1.5  # 落子方先手, 其棋型价值更高
+    TIME_CHECK_INTERVAL = 8  # 每搜索这么多节点检查一次时间
+    THREAT_SEARCH_RATIO = 0.25  # 威胁空间搜索最多使用的思考时间比例
+
+    def __init__(self, think_ms=THINK_MS, max_depth=MAX_DEPTH, move_num=MOVE_NUM,
+                 candidate_radius=GoBangBoard.CANDIDATE_RADIUS, tt_size=TT_SIZE, threat_search=True, callback=None,
+                 verbose=False):
+        """
+        Args:
+            think_ms: 每步思考时间(毫秒)
+            max_depth: 最大搜索深度
+            move_num: 每个节点最多搜索的着法数
+            candidate_radius: 只考虑已有棋子附近此半径内的空位置
+            tt_size: 置换表容量
+            threat_search: 是否在搜索前先做威胁空间搜索
+            callback: 每步结束后调用callback(stats)
+            verbose: 是否打印每次迭代的结果
+        """
+        self.think_ms = think_ms
+        self.max_depth = max_depth
+        self.move_num = move_num
+        self.candidate_radius = candidate_radius
+        self.tt = TranspositionTable(tt_size)  # 条目为[深度, 分数, 分数类型, 最佳着法]
+        self.threat_search = ThreatSearch() if threat_search else None
+        self.callback = callback
+        self.verbose = verbose
+        self.board = None
+        self.killers = []  # 每层的两个杀手着法
+        self.history = {}  # 位置编号 -> 历史启发分数
+        self.deadline = None
+        self.stats = SearchStats()
+        self.last_stats = None
+
+    def log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    def set_think_time(self, think_ms):
+        self.think_ms = think_ms
+
+    def reset(self):
+        self.tt.clear()
+        self.history = {}
+
+    def model(self, cur_board, ai_player, history_actions=None, think_ms=None):
+        """
+        Args:
+            think_ms: 本步思考时间(毫秒), 覆盖初始化时的设置
+
+        Returns:
+            落子位置[row, column]
+        """
+        self.stats = SearchStats()
+        think_ms = self.think_ms if think_ms is None else think_ms
+        self.deadline = self.stats.start_time + think_ms / 1000
+        tt_hit_num, tt_miss_num = self.tt.hit_num, self.tt.miss_num
+        board = self.board = FastBoard.from_position(cur_board, self.candidate_radius)
+        action = None
+        if self.threat_search is not None:
+            deadline = self.stats.start_time + think_ms * self.THREAT_SEARCH_RATIO / 1000
+            action, kind = self.threat_search.solve(board, ai_player, deadline)
+            self.stats.rule = kind
+        if action is None:
+            action = self.search(ai_player)
+        self.stats.tt_hit_num = self.tt.hit_num - tt_hit_num
+        self.stats.tt_miss_num = self.tt.miss_num - tt_miss_num
+        self.stats.action = tuple(action)
+        self.stats.total_time = time.perf_counter() - self.stats.start_time
+        self.last_stats = self.stats
+        self.log(self.stats)
+        if self.callback is not None:
+            self.callback(self.stats)
+        return list(action)
+
+    def search(self, player):
+        """
+        迭代加深搜索, 超时时返回最后一次完成的迭代中的最佳着法
+        截止时刻self.deadline从model开始时计算, 包括威胁空间搜索的耗时
+        """
+        board = self.board
+        candidates = board.get_candidates()
+        if len(candidates) == 1:
+            return candidates[0]
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        best_cell = None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, cell = self.search_root(player, depth, best_cell)
+            except SearchLimit:
+                break
+            best_cell = cell
+            self.stats.iteration_num = depth
+            self.stats.max_depth = depth
+            self.log(f"深度{depth}, 最佳着法{board.get_point(cell)}, 分数{score}, 节点数{self.stats.node_num}")
+            if abs(score) >= self.WIN_SCORE - self.max_depth * 2:  # 已找到必胜或必败
+                break
+        if best_cell is None:  # 第一层都未完成, 按排序取第一个着法
+            best_cell = self.order_moves(player, 0, None)[0]
+        return board.get_point(best_cell)
+
+    def search_root(self, player, depth, first_cell):
+        board = self.board
+        other = 1 if player == 2 else 2
+        alpha, beta = -self.WIN_SCORE - 1, self.WIN_SCORE + 1
+        best_cell = None
+        for cell in self.order_moves(player, 0, first_cell):
+            if time.perf_counter() > self.deadline:  # 根节点的每个着法之间都检查时间
+                raise SearchLimit()
+            board.put(player, board.get_point(cell))
+            try:
+                score = -self.negamax(other, depth - 1, -beta, -alpha, 1)
+            finally:
+                board.undo()
+            if best_cell is None or score > alpha:
+                alpha = score
+                best_cell = cell
+        self.tt.put(board.hash, [depth, alpha, EXACT, best_cell])
+        return alpha, best_cell
+
+    def negamax(self, player, depth, alpha, beta, ply):
+        """
+        Returns:
+            player(落子方)视角的分数
+        """
+        stats = self.stats
+        stats.node_num += 1
+        if stats.node_num % self.TIME_CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchLimit()
+        board = self.board
+        if board.win:  # 对手上一步成五
+            return -self.WIN_SCORE + ply
+        if board.empty_num == 0:
+            return 0
+        other = 1 if player == 2 else 2
+        own = board.threats[player]
+        opp = board.threats[other]
+        if own[FIVE]:
+            return self.WIN_SCORE - ply - 1
+        if own[OPEN_FOUR] and not opp[FIVE]:
+            return self.WIN_SCORE - ply - 3
+        if depth <= 0:
+            return self.evaluate(player)
+        alpha_origin = alpha
+        entry = self.tt.get(board.hash)
+        tt_cell = None
+        if entry is not None:
+            entry_depth, score, flag, tt_cell = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                elif flag == UPPER:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+        best_score = -self.WIN_SCORE - 1
+        best_cell = None
+        for cell in self.order_moves(player, ply, tt_cell):
+            board.put(player, board.get_point(cell))
+            try:
+                score = -self.negamax(other, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.undo()
+            if score > best_score:
+                best_score = score
+                best_cell = cell
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                # 剪枝: 记录杀手着法和历史启发
+                killers = self.killers[ply] if ply < len(self.killers) else None
+                if killers is not None and killers[0] != cell:
+                    killers[1] = killers[0]
+                    killers[0] = cell
+                self.history[cell] = self.history.get(cell, 0) + depth * depth
+                break
+        if best_score <= alpha_origin:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.put(board.hash, [depth, best_score, flag, best_cell])
+        return best_score
+
+    def order_moves(self, player, ply, tt_cell):
+        """
+        生成并排序着法, 返回位置编号列表
+        我方可成五时只下成五点; 对手有冲四时只能堵; 对手有活三时只考虑其成活四、冲四的点和我方的冲四、活四
+        """
+        board = self.board
+        other = 1 if player == 2 else 2
+        own = board.threats[player]
+        opp = board.threats[other]
+        if own[FIVE]:
+            return sorted(own[FIVE])
+        if opp[FIVE]:
+            return sorted(opp[FIVE])
+        if opp[OPEN_FOUR]:
+            cells = opp[OPEN_FOUR] | opp[FOUR] | own[FOUR] | own[OPEN_FOUR]
+        else:
+            cells = [board.get_index(row, column) for row, column in board.get_candidates()]
+        own_level = board.cell_level[player]
+        opp_level = board.cell_level[other]
+        killers = self.killers[ply] if ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def key(cell):
+            if cell == tt_cell:
+                return 1 << 30,
+            return (max(own_level[cell], opp_level[cell]), own_level[cell], cell in killers,
+                    history.get(cell, 0))
+
+        cells = sorted(cells, key=key, reverse=True)
+        return cells[:self.move_num]
+
+    def evaluate(self, player):
+        """
+        静态评估, player(落子方)视角
+        """
+        board = self.board
+        other = 1 if player == 2 else 2
+        own = board.threats[player]
+        opp = board.threats[other]
+        scores = self.LEVEL_SCORES
+        own_score = sum(scores[level] * len(own[level]) for level in range(1, FIVE + 1))
+        opp_score = sum(scores[level] * len(opp[level]) for level in range(1, FIVE + 1))
+        return int(own_score * self.INITIATIVE - opp_score)
@@ -0,0 +1,250 @@
+import random
+
+from ai_strategy.pattern import FIVE, FOUR, OFFSETS, OPEN_FOUR, POWERS, get_pattern_table
+from gobang import BOARD_SIZE, GoBangBoard, get_zobrist_table
+
+WALL = 3  # 棋盘外
+PAD = 4  # 棋盘四周填充的棋盘外位置数, 保证每个位置左右各4格的线段都不越界
+
+
+class FastBoard(GoBangBoard):
+    """
+    增量维护棋型的紧凑棋盘, 用于MCTS的搜索棋盘和快速仿真
+    棋盘展开为一维列表, 四周各填充PAD格棋盘外位置, 第row行第column列的下标为(row + PAD) * stride + column + PAD
+    对每个位置、每个方向、每个玩家维护pattern模块中的三进制线段编码,
+    落子和悔棋时只更新经过该位置的四条线上前后各4格的编码, 再查表得到棋型等级
+    threats[player][level]为player落子后最高棋型等级为level的空位置集合
+    position为按需生成的只读列表视图
+    """
+
+    def __init__(self, height=BOARD_SIZE, width=BOARD_SIZE, candidate_radius=GoBangBoard.CANDIDATE_RADIUS):
+        self.candidate_radius = candidate_radius
+        self.height = height
+        self.width = width
+        self.stride = width + PAD
+        self.steps = (1, self.stride, self.stride + 1, 1 - self.stride)  # 四个方向在一维下标上的步长
+        size = (height + 2 * PAD + 1) * self.stride  # 末尾多留一行, 右下角斜向越界时仍落在棋盘外
+        self.cells = [WALL] * size
+        for row in range(height):
+            for column in range(width):
+                self.cells[self.get_index(row, column)] = 0
+        self.table = get_pattern_table().tolist()
+        # 各方向线段编码, 下标为cell * 4 + 方向. 棋盘外对双方都是阻挡
+        index = [0] * (size * 4)
+        for cell in range(size):
+            if self.cells[cell] == WALL:
+                continue
+            for d, step in enumerate(self.steps):
+                for offset, power in zip(OFFSETS, POWERS):
+                    if self.cells[cell + offset * step] == WALL:
+                        index[cell * 4 + d] += 2 * power
+        self.index = [None, index, index.copy()]
+        self.dir_level = [None, [0] * (size * 4), [0] * (size * 4)]
+        self.cell_level = [None, [0] * size, [0] * size]
+        self.threats = [None] + [[set() for _ in range(FIVE + 1)] for _ in range(2)]
+        for cell in range(size):
+            if self.cells[cell] == 0:
+                for player in (1, 2):
+                    self.refresh_cell(player, cell)
+        self.round_num = 0
+        self.empty_num = height * width
+        self.moves = []
+        self.win = False  # 最后一步是否成五
+        self.rollout_step_num = 0  # rollout累计落子步数
+        self._position = None
+        self.neighbor_num = [[0 for _ in range(width)] for _ in range(height)]
+        self.clear_candidates()
+        self.zobrist = get_zobrist_table(height, width)
+        self.hash = 0
+
+    def get_index(self, row, column):
+        return (row + PAD) * self.stride + column + PAD
+
+    def get_point(self, cell):
+        row, column = divmod(cell, self.stride)
+        return row - PAD, column - PAD
+
+    @property
+    def position(self):
+        if self._position is None:
+            self._position = [[self.cells[self.get_index(row, column)] for column in range(self.width)]
+                              for row in range(self.height)]
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        self.__init__(len(position), len(position[0]), self.candidate_radius)
+        for row, line in enumerate(position):
+            for column, player in enumerate(line):
+                if player != 0:
+                    self.put(player, (row, column))
+        self.moves = []
+
+    def is_empty(self, row, column):
+        return self.cells[self.get_index(row, column)] == 0
+
+    def clear_candidates(self):
+        # 候选落点同时保存为列表, 便于O(1)随机选择
+        self.candidates = {}  # 位置 -> 在candidate_list中的下标
+        self.candidate_list = []
+
+    def add_candidate(self, point):
+        if point not in self.candidates:
+            self.candidates[point] = len(self.candidate_list)
+            self.candidate_list.append(point)
+
+    def discard_candidate(self, point):
+        i = self.candidates.pop(point, None)
+        if i is not None:
+            last = self.candidate_list.pop()
+            if i < len(self.candidate_list):
+                self.candidate_list[i] = last
+                self.candidates[last] = i
+
+    def refresh_cell(self, player, cell):
+        """
+        重新查表计算空位置cell的各方向棋型及最高棋型, 并更新threats
+        """
+        index = self.index[player]
+        dir_level = self.dir_level[player]
+        table = self.table
+        base = cell * 4
+        level = 0
+        for d in range(4):
+            dir_level[base + d] = table[index[base + d]]
+            if dir_level[base + d] > level:
+                level = dir_level[base + d]
+        old_level = self.cell_level[player][cell]
+        if level != old_level:
+            threats = self.threats[player]
+            if old_level:
+                threats[old_level].discard(cell)
+            if level:
+                threats[level].add(cell)
+            self.cell_level[player][cell] = level
+
+    def update_lines(self, cell, player, sign):
+        """
+        cell处落下(sign=1)或撤销(sign=-1)player的棋子后, 更新四条线上前后各4格的编码和棋型
+        """
+        other = 1 if player == 2 else 2
+        own_index = self.index[player]
+        other_index = self.index[other]
+        cells = self.cells
+        for d, step in enumerate(self.steps):
+            for offset, power in zip(OFFSETS, POWERS):
+                neighbor = cell - offset * step  # cell位于neighbor线段的offset处
+                if cells[neighbor] == WALL:
+                    continue
+                i = neighbor * 4 + d
+                own_index[i] += sign * power
+                other_index[i] += sign * 2 * power
+                if cells[neighbor] == 0:
+                    self.refresh_cell(player, neighbor)
+                    self.refresh_cell(other, neighbor)
+
+    def put(self, player, position):
+        """
+        落子
+        """
+        row, column = position
+        assert 0 <= row < self.height
+        assert 0 <= column < self.width
+        cell = self.get_index(row, column)
+        if self.cells[cell] != 0:
+            raise ValueError(f"{row,column}处已有棋子")
+        self.win = self.cell_level[player][cell] == FIVE
+        self.cells[cell] = player
+        for p in (1, 2):
+            level = self.cell_level[p][cell]
+            if level:
+                self.threats[p][level].discard(cell)
+                self.cell_level[p][cell] = 0
+        self.update_lines(cell, player, 1)
+        self.round_num += 1
+        self.empty_num -= 1
+        self.moves.append(position)
+        self.hash ^= self.zobrist[player][row * self.width + column]
+        self._position = None
+        self.update_candidates(row, column, 1)
+
+    def undo(self):
+        position = self.moves.pop()
+        row, column = position
+        cell = self.get_index(row, column)
+        player = self.cells[cell]
+        self.cells[cell] = 0
+        self.update_lines(cell, player, -1)
+        for p in (1, 2):
+            self.refresh_cell(p, cell)
+        self.round_num -= 1
+        self.empty_num += 1
+        self.win = False
+        self.hash ^= self.zobrist[player][row * self.width + column]
+        self._position = None
+        self.update_candidates(row, column, -1)
+        return position
+
+    def check_winner_last(self, position, n=5):
+        """
+        最后一步的胜负已在落子时查表得到, 只有成五时才需要生成连续位置列表
+        """
+        if n != 5 or len(self.moves) == 0 or tuple(self.moves[-1]) != tuple(position):
+            return super().check_winner_last(position, n)
+        if self.win:
+            return super().check_winner_last(position, n)
+        return (0 if self.empty_num == 0 else None), []
+
+    def try_vcf(self, solver, player, node_limit, four_num):
+        four_num[player] = len(self.threats[player][FOUR])
+        return solver.vcf(self, player, node_limit) is not None
+
+    def rollout(self, player, depth, solver=None, node_limit=64):
+        """
+        从当前局面由player开始按规则对弈, 直到游戏结束或达到depth步, 结束后悔棋恢复局面
+        每步依次尝试: 我方成五, 堵对手成五, 我方成活四, 堵对手成活四, 在候选落点中随机落子
+        设置了solver(ThreatSearch)时, 随机落子前若我方冲四点不少于2个且比上次尝试时多, 先做node_limit个节点以内的VCF,
+        找到则判我方获胜, 直接结束仿真
+        Returns:
+            胜者, 和棋为0, 未分出胜负为None
+        """
+        winner = None
+        step = 0
+        four_num = [None, 1, 1]  # 双方上次尝试VCF时的冲四点数
+        while step < depth:
+            other = 1 if player == 2 else 2
+            own_threats = self.threats[player]
+            other_threats = self.threats[other]
+            if own_threats[FIVE]:
+                cell = next(iter(own_threats[FIVE]))
+            elif other_threats[FIVE]:
+                cell = next(iter(other_threats[FIVE]))
+            elif own_threats[OPEN_FOUR]:
+                cell = next(iter(own_threats[OPEN_FOUR]))
+            elif other_threats[OPEN_FOUR]:
+                cell = next(iter(other_threats[OPEN_FOUR]))
+            elif solver is not None and len(own_threats[FOUR]) > four_num[player] and \
+                    self.try_vcf(solver, player, node_limit, four_num):
+                winner = player
+                break
+            elif self.candidate_list:
+                cell = None
+                row, column = self.candidate_list[random.randrange(len(self.candidate_list))]
+            else:
+                cell = None
+                row, column = random.choice(self.get_candidates())
+            if cell is not None:
+                row, column = self.get_point(cell)
+            self.put(player, (row, column))
+            step += 1
+            if self.win:
+                winner = player
+                break
+            if self.empty_num == 0:
+                winner = 0
+                break
+            player = other
+        for _ in range(step):
+            self.undo()
+        self.rollout_step_num += step
+        return winner
@@ -1,226 +1,657 @@
+import heapq
 import random
-from copy import copy, deepcopy
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 
 from ai_base import AIStrategy
+from ai_strategy.fast_board import FastBoard
+from ai_strategy.opening_book import OpeningBook
 from ai_strategy.rule_strategy import RuleStrategy
-from gobang import GoBangGame
+from ai_strategy.search_stats import Profiler, SearchStats
+from ai_strategy.threat_search import ThreatSearch
+from ai_strategy.transposition_table import TranspositionTable
+from gobang import GoBangBoard, GoBangGame, get_zobrist_table
 
 random.seed(1)
 
 
-class Node:
-    def __init__(self, player):
-        self.player = player
-        self.child_node = []
-        self.action = []  # 表示下棋的动作,没有在每个节点都保存棋盘,而是从根节点开始往下推演棋盘,否则内存过大
-        self.parent_node = None
-        self.visit_num = 0  # 访问次数
-        self.win_num = 0  # 获胜次数
-        self.if_win = None  # 1表示胜利,0表示未胜利,None表示无法判断
+NODE_FIELDS = ("player", "action", "parent", "first_child", "child_num", "visit_num", "win_num", "prior_visit",
+               "prior_win", "if_win", "hash")
 
 
 class Tree:
-    def __init__(self, cur_player):
-        self.root_node = Node(cur_player)
+    """
+    数组形式存储的搜索树
+    节点用整数编号表示,各项统计量保存在预分配的numpy数组中,容量不足时按2倍扩容
+    同一节点的所有子节点编号连续,由first_child和child_num确定
+    节点只保存下棋的动作,没有在每个节点都保存棋盘,而是在搜索棋盘上沿途落子和悔棋推演棋盘,否则内存过大
+    """
+    INIT_CAPACITY = 1024
+
+    def __init__(self, cur_player, width):
+        """
+        Args:
+            cur_player: 根节点局面中最后落子的玩家
+            width: 棋盘列数, 用于将动作编码为row * width + column
+        """
+        self.width = width
+        self.size = 0  # 已使用的节点数
+        capacity = self.INIT_CAPACITY
+        self.player = np.zeros(capacity, dtype=np.int8)  # 执行动作的玩家
+        self.action = np.zeros(capacity, dtype=np.int32)  # 动作编码, -1表示无动作
+        self.parent = np.zeros(capacity, dtype=np.int32)  # 父节点, -1表示无父节点
+        self.first_child = np.zeros(capacity, dtype=np.int32)  # 第一个子节点
+        self.child_num = np.zeros(capacity, dtype=np.int32)  # 子节点数
+        self.visit_num = np.zeros(capacity, dtype=np.int32)  # 访问次数
+        self.win_num = np.zeros(capacity, dtype=np.int32)  # 获胜次数
+        self.prior_visit = np.zeros(capacity, dtype=np.int32)  # 从置换表继承的访问次数, 只作为UCB的先验
+        self.prior_win = np.zeros(capacity, dtype=np.int32)  # 从置换表继承的获胜次数
+        self.if_win = np.zeros(capacity, dtype=np.int8)  # 1表示胜利,0表示未胜利,-1表示无法判断
+        self.hash = np.zeros(capacity, dtype=np.uint64)  # 节点局面的Zobrist哈希值
+        self.root_node = self.add_nodes(-1, cur_player, [-1])
+
+    def grow(self, capacity):
+        for name in NODE_FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_nodes(self, parent, player, actions):
+        """
+        连续新增一组节点
+        Returns:
+            第一个新节点的编号
+        """
+        begin = self.size
+        end = begin + len(actions)
+        if end > len(self.player):
+            self.grow(max(end, len(self.player) * 2))
+        self.player[begin:end] = player
+        self.action[begin:end] = actions
+        self.parent[begin:end] = parent
+        self.first_child[begin:end] = 0
+        self.child_num[begin:end] = 0
+        self.visit_num[begin:end] = 0
+        self.win_num[begin:end] = 0
+        self.prior_visit[begin:end] = 0
+        self.prior_win[begin:end] = 0
+        self.if_win[begin:end] = -1
+        self.hash[begin:end] = 0
+        self.size = end
+        return begin
+
+    def add_children(self, node, actions, hashes=None):
+        """
+        为没有子节点的node扩展子节点
+        Args:
+            actions: 动作列表, 每个动作为(row, column)
+            hashes: 子节点局面的哈希值
+        """
+        player = 1 if self.player[node] == 2 else 2
+        first_child = self.add_nodes(node, player, [row * self.width + column for row, column in actions])
+        self.first_child[node] = first_child
+        self.child_num[node] = len(actions)
+        if hashes is not None:
+            self.hash[first_child:first_child + len(actions)] = hashes
+
+    def children(self, node):
+        first_child = self.first_child[node]
+        return range(first_child, first_child + self.child_num[node])
+
+    def get_action(self, node):
+        return divmod(int(self.action[node]), self.width)
+
+    def get_path(self, node, root_node):
+        """
+        Returns:
+            从root_node走到node沿途的[(玩家, 动作), ...]
+        """
+        path = []
+        while node != root_node:
+            path.append((int(self.player[node]), self.get_action(node)))
+            node = self.parent[node]
+        return path[::-1]
+
+    def find_child(self, node, action):
+        """
+        查找动作为action的子节点, 不存在时返回None
+        """
+        first_child = self.first_child[node]
+        code = action[0] * self.width + action[1]
+        idx = np.flatnonzero(self.action[first_child:first_child + self.child_num[node]] == code)
+        if len(idx) == 0:
+            return None
+        return first_child + int(idx[0])
+
+    def get_size_depth(self):
+        """
+        Returns:
+            根节点子树的节点数, 子树中节点的最大深度
+        """
+        # 子节点编号总大于父节点, 逐层由父节点深度推出子节点深度, 不在根节点子树中的节点深度为-1
+        parent = self.parent[:self.size]
+        depth = np.full(self.size, -1, dtype=np.int32)
+        depth[self.root_node] = 0
+        has_parent = parent >= 0
+        while 1:
+            parent_depth = depth[parent[has_parent]]
+            new_depth = depth.copy()
+            new_depth[has_parent] = np.where(parent_depth >= 0, parent_depth + 1, -1)
+            new_depth[self.root_node] = 0
+            if np.array_equal(new_depth, depth):
+                break
+            depth = new_depth
+        return int((depth >= 0).sum()), int(depth.max())
 
     def trim(self, node):
         self.root_node = node
-        self.root_node.parent_node = None
+        self.parent[node] = -1
+
+    def append_child(self, node, action, child_hash=0):
+        """
+        为已有子节点的node追加一个子节点
+        子节点编号需连续, 因此将原有子节点整体搬到末尾并在其后追加, 原位置成为无用节点, 在compact时回收
+        Returns:
+            新子节点的编号
+        """
+        first_child, child_num = int(self.first_child[node]), int(self.child_num[node])
+        player = 1 if self.player[node] == 2 else 2
+        begin = self.add_nodes(node, player, [-1] * (child_num + 1))
+        for name in NODE_FIELDS:
+            array = getattr(self, name)
+            array[begin:begin + child_num] = array[first_child:first_child + child_num]
+        self.parent[begin:begin + child_num] = node
+        self.parent[first_child:first_child + child_num] = -1  # 原位置不再属于任何子树
+        for i in range(child_num):  # 孙节点指向搬迁后的父节点
+            grandchild_num = self.child_num[begin + i]
+            if grandchild_num > 0:
+                grandchild = self.first_child[begin + i]
+                self.parent[grandchild:grandchild + grandchild_num] = begin + i
+        new_node = begin + child_num
+        self.action[new_node] = action[0] * self.width + action[1]
+        self.hash[new_node] = child_hash
+        self.first_child[node] = begin
+        self.child_num[node] = child_num + 1
+        return new_node
+
+    def compact(self, max_nodes):
+        """
+        只保留根节点子树并重新编号, 回收trim和append_child留下的无用节点
+        从根节点开始按访问次数从高到低依次保留各节点的子节点, 总数将超过max_nodes时不再保留该节点的子树,
+        即剪掉访问次数最少的子树, 被剪掉子树的节点成为叶子节点, 保留自身的统计量, 之后可以重新扩展
+        保留的节点按加入顺序编号, 根节点为0, 同一节点的子节点编号仍连续且大于父节点
+        Returns:
+            保留的节点数
+        """
+        old_ids = [self.root_node]  # 新编号 -> 原编号
+        expanded = []  # 保留了子节点的节点: (新编号, 子节点的新起始编号, 子节点数)
+        heap = [(-int(self.visit_num[self.root_node]), 0)]
+        while heap:
+            _, new_node = heapq.heappop(heap)
+            node = old_ids[new_node]
+            child_num = int(self.child_num[node])
+            if len(old_ids) + child_num > max_nodes:
+                continue
+            first_child = int(self.first_child[node])
+            begin = len(old_ids)
+            expanded.append((new_node, begin, child_num))
+            old_ids.extend(range(first_child, first_child + child_num))
+            for i in range(child_num):
+                if self.child_num[first_child + i] > 0:
+                    heapq.heappush(heap, (-int(self.visit_num[first_child + i]), begin + i))
+        size = len(old_ids)
+        old_ids = np.array(old_ids, dtype=np.int64)
+        new_ids = np.full(self.size, -1, dtype=np.int32)  # 原编号 -> 新编号
+        new_ids[old_ids] = np.arange(size, dtype=np.int32)
+        for name in NODE_FIELDS:
+            array = getattr(self, name)
+            array[:size] = array[old_ids]
+        self.parent[1:size] = new_ids[self.parent[1:size]]
+        self.parent[0] = -1
+        self.first_child[:size] = 0
+        self.child_num[:size] = 0
+        if expanded:
+            nodes, first_child, child_num = np.array(expanded, dtype=np.int64).T
+            self.first_child[nodes] = first_child
+            self.child_num[nodes] = child_num
+        self.root_node = 0
+        self.size = size
+        return size
 
 
 class MCTSStrategy(AIStrategy):
     """
     MCTS(蒙特卡洛树搜索)模型
-
+    搜索预算有两种模式:
+    (1)时间预算: think_ms毫秒内尽可能多地迭代,到时返回当前最优落点
+    (2)迭代预算: 固定迭代simulation_times次
+    两者同时设置时任一耗尽即停止;都未设置时迭代SIMULATION_TIMES次
+    当访问次数最多的子节点领先第二名的次数超过剩余可迭代次数时提前停止
+    置换表以局面哈希值记录累计的访问次数、获胜次数和胜负状态:
+    扩展时新节点从置换表继承同一局面经其他落子顺序积累的统计量, 回溯时同时更新置换表;
+    继承的访问次数和获胜次数只作为UCB的先验, 不计入visit_num和win_num, 提前停止和最终选择只看本树的访问次数.
+    先验只在扩展时读取一次, 之后同一局面的不同节点各自统计, 即仍是树而不是共享统计量的DAG:
+    选择时逐个读取条目会让子节点的访问次数超过父节点, 也无法对子节点数组做向量化的UCB计算.
+    回溯仍把结果累加到置换表条目, 因此之后扩展出的同一局面的节点能继承到此前所有路径的累计值
+    workers大于1时使用根并行: 在进程池中以不同随机种子从同一根节点独立搜索,
+    合并各进程根节点子节点的visit_num和win_num后再做决策, 上述预算均为每个进程的预算
+    batch_size大于1时使用叶并行: 每步借助虚拟损失选出batch_size个不同的叶子节点, 一起仿真后统一回溯,
+    此时若workers大于1, 一个批次的仿真在进程池中并行执行
+    设置了开局库时, 每步先查询开局库, 命中则不做搜索
+    规则未命中时先做威胁空间搜索(ThreatSearch), 找到VCF/VCT取胜或必须防守的落点则不做搜索,
+    仿真中我方有冲四点时也会做小规模的VCF
+    ponder在对手思考时从当前根节点(对手待落子的局面)继续迭代, 对手落子后move_root保留对应子树, 这部分访问次数在下一步中复用
+    每步按传入的落子历史(history_actions)把根节点依次走过双方的落子, 保留两步之间的搜索结果;
+    节点数超过max_nodes时压缩搜索树, 回收不在根节点子树中的节点并剪掉访问次数最少的子树
+    每步的搜索统计(SearchStats)保存在last_stats中, 设置了callback时每步结束后以其为参数调用callback
     """
     SIMULATION_DEPTH = 20
     SIMULATION_TIMES = 10
+    VIRTUAL_LOSS = 1  # 叶并行时每个待仿真叶子节点沿途增加的虚拟访问次数
+    TT_SIZE = 1 << 18  # 置换表默认容量
+    ROLLOUT_VCF_NODES = 16  # 仿真中每次VCF的节点数上限
+    THREAT_SEARCH_RATIO = 0.25  # 威胁空间搜索最多使用的思考时间比例
+    PONDER_TIMES = 16  # 后台思考时每次检查停止信号之间的迭代次数
     UCB_C = np.log(2)
-    cur_board = None
+    MAX_NODES = 1 << 20  # 搜索树节点数上限
+    PRUNE_RATIO = 0.5  # 超过上限时压缩到的比例
+    search_board = None  # 搜索棋盘(FastBoard),选择/扩展/仿真阶段原地落子,回溯阶段逐步悔棋恢复到根节点
     tree = None
+    history = None  # 搜索树已走过的动作(从空棋盘开始), 不知道时为None
 
-    def reconstruct_board(self, node):
+    def __init__(self, think_ms=None, simulation_times=None, workers=None, batch_size=None,
+                 candidate_radius=GoBangBoard.CANDIDATE_RADIUS, tt_size=TT_SIZE, callback=None, verbose=False,
+                 profile=False, book=None, threat_search=True, max_nodes=MAX_NODES):
         """
-        从节点往上追溯到根节点,叠加所有动作重建棋盘
+        Args:
+            think_ms: 每步思考时间(毫秒)
+            simulation_times: 每步迭代次数
+            workers: 并行的进程数, None或1表示单进程搜索
+            batch_size: 叶并行每批次的叶子节点数, None或1表示不使用叶并行
+            candidate_radius: 扩展和仿真时只考虑已有棋子附近此半径内的空位置
+            tt_size: 置换表容量, None或0表示不使用置换表
+            callback: 每步结束后调用callback(stats)
+            verbose: 是否打印搜索过程
+            profile: 是否用cProfile统计搜索耗时, 报告保存在stats.profile_report中
+            book: 开局库文件路径, None表示不使用开局库
+            threat_search: 是否在搜索前和仿真中使用威胁空间搜索
+            max_nodes: 搜索树节点数上限, 超过时剪掉访问次数最少的子树, None表示不限制
         """
-        node_list = []
-        cur_node = node
-        while self.tree.root_node != cur_node:
-            node_list.append(node)
-            cur_node = cur_node.parent_node
-        cur_board = deepcopy(self.cur_board)
-        for node in node_list:
-            x, y = node.action
-            cur_board[x][y] = node.player
-        return cur_board
-
-    def ucb(self, v, n, n_parent):
-        if n == 0 or n_parent == 0:
-            return 999999
-        if v == 0:
-            return 0
-        return v / n + self.UCB_C * np.sqrt(np.log(n_parent) / n)
+        self.think_ms = think_ms
+        self.simulation_times = simulation_times
+        self.workers = workers
+        self.batch_size = batch_size
+        self.candidate_radius = candidate_radius
+        self.tt = TranspositionTable(tt_size) if tt_size else None  # 置换表, 条目为[访问次数, 获胜次数, 胜负状态]
+        self.executor = None  # 根并行进程池,首次使用时创建
+        self.callback = callback
+        self.verbose = verbose
+        self.profile = profile
+        self.book = OpeningBook(book) if book else None
+        self.threat_search = ThreatSearch() if threat_search else None
+        self.max_nodes = max_nodes
+        self.stats = SearchStats()  # 当前这一步的统计
+        self.last_stats = None  # 上一步的统计
+
+    def log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    @property
+    def cur_board(self):
+        """
+        搜索棋盘当前局面的列表视图, 不在搜索过程中时即根节点棋盘. 尚未开始对局时为None
+        """
+        if self.search_board is None:
+            return None
+        return self.search_board.position
 
     def get_child_max_ucb(self, node):
-        ucb_list = []
-        child_node_list = node.child_node
-        if len(child_node_list) == 0:  # 如果当前是叶子节点则停止搜索
+        """
+        一次向量化计算node所有子节点的UCB值,返回UCB值最大的子节点,多个最大值时随机选择
+        子节点的访问次数和获胜次数包含从置换表继承的先验, 父节点的访问次数包含其所有子节点的先验
+        未访问过的子节点UCB值为999999, 获胜次数为0的子节点UCB值为0
+        """
+        tree = self.tree
+        child_num = tree.child_num[node]
+        if child_num == 0:  # 如果当前是叶子节点则停止搜索
             return
-        for i, child_node in enumerate(node.child_node):
-            visit_num = child_node.visit_num
-            if visit_num == 0:
-                ucb_list.append(999999)
-            else:
-                ucb = self.ucb(child_node.win_num, visit_num, node.visit_num)
-                ucb_list.append(ucb)
-        max_value = max(ucb_list)
-        idx_max = np.array(ucb_list) == max_value
-        # idx_max = np.array(ucb_list).argmax()
-        new_node = random.choice(np.array(child_node_list)[idx_max])
-        rank = np.argsort(ucb_list)
-        for i in rank[-1:-6:-1]:
-            print(f"{child_node_list[i].action}-{ucb_list[i]}")
-        return new_node
+        first_child = tree.first_child[node]
+        prior_visit = tree.prior_visit[first_child:first_child + child_num]
+        v = tree.win_num[first_child:first_child + child_num] + tree.prior_win[first_child:first_child + child_num]
+        n = tree.visit_num[first_child:first_child + child_num] + prior_visit
+        n_parent = tree.visit_num[node] + prior_visit.sum()
+        n_safe = np.maximum(n, 1)
+        ucb = v / n_safe + self.UCB_C * np.sqrt(np.log(max(n_parent, 1)) / n_safe)
+        ucb[v == 0] = 0
+        if n_parent == 0:
+            ucb[:] = 999999
+        ucb[n == 0] = 999999
+        idx_max = np.flatnonzero(ucb == ucb.max())
+        return first_child + int(idx_max[random.randrange(len(idx_max))])
 
-    def selection(self, node: Node):
+    def selection(self, node):
         """
         根据UCB选择最佳的节点,直到叶子节点.如果没有子节点则返回自己
         """
-        child_node_list = node.child_node
-        # 如果没有子节点则跳过
-        if len(child_node_list) == 0:
-            return node
         # 循环找到叶子节点
         while 1:
-            print("-" * 20)
-            print("Selection阶段,寻找最优子节点")
             child_node = self.get_child_max_ucb(node)
-            print("-" * 20)
             if child_node is None:
                 break
             node = child_node
+            self.search_board.put(int(self.tree.player[node]), self.tree.get_action(node))
         return node
 
-    def expansion(self, node: Node):
+    def expansion(self, node):
         """
         如果选择的节点不是叶子节点或当前胜负已分则不需要扩展
-        遍历棋盘所有空的位置设置为其子节点
+        将搜索棋盘的所有候选落点设置为其子节点,并在搜索棋盘上落下随机选中的子节点
         """
-        if len(node.child_node) > 0:
+        tree = self.tree
+        if tree.child_num[node] > 0:
             return node
         self.set_node_win(node)
-        if node.if_win:
+        if tree.if_win[node] == 1:
             return node
-        # 取当前所有的空位置
-        cur_player = node.player
-        next_player = 1 if cur_player == 2 else 2
-        for i in range(len(self.cur_board)):
-            for j in range(len(self.cur_board)):
-                if self.cur_board[i][j] == 0:
-                    new_node = Node(next_player)
-                    new_node.parent_node = node
-                    new_node.action = (i, j)
-                    node.child_node.append(new_node)
-        return random.choice(node.child_node)
+        # 取当前所有的候选落点
+        actions = sorted(self.search_board.get_candidates())
+        hashes = self.child_hashes(node, actions)
+        tree.add_children(node, actions, hashes)
+        self.stats.node_num += len(actions)
+        if self.tt is not None:  # 从置换表继承统计量作为先验, 只在扩展时读取一次
+            for child, key in zip(tree.children(node), hashes.tolist()):
+                entry = self.tt.get(key)
+                if entry is not None:
+                    tree.prior_visit[child], tree.prior_win[child], tree.if_win[child] = entry
+        new_node = int(tree.first_child[node]) + random.randrange(len(actions))
+        self.search_board.put(int(tree.player[new_node]), tree.get_action(new_node))
+        return new_node
 
     def set_node_win(self, node):
-        if node.if_win is not None:
+        """
+        判断节点胜负,调用时搜索棋盘需处于该节点的局面
+        """
+        tree = self.tree
+        if tree.if_win[node] != -1:
             return
-        cur_board = self.reconstruct_board(node)
-        g = GoBangGame()
-        winner, _ = g.check_winner(cur_board, node.player)
+        entry = None
+        if self.tt is not None:
+            key = int(tree.hash[node])
+            entry = self.tt.get(key)
+            if entry is None:
+                entry = [0, 0, -1]
+                self.tt.put(key, entry)
+            elif entry[2] != -1:
+                tree.if_win[node] = entry[2]
+                return
+        if tree.action[node] == -1:  # 初始根节点没有动作,只能全盘判断
+            winner, _ = GoBangGame.check_winner(self.cur_board, int(tree.player[node]))
+        else:
+            winner, _ = self.search_board.check_winner_last(tree.get_action(node))
         if winner is None:
-            node.if_win = False
+            tree.if_win[node] = 0
         elif winner == 0:
-            node.if_win = True
+            tree.if_win[node] = 1
         else:
-            node.if_win = True
+            tree.if_win[node] = 1
+        if entry is not None:
+            entry[2] = int(tree.if_win[node])
+
+    def child_hashes(self, node, actions):
+        """
+        由搜索棋盘当前的哈希值计算node各个子节点局面的哈希值, 调用时搜索棋盘需处于node的局面
+        """
+        player = 1 if self.tree.player[node] == 2 else 2
+        codes = [row * self.tree.width + column for row, column in actions]
+        return np.uint64(self.search_board.hash) ^ self.zobrist[player][codes]
 
-    def simulation(self, node: Node):
+    def simulation(self, node):
         """
         从扩展的子节点做模拟,直到游戏结束或达到预设的深度
+        模拟时直接在搜索棋盘上落子,结束后悔棋恢复到该节点的局面
         """
+        tree = self.tree
+        player = int(tree.player[node])
         # 查看当前节点是否获胜
         self.set_node_win(node)
-        if node.if_win:
-            print(f"当前模拟节点{node.action},已分出胜负,胜者为{node.player}")
-            return node.player
-        cur_board = self.reconstruct_board(node)
-        g = GoBangGame()
-        next_player = 1 if node.player == 2 else 2
-        run_flag = True
-        i = 0
-        winner = None
-
-        g.cur_player = next_player
-        g.board.position = deepcopy(cur_board)
-
-        while run_flag:
-            i += 1
-            action = RuleStrategy().model(g.board.position, next_player)
-            g.proceed(action)
-            # 判断退出条件
-            if g.result is not None:
-                winner = g.result
-                run_flag = False
-            if i >= self.SIMULATION_DEPTH:
-                run_flag = False
-            # 轮换
-            next_player = 1 if next_player == 2 else 2
+        if tree.if_win[node] == 1:
+            self.log(f"当前模拟节点{tree.get_action(node)},已分出胜负,胜者为{player}")
+            return player
+        next_player = 1 if player == 2 else 2
+        winner = self.rollout(self.search_board, next_player)
         if winner is None:
-            print(f"当前模拟节点{node.action},未分出胜负")
+            self.log(f"当前模拟节点{tree.get_action(node)},未分出胜负")
         else:
-            print(f"当前模拟节点{node.action},胜者为{winner}")
+            self.log(f"当前模拟节点{tree.get_action(node)},胜者为{winner}")
+        return winner
+
+    def rollout(self, board, next_player):
+        """
+        从board(FastBoard)的局面由next_player开始按规则对弈,直到游戏结束或达到预设的深度
+        规则与RuleStrategy一致, 由FastBoard增量维护的棋型直接查询, 结束后悔棋恢复board
+        Returns:
+            胜者, 未分出胜负时为None
+        """
+        step_num = board.rollout_step_num
+        winner = board.rollout(next_player, self.SIMULATION_DEPTH, self.threat_search, self.ROLLOUT_VCF_NODES)
+        self.stats.rollout_num += 1
+        self.stats.rollout_step_num += board.rollout_step_num - step_num
         return winner
 
-    def backpropagation(self, node: Node, winner):
+    def backpropagation(self, node, winner, undo=True):
         """
         将模拟结果反向传播给沿途阶段,包括访问次数和胜利次数
         将沿途节点访问次数加1
         将沿途节点胜利方胜利次数加1
+        undo为True时同时逐步悔棋,将搜索棋盘恢复到根节点局面
         """
+        tree = self.tree
         cur_node = node
-        while cur_node is not None:
-            cur_node.visit_num += 1
-            if winner is not None and winner != 0 and cur_node.player == winner:
-                cur_node.win_num += 1
-            cur_node = cur_node.parent_node
+        while cur_node != -1:
+            is_win = winner is not None and winner != 0 and tree.player[cur_node] == winner
+            tree.visit_num[cur_node] += 1
+            if is_win:
+                tree.win_num[cur_node] += 1
+            if self.tt is not None:
+                key = int(tree.hash[cur_node])
+                entry = self.tt.get(key)
+                if entry is None:
+                    entry = [0, 0, int(tree.if_win[cur_node])]
+                    self.tt.put(key, entry)
+                entry[0] += 1
+                entry[1] += is_win
+            cur_node = tree.parent[cur_node]
+            if undo and cur_node != -1:
+                self.search_board.undo()
+
+    def add_virtual_loss(self, node, n):
+        """
+        虚拟损失: 给沿途节点增加n次只访问不获胜的记录,使同一批次的后续选择偏向其他节点
+        n为负数时撤销
+        """
+        while node != -1:
+            self.tree.visit_num[node] += n
+            node = self.tree.parent[node]
+
+    def search_batch(self):
+        """
+        叶并行: 借助虚拟损失选出batch_size个叶子节点,一起仿真后统一回溯
+        单进程时在选出叶子节点后直接在搜索棋盘上仿真(仿真结束后悔棋恢复到叶子节点局面),
+        多进程时记录根节点到叶子节点的路径, 整批在进程池中仿真
+        Returns:
+            本批次的仿真次数
+        """
+        parallel = self.workers is not None and self.workers > 1
+        leaf_list = []
+        winner_list = []  # 各叶子节点的胜者, 待进程池仿真的为None
+        task_list = []  # 需要在进程池中仿真的叶子节点的(根节点到叶子节点的路径, 下一步玩家)
+        tree = self.tree
+        phase_time = self.stats.phase_time
+        for _ in range(self.batch_size):
+            t0 = time.perf_counter()
+            node = self.selection(tree.root_node)
+            t1 = time.perf_counter()
+            node = self.expansion(node)
+            t2 = time.perf_counter()
+            phase_time["selection"] += t1 - t0
+            phase_time["expansion"] += t2 - t1
+            self.set_node_win(node)
+            next_player = 1 if tree.player[node] == 2 else 2
+            if tree.if_win[node] == 1:
+                winner_list.append(int(tree.player[node]))
+            elif parallel:
+                task_list.append((tree.get_path(node, tree.root_node), next_player))
+                winner_list.append(None)
+            else:
+                winner_list.append(self.rollout(self.search_board, next_player))
+                phase_time["simulation"] += time.perf_counter() - t2
+            leaf_list.append(node)
+            self.add_virtual_loss(node, self.VIRTUAL_LOSS)
+            # 恢复到根节点局面
+            cur_node = tree.parent[node]
+            while cur_node != -1:
+                self.search_board.undo()
+                cur_node = tree.parent[cur_node]
+        t0 = time.perf_counter()
+        if task_list:
+            winner_iter = iter(self.rollout_batch(task_list))
+            winner_list = [next(winner_iter) if winner is None else winner for winner in winner_list]
+        t1 = time.perf_counter()
+        for node, winner in zip(leaf_list, winner_list):
+            self.add_virtual_loss(node, -self.VIRTUAL_LOSS)
+            self.backpropagation(node, winner, undo=False)
+        phase_time["simulation"] += t1 - t0
+        phase_time["backpropagation"] += time.perf_counter() - t1
+        return len(leaf_list)
+
+    def rollout_batch(self, task_list):
+        """
+        在进程池中并行仿真, 整批按进程数切成连续的几段, 每个进程一个任务
+        任务只传一次根节点局面和各叶子节点的路径, 子进程建立一个FastBoard, 沿路径落子、仿真、悔棋
+        Args:
+            task_list: [(根节点到叶子节点的路径, 下一步玩家), ...], 调用时搜索棋盘需处于根节点局面
+
+        Returns:
+            每个叶子节点的胜者列表
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_rollout_worker,
+                                                initargs=(self.candidate_radius, self.threat_search is not None))
+        chunk_size = -(-len(task_list) // self.workers)
+        chunks = [task_list[i:i + chunk_size] for i in range(0, len(task_list), chunk_size)]
+        seeds = [random.randrange(2 ** 32) for _ in chunks]
+        board = self.cur_board
+        winner_list = []
+        for result in self.executor.map(rollout_chunk, [board] * len(chunks), chunks, seeds):
+            for winner, step_num in result:
+                winner_list.append(winner)
+                self.stats.rollout_num += 1
+                self.stats.rollout_step_num += step_num
+        return winner_list
+
+    def set_think_time(self, think_ms):
+        self.think_ms = think_ms
 
     def reset(self):
-        self.cur_board = None
+        self.search_board = None
         self.tree = None
+        self.history = None
+        if self.tt is not None:
+            self.tt.clear()
 
-    def receive_human_action(self, board):
-        """
-        接收人类动作,更新棋盘及树
-        """
-        diff = np.array(board) - np.array(self.cur_board)
-        new_point = None
-        for i in range(len(diff)):
-            for j in range(len(diff[0])):
-                if diff[i][j] > 0:
-                    new_point = (i, j)
-                    break
-        assert new_point is not None
-        if len(self.tree.root_node.child_node) == 0:
-            # 说明之前的扩展没有扩展到此节点
-            cur_player = self.tree.root_node.player
-            next_player = 1 if cur_player == 2 else 2
-            new_root_node = Node(next_player)
-            new_root_node.action = new_point
-            new_root_node.parent_node = self.tree.root_node
-            self.cur_board = self.reconstruct_board(new_root_node)
-            self.tree.trim(new_root_node)
-        else:
-            for node in self.tree.root_node.child_node:
-                if node.action == new_point:
-                    self.tree.trim(node)
-                    self.cur_board = self.reconstruct_board(node)
-                    break
+    def shutdown(self):
+        """
+        关闭根并行进程池
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def set_root(self, board, root_player):
+        """
+        以board为根节点局面新建搜索树
+        Args:
+            board: 根节点棋盘
+            root_player: 根节点局面中最后落子的玩家
+        """
+        self.search_board = FastBoard.from_position(board, self.candidate_radius)
+        self.zobrist = np.array(get_zobrist_table(len(board), len(board[0])), dtype=np.uint64)
+        self.tree = Tree(root_player, len(board[0]))
+        self.tree.hash[self.tree.root_node] = self.search_board.hash
+        self.history = None  # 未知根节点局面的落子历史
+
+    def move_root(self, action):
+        """
+        在搜索棋盘上落下根节点局面的下一步动作,并将对应子节点设为新的根节点
+        子节点中没有此动作时(例如不在候选范围内)追加该子节点, 原有的搜索结果仍然保留
+        Returns:
+            落子的动作
+        """
+        tree = self.tree
+        root_node = tree.root_node
+        next_player = 1 if tree.player[root_node] == 2 else 2
+        node = tree.find_child(root_node, action)
+        if node is None:
+            child_hash = self.child_hashes(root_node, [action])
+            if tree.child_num[root_node] == 0:  # 说明之前的扩展没有扩展到此节点
+                tree.add_children(root_node, [action], child_hash)
+                node = int(tree.first_child[root_node])
+            else:
+                node = tree.append_child(root_node, action, child_hash[0])
+        self.search_board.put(next_player, action)
+        tree.trim(node)
+        if self.history is not None:
+            self.history.append(tuple(action))
+        self.limit_tree()
+        return action
+
+    def limit_tree(self):
+        """
+        节点数(包括已不在根节点子树中的节点)超过max_nodes时压缩搜索树, 剪掉访问次数最少的子树,
+        压缩到max_nodes * PRUNE_RATIO, 避免每次迭代都要压缩. 调用时搜索棋盘需处于根节点局面
+        """
+        if self.max_nodes is None or self.tree.size <= self.max_nodes:
+            return
+        size = self.tree.size
+        self.tree.compact(int(self.max_nodes * self.PRUNE_RATIO))
+        self.stats.compact_num += 1
+        self.log(f"压缩搜索树, 节点数{size}->{self.tree.size}")
 
-    def model(self, cur_board, ai_player):
+    def sync_root(self, cur_board, ai_player, history_actions=None):
+        """
+        将搜索树的根节点同步到cur_board, 尽量保留已有的搜索结果
+        有history_actions时, 若已走过的动作是其前缀, 依次走下新增的动作(对手的落子, 以及未经model的其他落子),
+        否则(新对局、悔棋等)重新建树. 没有history_actions时比较棋盘, 只新增一个棋子时走下该动作, 否则重新建树
+        """
+        if history_actions is not None:
+            actions = [tuple(action) for action in history_actions]
+            history = self.history
+            if self.tree is not None and history is not None and actions[:len(history)] == history:
+                for action in actions[len(history):]:
+                    self.move_root(action)
+                return
+            self.set_root(cur_board, 1 if ai_player == 2 else 2)
+            self.history = actions
+            return
+        if self.tree is not None:
+            new_points = []
+            position = self.cur_board
+            for i, line in enumerate(cur_board):
+                for j, player in enumerate(line):
+                    if player != position[i][j]:
+                        new_points.append((i, j) if position[i][j] == 0 else None)
+            if len(new_points) == 1 and new_points[0] is not None:
+                self.move_root(new_points[0])
+                return
+            if not new_points:
+                return
+        self.set_root(cur_board, 1 if ai_player == 2 else 2)
+
+    def model(self, cur_board, ai_player, history_actions=None, think_ms=None, simulation_times=None):
         """
         产生一个树,叶子节点的棋盘设置为cur_board.按以下步骤进行迭代
         (1)选择
@@ -231,54 +662,262 @@ class MCTSStrategy(AIStrategy):
         将剩余所有的下法作为子节点追加到根节点上,并任取其中一个节点作为当前节点
         (3)仿真
         如果选择的节点胜负已分,则不需要仿真
-        从当前节点往后仿真对局,可叠加rule_strategy,直到游戏结束或深度超过预设值
+        从当前节点往后按规则仿真对局,直到游戏结束或深度超过预设值
         (4)回溯
         根据胜负关系,更新当前节点到根节点的沿途所有节点的win_num和visit_num
+        在预算内重复(1)-(4),最后选择访问次数最多的子节点
+        Args:
+            history_actions: 对局的落子历史, 用于把搜索树走到当前局面, 为None时比较棋盘
+            think_ms: 本步思考时间(毫秒), 覆盖初始化时的设置
+            simulation_times: 本步迭代次数, 覆盖初始化时的设置
         """
-        if self.cur_board is None:  # 首次运行
-            self.cur_board = deepcopy(cur_board)
-            human_player = 1 if ai_player == 2 else 2
-            self.tree = Tree(human_player)
-        else:  # 对局中,识别树走到哪个节点
-            self.receive_human_action(cur_board)
+        self.stats = SearchStats()
+        think_ms = self.think_ms if think_ms is None else think_ms  # 从进入model开始计时
+        self.sync_root(cur_board, ai_player, history_actions)
+        # 查询开局库
+        if self.book is not None:
+            res = self.book.probe(self.cur_board)
+            if res is not None:
+                self.log(f"命中开局库,落点为{res}")
+                self.stats.rule = "book"
+                return self.finish(self.move_root(tuple(res)))
         # 根据规则AI判断下一步动作
-        cur_player = self.tree.root_node.player
+        cur_player = self.tree.player[self.tree.root_node]
         next_player = 1 if cur_player == 2 else 2
         rule_strategy = RuleStrategy()
-        rule_strategy.board = self.cur_board
-        rule_strategy.ai_player = next_player
-        rule_strategy.human_player = 1 if rule_strategy.ai_player == 2 else 2
+        rule_strategy.set_board(self.cur_board, next_player)
         rule_chain = [rule_strategy.rule1, rule_strategy.rule2, rule_strategy.rule3, rule_strategy.rule4]
         # 匹配到规则, 直接按新的下法剪枝
         for rule in rule_chain:
             res = rule()
             if res is not None:
-                new_node = Node(next_player)
-                new_node.parent_node = self.tree.root_node
-                new_node.action = res
-                self.tree.root_node.child_node.append(new_node)
-                self.cur_board = self.reconstruct_board(new_node)
-                self.tree.trim(new_node)
-                print(f"触发规则,直接使用RuleStrategy模型,落点为{res}")
-                return new_node.action
-        # 未匹配到规则, 使用MCTS算法
-        for i in range(self.SIMULATION_TIMES):
-            print(f"第{i}次模拟")
-            next_node = self.selection(self.tree.root_node)
-            next_node = self.expansion(next_node)
-            winner = self.simulation(next_node)
-            self.backpropagation(next_node, winner)
-        print("-" * 20)
-        print("决策阶段,寻找最优子节点")
-        new_node = self.get_child_max_ucb(self.tree.root_node)
-        print("-" * 20)
-        self.cur_board = self.reconstruct_board(new_node)
-        self.tree.trim(new_node)
-        return new_node.action
+                self.log(f"触发规则,直接使用RuleStrategy模型,落点为{res}")
+                self.stats.rule = rule.__name__
+                return self.finish(self.move_root(tuple(res)))
+        # 威胁空间搜索
+        if self.threat_search is not None:
+            deadline = None
+            if think_ms is not None:
+                deadline = self.stats.start_time + think_ms * self.THREAT_SEARCH_RATIO / 1000
+            res, kind = self.threat_search.solve(self.search_board, next_player, deadline)
+            if res is not None:
+                self.log(f"威胁空间搜索({kind}),落点为{res}")
+                self.stats.rule = kind
+                return self.finish(self.move_root(res))
+        # 未匹配到规则, 使用MCTS算法, 思考时间扣除以上步骤已用的时间
+        if think_ms is not None:
+            think_ms = max(0, think_ms - (time.perf_counter() - self.stats.start_time) * 1000)
+        if self.profile:
+            with Profiler(self.stats):
+                self.run_search(think_ms, simulation_times)
+        else:
+            self.run_search(think_ms, simulation_times)
+        self.log("决策阶段,选择访问次数最多的子节点")
+        new_node = self.get_child_max_visit(self.tree.root_node)
+        self.stats.tree_size, self.stats.max_depth = self.tree.get_size_depth()  # 在move_root裁剪前统计搜索树
+        return self.finish(self.move_root(self.tree.get_action(new_node)))
+
+    def ponder(self, cur_board, ai_player, stop_event):
+        """
+        后台思考: 以PONDER_TIMES次迭代为一轮, 在当前搜索树上持续迭代直到stop_event被设置
+        根并行时也只在本进程的搜索树上迭代
+        """
+        if self.tree is None or self.search_board.win or self.search_board.empty_num == 0:
+            return
+        self.stats = SearchStats()  # 不计入last_stats
+        while not stop_event.is_set():
+            if self.tree.child_num[self.tree.root_node] == 1:  # 只有一种应对, 无需思考
+                stop_event.wait()
+                break
+            self.search(simulation_times=self.PONDER_TIMES)
+        self.log(f"后台思考迭代{self.stats.iteration_num}次")
+
+    def run_search(self, think_ms=None, simulation_times=None):
+        if (self.workers is not None and self.workers > 1) and not (
+                self.batch_size is not None and self.batch_size > 1):
+            self.parallel_search(think_ms, simulation_times)
+        else:
+            self.search(think_ms, simulation_times)
+
+    def finish(self, action):
+        """
+        记录本步的统计并调用callback
+        Returns:
+            落子的动作
+        """
+        stats = self.stats
+        stats.action = action
+        stats.total_time = time.perf_counter() - stats.start_time
+        self.last_stats = stats
+        self.log(stats)
+        if self.callback is not None:
+            self.callback(stats)
+        return action
+
+    def search(self, think_ms=None, simulation_times=None):
+        """
+        在预算内从根节点反复迭代
+        Args:
+            think_ms: 思考时间(毫秒), 为None时使用self.think_ms
+            simulation_times: 迭代次数, 为None时使用self.simulation_times
+        """
+        think_ms = self.think_ms if think_ms is None else think_ms
+        simulation_times = self.simulation_times if simulation_times is None else simulation_times
+        if think_ms is None and simulation_times is None:
+            simulation_times = self.SIMULATION_TIMES
+        start = time.perf_counter()
+        deadline = None if think_ms is None else start + think_ms / 1000
+        phase_time = self.stats.phase_time
+        if self.tt is not None:
+            tt_hit_num, tt_miss_num = self.tt.hit_num, self.tt.miss_num
+        i = 0
+        while 1:
+            self.log(f"第{i}次模拟")
+            if self.batch_size is not None and self.batch_size > 1:
+                i += self.search_batch()
+            else:
+                t0 = time.perf_counter()
+                next_node = self.selection(self.tree.root_node)
+                t1 = time.perf_counter()
+                next_node = self.expansion(next_node)
+                t2 = time.perf_counter()
+                winner = self.simulation(next_node)
+                t3 = time.perf_counter()
+                self.backpropagation(next_node, winner)
+                phase_time["selection"] += t1 - t0
+                phase_time["expansion"] += t2 - t1
+                phase_time["simulation"] += t3 - t2
+                phase_time["backpropagation"] += time.perf_counter() - t3
+                i += 1
+            self.limit_tree()  # 迭代之间搜索棋盘处于根节点局面
+            # 估算剩余可迭代次数
+            remaining = None
+            if simulation_times is not None:
+                remaining = simulation_times - i
+            if deadline is not None:
+                now = time.perf_counter()
+                time_remaining = int((deadline - now) / (now - start) * i) if now < deadline else 0
+                remaining = time_remaining if remaining is None else min(remaining, time_remaining)
+            if remaining <= 0 or self.is_decided(self.tree.root_node, remaining):
+                break
+        self.stats.iteration_num += i
+        if self.tt is not None:
+            self.stats.tt_hit_num += self.tt.hit_num - tt_hit_num
+            self.stats.tt_miss_num += self.tt.miss_num - tt_miss_num
+        return i
+
+    def parallel_search(self, think_ms=None, simulation_times=None):
+        """
+        根并行搜索: 各进程从当前根节点独立搜索, 将根节点子节点的统计量合并到本进程的搜索树上
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        think_ms = self.think_ms if think_ms is None else think_ms
+        simulation_times = self.simulation_times if simulation_times is None else simulation_times
+        tree = self.tree
+        root_node = tree.root_node
+        seeds = [random.randrange(2 ** 32) for _ in range(self.workers)]
+        futures = [self.executor.submit(root_search, self.cur_board, int(tree.player[root_node]), think_ms,
+                                        simulation_times, seed, self.candidate_radius, self.threat_search is not None)
+                   for seed in seeds]
+        result_list = []
+        for future in futures:
+            result, stats = future.result()
+            result_list.append(result)
+            self.stats.merge(stats)
+        if tree.child_num[root_node] == 0:
+            actions = sorted(set().union(*result_list))
+            tree.add_children(root_node, actions, self.child_hashes(root_node, actions))
+            self.stats.node_num += len(actions)
+        child_dict = {tree.get_action(child): child for child in tree.children(root_node)}
+        for result in result_list:
+            for action, (visit_num, win_num) in result.items():
+                child_node = child_dict.get(action)
+                if child_node is None:  # 与本进程已有的子节点不一致,忽略
+                    continue
+                tree.visit_num[child_node] += visit_num
+                tree.win_num[child_node] += win_num
+                tree.visit_num[root_node] += visit_num
+
+    def is_decided(self, node, remaining):
+        """
+        访问次数最多的子节点的领先优势已无法在剩余迭代中被追上
+        """
+        child_num = self.tree.child_num[node]
+        if child_num < 2:
+            return child_num == 1
+        first_child = self.tree.first_child[node]
+        visit_num = self.tree.visit_num[first_child:first_child + child_num]
+        second, first = np.partition(visit_num, child_num - 2)[-2:]
+        return first - second > remaining
+
+    def get_child_max_visit(self, node):
+        """
+        选择访问次数最多的子节点,次数相同时选择胜率更高的,仍相同则随机选择
+        """
+        tree = self.tree
+        first_child = tree.first_child[node]
+        child_num = tree.child_num[node]
+        visit_num = tree.visit_num[first_child:first_child + child_num]
+        win_rate = tree.win_num[first_child:first_child + child_num] / np.maximum(visit_num, 1)
+        idx_max = np.flatnonzero(visit_num == visit_num.max())
+        idx_max = idx_max[win_rate[idx_max] == win_rate[idx_max].max()]
+        return first_child + int(idx_max[random.randrange(len(idx_max))])
+
+
+def root_search(board, root_player, think_ms, simulation_times, seed, candidate_radius, threat_search):
+    """
+    根并行的单个进程任务: 从board独立搜索
+    Returns:
+        根节点各子节点的统计量 {动作: (visit_num, win_num)}, 本进程的搜索统计
+    """
+    random.seed(seed)
+    strategy = MCTSStrategy(think_ms, simulation_times, candidate_radius=candidate_radius, threat_search=threat_search)
+    strategy.set_root(board, root_player)
+    strategy.search()
+    tree = strategy.tree
+    return {tree.get_action(child): (int(tree.visit_num[child]), int(tree.win_num[child]))
+            for child in tree.children(tree.root_node)}, strategy.stats
+
+
+_rollout_worker = None  # 叶并行工作进程中的仿真设置: (候选落点半径, ThreatSearch或None)
+
+
+def init_rollout_worker(candidate_radius, threat_search):
+    """
+    叶并行进程池的初始化函数, 每个工作进程只创建一次ThreatSearch
+    """
+    global _rollout_worker
+    _rollout_worker = candidate_radius, ThreatSearch() if threat_search else None
+
+
+def rollout_chunk(board, task_list, seed):
+    """
+    叶并行的单个进程任务: 在同一个FastBoard上依次沿路径落子, 仿真一局后悔棋回到board
+    Args:
+        board: 根节点局面
+        task_list: [(根节点到叶子节点的路径, 下一步玩家), ...]
+
+    Returns:
+        [(胜者, 仿真步数), ...]
+    """
+    random.seed(seed)
+    candidate_radius, solver = _rollout_worker
+    fast_board = FastBoard.from_position(board, candidate_radius)
+    result = []
+    for path, next_player in task_list:
+        for player, action in path:
+            fast_board.put(player, action)
+        step_num = fast_board.rollout_step_num
+        winner = fast_board.rollout(next_player, MCTSStrategy.SIMULATION_DEPTH, solver, MCTSStrategy.ROLLOUT_VCF_NODES)
+        result.append((winner, fast_board.rollout_step_num - step_num))
+        for _ in path:
+            fast_board.undo()
+    return result
 
 
 if __name__ == '__main__':
-    s = MCTSStrategy()
+    s = MCTSStrategy(verbose=True)
     board = [[2, 0, 0, 0, 0, 0],
              [1, 2, 0, 0, 0, 0],
              [1, 0, 2, 0, 0, 0],
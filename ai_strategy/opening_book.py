@@ -0,0 +1,121 @@
+"""
+开局库
+由棋谱统计开局阶段每个局面下各落点的出现次数和胜率. 局面以规范哈希值为键:
+棋盘8种对称变换下Zobrist哈希值的最小值, 落点也换算到取得最小值的那个变换下保存, 对称的局面共用同一条记录
+
+文件格式(小端序):
+    文件头: MAGIC, 棋盘边长(u16), 槽位数(u32, 2的幂), 落点记录数(u32)
+    槽位表: 开放寻址哈希表, 每个槽位为(键u64, 落点记录起始下标u32, 落点数u16), 落点数为0表示空槽位
+    落点记录: (规范落点u16, 次数u32, 落子方胜局数u32, 和棋数u32), 同一局面的记录连续存放
+文件在首次查询时才以内存映射方式打开, 查询只需计算哈希并探测少量槽位
+开局库文件由build_book.py从棋谱生成
+"""
+import os
+import struct
+
+import numpy as np
+
+from gobang import get_symmetry_tables, get_zobrist_table
+
+MAGIC = b"GBB1"
+HEADER = struct.Struct("<4sHII")
+SLOT_DTYPE = np.dtype([("key", "<u8"), ("offset", "<u4"), ("move_num", "<u2"), ("pad", "<u2")])
+MOVE_DTYPE = np.dtype([("move", "<u2"), ("count", "<u4"), ("win", "<u4"), ("draw", "<u4")])
+MIN_COUNT = 3  # 落点至少出现的次数
+MIN_SCORE = 0.5  # 落点最低得分率(和棋记半分)
+_zobrist_arrays = {}
+
+
+def get_canonical_hash(position):
+    """
+    Returns:
+        规范哈希值, 取得最小值的对称变换编号
+    """
+    board = np.asarray(position, dtype=np.int64).ravel()
+    board_size = len(position)
+    _, dst = get_symmetry_tables(board_size)
+    if board_size not in _zobrist_arrays:
+        _zobrist_arrays[board_size] = np.array(get_zobrist_table(board_size, board_size), dtype=np.uint64)
+    zobrist = _zobrist_arrays[board_size]
+    stones = np.flatnonzero(board)
+    hashes = np.zeros(8, dtype=np.uint64)
+    if len(stones):
+        hashes = np.bitwise_xor.reduce(zobrist[board[stones], dst[:, stones]], axis=1)
+    k = int(np.argmin(hashes))
+    return int(hashes[k]), k
+
+
+class OpeningBook:
+    """
+    开局库查询
+    """
+
+    def __init__(self, path, min_count=MIN_COUNT, min_score=MIN_SCORE):
+        self.path = path
+        self.min_count = min_count
+        self.min_score = min_score
+        self.board_size = None
+        self.slots = None
+        self.moves = None
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            magic, self.board_size, slot_num, move_num = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}不是开局库文件")
+        self.slots = np.memmap(self.path, dtype=SLOT_DTYPE, mode="r", offset=HEADER.size, shape=(slot_num,))
+        if move_num:
+            self.moves = np.memmap(self.path, dtype=MOVE_DTYPE, mode="r",
+                                   offset=HEADER.size + slot_num * SLOT_DTYPE.itemsize, shape=(move_num,))
+
+    def lookup(self, key):
+        """
+        Returns:
+            规范局面key的落点记录数组, 不存在时为None
+        """
+        if not self.loaded:
+            self.load()
+        if self.slots is None:
+            return None
+        mask = len(self.slots) - 1
+        i = key & mask
+        while 1:
+            slot = self.slots[i]
+            if slot["move_num"] == 0:
+                return None
+            if int(slot["key"]) == key:
+                return self.moves[slot["offset"]:slot["offset"] + slot["move_num"]]
+            i = (i + 1) & mask
+
+    def probe(self, position):
+        """
+        查询position下一步的开局库落点
+        Returns:
+            [row, column], 局面不在开局库中或没有足够可信的落点时为None
+        """
+        if not self.loaded:
+            self.load()
+        if self.slots is None or len(position) != self.board_size or len(position[0]) != self.board_size:
+            return None
+        key, k = get_canonical_hash(position)
+        moves = self.lookup(key)
+        if moves is None:
+            return None
+        count = moves["count"].astype(np.int64)
+        score = (moves["win"] + 0.5 * moves["draw"]) / np.maximum(count, 1)
+        valid = (count >= self.min_count) & (score >= self.min_score)
+        if not valid.any():
+            return None
+        # 得分率最高, 相同时选次数最多的
+        order = np.lexsort((-count, -score))
+        best = next(i for i in order if valid[i])
+        src, _ = get_symmetry_tables(self.board_size)
+        cell = int(src[k][moves["move"][best]])  # 从规范落点换算回原局面
+        row, column = divmod(cell, self.board_size)
+        if position[row][column] != 0:
+            return None
+        return [row, column]
@@ -0,0 +1,122 @@
+"""
+棋型查表
+以空位置为中心, 取某一方向上左右各4个位置组成一条线段, 按三进制编码为查表下标:
+0表示空位置, 1表示己方棋子, 2表示对方棋子或棋盘外
+下标 = sum(state[k] * 3 ** k), k依次对应偏移-4, -3, -2, -1, 1, 2, 3, 4
+查表结果为己方落在中心后, 该方向上经过中心形成的棋型等级
+"""
+import numpy as np
+
+from gobang import GoBangBoard
+
+# 棋型等级, 数值越大威胁越大
+NONE = 0
+TWO = 1  # 二: 再落一子可成三
+BROKEN_THREE = 2  # 跳三: 如X_XX, 再落一子可成活四
+OPEN_THREE = 3  # 活三: 三子相连, 再落一子可成活四
+FOUR = 4  # 冲四: 只有一个位置可成五
+OPEN_FOUR = 5  # 活四: 两个及以上位置可成五
+FIVE = 6  # 成五
+LEVEL_NAMES = ["无", "二", "跳三", "活三", "冲四", "活四", "五连"]
+
+OFFSETS = (-4, -3, -2, -1, 1, 2, 3, 4)  # 线段上各位置相对中心的偏移, 与编码的位一一对应
+POWERS = tuple(3 ** k for k in range(len(OFFSETS)))
+EMPTY, OWN, BLOCKED = 0, 1, 2
+CENTER = 4  # 中心在9格线段中的下标
+
+_pattern_table = None
+
+
+def _is_five(line):
+    return any(all(line[begin + i] == OWN for i in range(5)) for begin in range(CENTER + 1))
+
+
+def _classify(line, cache):
+    """
+    计算9格线段(中心为己方)的棋型等级, 只考虑经过中心的连珠
+    """
+    if line in cache:
+        return cache[line]
+    if _is_five(line):
+        level = FIVE
+    else:
+        # 可成五的位置数决定冲四/活四
+        win_num = sum(1 for i in range(9) if line[i] == EMPTY and _is_five(line[:i] + (OWN,) + line[i + 1:]))
+        if win_num >= 2:
+            level = OPEN_FOUR
+        elif win_num == 1:
+            level = FOUR
+        else:
+            next_levels = [_classify(line[:i] + (OWN,) + line[i + 1:], cache) for i in range(9) if line[i] == EMPTY]
+            if OPEN_FOUR in next_levels:
+                # 经过中心的连续己方棋子数为3则为活三, 否则为跳三
+                run = 1
+                i = CENTER - 1
+                while i >= 0 and line[i] == OWN:
+                    run += 1
+                    i -= 1
+                i = CENTER + 1
+                while i < 9 and line[i] == OWN:
+                    run += 1
+                    i += 1
+                level = OPEN_THREE if run >= 3 else BROKEN_THREE
+            elif OPEN_THREE in next_levels or BROKEN_THREE in next_levels:
+                level = TWO
+            else:
+                level = NONE
+    cache[line] = level
+    return level
+
+
+def get_pattern_table():
+    """
+    棋型表, 长度为3 ** 8的numpy数组. 首次调用时计算
+    """
+    global _pattern_table
+    if _pattern_table is None:
+        cache = {}
+        table = np.zeros(3 ** len(OFFSETS), dtype=np.int8)
+        for index in range(len(table)):
+            states = [index // power % 3 for power in POWERS]
+            line = tuple(states[:CENTER]) + (OWN,) + tuple(states[CENTER:])
+            table[index] = _classify(line, cache)
+        _pattern_table = table
+    return _pattern_table
+
+
+def scan_threats(board_position):
+    """
+    一次扫描全盘, 计算双方在每个空位置落子后各方向形成的棋型等级
+    Args:
+        board_position: 棋盘
+
+    Returns:
+        形状为(2, 4, 行, 列)的数组, [player - 1, con_type - 1, row, column]为player落在该位置后
+        在该方向上的棋型等级, 方向与GoBangGame.check_winner的连续类型一致. 已有棋子的位置为NONE
+    """
+    table = get_pattern_table()
+    a = np.asarray(board_position)
+    height, width = a.shape
+    pad = CENTER
+    padded = np.full((height + 2 * pad, width + 2 * pad), -1, dtype=np.int8)  # -1表示棋盘外
+    padded[pad:pad + height, pad:pad + width] = a
+    empty = a == 0
+    levels = np.zeros((2, 4, height, width), dtype=np.int8)
+    for player in (1, 2):
+        state = np.where(padded == 0, EMPTY, np.where(padded == player, OWN, BLOCKED)).astype(np.int16)
+        for con_type, dx, dy in GoBangBoard.DIRECTIONS:
+            index = np.zeros((height, width), dtype=np.int16)
+            for offset, power in zip(OFFSETS, POWERS):
+                x, y = pad + offset * dx, pad + offset * dy
+                index += state[x:x + height, y:y + width] * power
+            levels[player - 1, con_type - 1] = np.where(empty, table[index], NONE)
+    return levels
+
+
+def threat_cells(levels, player, level):
+    """
+    找出player落子后在任一方向达到level等级的位置
+    Returns:
+        [(row, column), ...], 按行列顺序排列
+    """
+    return [tuple(point) for point in np.argwhere(levels[player - 1].max(axis=0) >= level).tolist()]
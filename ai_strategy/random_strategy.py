@@ -1,18 +1,70 @@
 import random
 
 from ai_base import AIStrategy
+from gobang import GoBangBoard
 
 
 class RandomStrategy(AIStrategy):
     """
     随机模型
+    只在已有棋子附近candidate_radius范围内的空位置中随机选择
+    候选落点由self.board在两次调用之间增量维护: 传入history_actions时只补上新的落子, 否则比较棋盘找出新增的棋子,
+    悔棋、换局等无法增量更新的情况才重建棋盘
     """
 
-    def model(self, cur_board, ai_player):
-        empty_list = []
-        for i in range(len(cur_board)):
-            for j in range(len(cur_board)):
-                if cur_board[i][j] == 0:
-                    empty_list.append([i, j])
-        res = random.choice(empty_list)
+    def __init__(self, candidate_radius=GoBangBoard.CANDIDATE_RADIUS):
+        self.candidate_radius = candidate_radius
+        self.board = None  # 增量维护候选落点的棋盘
+        self.history = None  # self.board已落下的动作, 由比较棋盘同步时为None
+
+    def reset(self):
+        self.board = None
+        self.history = None
+
+    def sync_board(self, cur_board, history_actions=None):
+        """
+        把self.board同步到cur_board的局面
+        Returns:
+            候选落点列表
+        """
+        height, width = len(cur_board), len(cur_board[0])
+        if self.board is None or (self.board.height, self.board.width) != (height, width):
+            self.board = GoBangBoard(height, width, self.candidate_radius)
+            self.history = []
+        board = self.board
+        if history_actions is not None:
+            history = [tuple(action) for action in history_actions]
+            if self.history is None or history[:len(self.history)] != self.history:  # 悔棋或换局
+                board = self.board = GoBangBoard(height, width, self.candidate_radius)
+                self.history = []
+            for row, column in history[len(self.history):]:
+                board.put(cur_board[row][column], (row, column))
+            self.history = history
+            return board.get_candidates()
+        self.history = None
+        added = []
+        for row, line in enumerate(cur_board):
+            old_line = board.position[row]
+            if old_line == line:
+                continue
+            for column, player in enumerate(line):
+                if old_line[column] == player:
+                    continue
+                if old_line[column] != 0:  # 棋子被撤销或替换, 无法增量更新
+                    position = [list(line) for line in cur_board]  # 复制, 避免与调用方的棋盘共用列表
+                    self.board = GoBangBoard.from_position(position, self.candidate_radius)
+                    return self.board.get_candidates()
+                added.append((player, (row, column)))
+        for player, point in added:
+            board.put(player, point)
+        return board.get_candidates()
+
+    def model(self, cur_board, ai_player, history_actions=None, candidates=None):
+        """
+        Args:
+            candidates: 候选落点列表. 调用方已增量维护候选落点时直接传入, 否则由self.board增量维护
+        """
+        if candidates is None:
+            candidates = self.sync_board(cur_board, history_actions)
+        res = list(random.choice(candidates))
         return res
@@ -1,156 +1,92 @@
 import random
 
-import numpy as np
-
 from ai_base import AIStrategy
+from ai_strategy.opening_book import OpeningBook
+from ai_strategy.pattern import FIVE, OPEN_FOUR, scan_threats, threat_cells
 from ai_strategy.random_strategy import RandomStrategy
-from gobang import GoBangGame
 
 
 class RuleStrategy(AIStrategy):
     """
     基于规则的模型
-    (1)当我方有4个棋子相连且一头为空时,落到其中一头
-    (2)当对手有4个棋子相连且一头为空时,堵住连珠
-    (3)当我方有3个棋子相连且两头为空时,落到其中一头.优先落到连续空位置大于1的一头(例如OOXXXO,X表示棋子,O表示空位置,应该落到左侧),如果都是1个空位置则任选一头
-    (4)当对手有3个棋子相连且两头为空,落到其中一头.其中至少有一头的空位置大于1,否则没必要堵住(例如OXXXO)
-    (5)不符合上述所有情况,则随机选择位置
+    (1)我方落子可成五(补上我方活四、冲四或跳四的空位), 落在该处
+    (2)对手落子可成五, 堵住该处
+    (3)我方落子可成活四(延伸我方的活三或跳三), 在这些位置中随机选择
+    (4)对手落子可成活四, 在这些位置中随机选择一处堵住对手的活三或跳三
+    (5)不符合上述所有情况,则在已有棋子附近随机选择位置
+    规则1-4通过pattern模块的棋型表实现: 每次落子前扫描一次全盘, 得到双方在每个空位置落子后各方向的棋型等级,
+    分别查找等级为FIVE和OPEN_FOUR的位置
+    设置了开局库时, 先查询开局库, 命中则直接使用开局库的落点
     """
 
-    def __init__(self):
+    def __init__(self, book=None):
+        """
+        Args:
+            book: 开局库文件路径, None表示不使用开局库
+        """
+        self.book = OpeningBook(book) if book else None
         self.board = None
         self.ai_player = None
         self.human_player = None
+        self.candidates = None
+        self.history_actions = None
+        self.threat_levels = None  # 双方在各空位置落子后的棋型等级, 见pattern.scan_threats
+        self.random_strategy = RandomStrategy()
 
-    def check_boarder(self, point):
-        """检查是否在边界内"""
-        x, y = point
-        return (0 <= x <= len(self.board[0]) - 1) & (0 <= y <= len(self.board[0]) - 1)
-
-    def check_point_empty(self, point):
-        """检查当前点是否为空"""
-        if self.check_boarder(point) is False:
-            return False
-        x, y = point
-        return self.board[x][y] == 0
+    def rule1(self):
+        # 我方落子可成五
+        points = threat_cells(self.threat_levels, self.ai_player, FIVE)
+        if len(points) > 0:
+            return points[0]
 
-    def rule1(self, n=4):
-        # 寻找我方四连棋子
-        game = GoBangGame()
-        winner, con_list = game.check_winner(self.board, self.ai_player, n)
-        if winner == self.ai_player:
-            new_points = []
-            for con_type, (x1, y1), (x2, y2) in con_list:
-                if con_type == 1:
-                    new_points += [(x1, y1 - 1), (x2, y2 + 1)]
-                elif con_type == 2:
-                    new_points += [(x1 - 1, y1), (x2 + 1, y2)]
-                elif con_type == 3:
-                    new_points += [(x1 - 1, y1 - 1), (x2 + 1, y2 + 1)]
-                elif con_type == 4:
-                    new_points += [(x1 + 1, y1 - 1), (x2 - 1, y2 + 1)]
-            for point in new_points:
-                if self.check_point_empty(point):
-                    return point
+    def rule2(self):
+        # 对手落子可成五, 堵住
+        points = threat_cells(self.threat_levels, self.human_player, FIVE)
+        if len(points) > 0:
+            return points[0]
 
-    def rule2(self, n=4):
-        # 寻找4个相连
-        game = GoBangGame()
-        winner, con_list = game.check_winner(self.board, self.human_player, n)
-        if winner == self.human_player:
-            new_points = []
-            for con_type, (x1, y1), (x2, y2) in con_list:
-                if con_type == 1:
-                    new_points += [(x1, y1 - 1), (x2, y2 + 1)]
-                elif con_type == 2:
-                    new_points += [(x1 - 1, y1), (x2 + 1, y2)]
-                elif con_type == 3:
-                    new_points += [(x1 - 1, y1 - 1), (x2 + 1, y2 + 1)]
-                elif con_type == 4:
-                    new_points += [(x1 + 1, y1 - 1), (x2 - 1, y2 + 1)]
-            for point in new_points:
-                if self.check_point_empty(point):
-                    return point
+    def rule3(self):
+        # 我方落子可成活四, 即延伸我方的活三(包括跳三)
+        points = threat_cells(self.threat_levels, self.ai_player, OPEN_FOUR)
+        if len(points) > 0:
+            return random.choice(points)
 
-    def rule3(self, n=3):
-        # 寻找3个相连
-        game = GoBangGame()
-        winner, con_list = game.check_winner(self.board, self.ai_player, n)
-        if winner == self.ai_player:
-            for con_type, (x1, y1), (x2, y2) in con_list:
-                point1 = None
-                point2 = None
-                point1_next = None
-                point2_next = None
-                if con_type == 1:
-                    point1 = (x1, y1 - 1)
-                    point2 = (x2, y2 + 1)
-                    point1_next = (x1, y1 - 2)
-                    point2_next = (x2, y2 + 2)
-                elif con_type == 2:
-                    point1 = (x1 - 1, y1)
-                    point2 = (x2 + 1, y2)
-                    point1_next = (x1 - 2, y1)
-                    point2_next = (x2 + 2, y2)
-                elif con_type == 3:
-                    point1 = (x1 - 1, y1 - 1)
-                    point2 = (x2 + 1, y2 + 1)
-                    point1_next = (x1 - 2, y1 - 2)
-                    point2_next = (x2 + 2, y2 + 2)
-                elif con_type == 4:
-                    point1 = (x1 + 1, y1 - 1)
-                    point2 = (x2 - 1, y2 + 1)
-                    point1_next = (x1 + 2, y1 - 2)
-                    point2_next = (x2 - 2, y2 + 2)
-                if self.check_point_empty(point1) and self.check_point_empty(point2):
-                    if self.check_point_empty(point1_next):
-                        return point1
-                    elif self.check_point_empty(point2_next):  # 如果位置2的连续2个空位置则选择位置2
-                        return point2
-                    else:  # 如果位置1和2均只有1个空位置,则任选一处
-                        return random.choice([point1, point2])
-
-    def rule4(self, n=3):
-        # 寻找3个相连
-        game = GoBangGame()
-        winner, con_list = game.check_winner(self.board, self.human_player, n)
-        if winner == self.human_player:
-            for con_type, (x1, y1), (x2, y2) in con_list:
-                point1 = None
-                point2 = None
-                point1_next = None
-                point2_next = None
-                if con_type == 1:
-                    point1 = (x1, y1 - 1)
-                    point2 = (x2, y2 + 1)
-                    point1_next = (x1, y1 - 2)
-                    point2_next = (x2, y2 + 2)
-                elif con_type == 2:
-                    point1 = (x1 - 1, y1)
-                    point2 = (x2 + 1, y2)
-                    point1_next = (x1 - 2, y1)
-                    point2_next = (x2 + 2, y2)
-                elif con_type == 3:
-                    point1 = (x1 - 1, y1 - 1)
-                    point2 = (x2 + 1, y2 + 1)
-                    point1_next = (x1 - 2, y1 - 2)
-                    point2_next = (x2 + 2, y2 + 2)
-                elif con_type == 4:
-                    point1 = (x1 + 1, y1 - 1)
-                    point2 = (x2 - 1, y2 + 1)
-                    point1_next = (x1 + 2, y1 - 2)
-                    point2_next = (x2 - 2, y2 + 2)
-                if self.check_point_empty(point1) and self.check_point_empty(point2):
-                    if self.check_point_empty(point1_next) or self.check_point_empty(point2_next):
-                        return random.choice([point1, point2])  # 任一头有2个以上空位置才堵住,堵两端都可以
+    def rule4(self):
+        # 对手落子可成活四, 堵住对手的活三(包括跳三)
+        points = threat_cells(self.threat_levels, self.human_player, OPEN_FOUR)
+        if len(points) > 0:
+            return random.choice(points)
 
     def rule5(self):
-        return RandomStrategy().model(self.board, self.ai_player)
+        return self.random_strategy.model(self.board, self.ai_player, self.history_actions, self.candidates)
+
+    def reset(self):
+        self.random_strategy.reset()
 
-    def model(self, cur_board, ai_player):
+    def set_board(self, cur_board, ai_player, candidates=None, history_actions=None):
+        """
+        设置当前局面并扫描双方棋型, 之后可单独调用各条规则
+        Args:
+            candidates: 候选落点列表, 传给随机规则. 为None时由随机规则增量维护
+            history_actions: 对局的落子历史, 传给随机规则用于增量维护候选落点
+        """
         self.board = cur_board
+        self.candidates = candidates
+        self.history_actions = history_actions
         self.ai_player = ai_player
         self.human_player = 1 if ai_player == 2 else 2
+        self.threat_levels = scan_threats(cur_board)
+
+    def model(self, cur_board, ai_player, history_actions=None, candidates=None):
+        """
+        Args:
+            candidates: 候选落点列表, 传给随机规则. 为None时由随机规则增量维护
+        """
+        if self.book is not None:
+            res = self.book.probe(cur_board)
+            if res is not None:
+                return res
+        self.set_board(cur_board, ai_player, candidates, history_actions)
         rule_chain = [self.rule1, self.rule2, self.rule3, self.rule4, self.rule5]
         for rule in rule_chain:
             res = rule()
@@ -0,0 +1,77 @@
+import cProfile
+import io
+import pstats
+import time
+
+PHASES = ("selection", "expansion", "simulation", "backpropagation")
+COUNTERS = ("iteration_num", "node_num", "rollout_num", "rollout_step_num", "tt_hit_num", "tt_miss_num",
+            "compact_num")
+
+
+class SearchStats:
+    """
+    一步搜索的统计信息
+    计数: 迭代次数、新建节点数、仿真次数、仿真总步数、置换表命中/未命中次数、搜索树压缩次数
+    耗时: 选择、扩展、仿真、回溯四个阶段各自的累计耗时(秒)及总耗时
+    搜索树: 决策时根节点子树的节点数和最大深度
+    """
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.total_time = 0.0
+        self.tree_size = 0
+        self.max_depth = 0
+        self.rule = None  # 触发规则时为规则名, 此时不做搜索
+        self.action = None
+        self.profile_report = None  # 开启profile时为cProfile报告文本
+        self.start_time = time.perf_counter()
+
+    def merge(self, other):
+        """
+        累加其他进程的计数和阶段耗时
+        """
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for phase in PHASES:
+            self.phase_time[phase] += other.phase_time[phase]
+
+    def as_dict(self):
+        res = {name: getattr(self, name) for name in COUNTERS}
+        res.update(phase_time=dict(self.phase_time), total_time=self.total_time, tree_size=self.tree_size,
+                   max_depth=self.max_depth, rule=self.rule, action=self.action)
+        return res
+
+    def __str__(self):
+        if self.rule is not None:
+            return f"落点{self.action}, 触发规则{self.rule}, 耗时{self.total_time * 1000:.1f}ms"
+        lines = [f"落点{self.action}, 耗时{self.total_time * 1000:.1f}ms, 迭代{self.iteration_num}次, "
+                 f"新建节点{self.node_num}个, 仿真{self.rollout_num}次共{self.rollout_step_num}步",
+                 f"置换表命中{self.tt_hit_num}次, 未命中{self.tt_miss_num}次, "
+                 f"搜索树{self.tree_size}个节点, 最大深度{self.max_depth}, 压缩{self.compact_num}次",
+                 "阶段耗时: " + ", ".join(f"{phase} {t * 1000:.1f}ms" for phase, t in self.phase_time.items())]
+        if self.profile_report is not None:
+            lines.append(self.profile_report)
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    cProfile的简单封装, 用于with语句中统计耗时最多的函数
+    """
+
+    def __init__(self, stats, limit=20):
+        self.stats = stats
+        self.limit = limit
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(self.limit)
+        self.stats.profile_report = stream.getvalue()
@@ -0,0 +1,169 @@
+import time
+
+from ai_strategy.pattern import BROKEN_THREE, FIVE, FOUR, OPEN_FOUR, OPEN_THREE
+
+
+class SearchLimit(Exception):
+    """
+    超出节点数或时间限制
+    """
+
+
+class ThreatSearch:
+    """
+    威胁空间搜索, 在FastBoard上原地落子和悔棋, 利用其增量维护的棋型集合生成着法
+    VCF(连续冲四取胜): 进攻方每步都走成四, 防守方只能堵唯一的成五点
+    VCT(连续威胁取胜): 进攻方每步走成四或成三, 防守方考虑所有能化解威胁的位置以及自己的冲四反击
+    VCT中对防守方的应对做了近似, 只考虑进攻方的成四点、活四点和防守方自己的成四点
+    均按深度迭代加深, 优先找到步数最少的取胜方法
+    """
+    NODE_LIMIT = 5000  # 每次solve的节点数上限
+    TIME_MS = 100  # 每次solve的时间上限(毫秒)
+    VCF_DEPTH = 12  # VCF最多进攻步数
+    VCT_DEPTH = 4  # VCT最多进攻步数
+    TIME_CHECK_INTERVAL = 16  # 每搜索这么多节点检查一次时间
+
+    def __init__(self, node_limit=NODE_LIMIT, time_ms=TIME_MS, vcf_depth=VCF_DEPTH, vct_depth=VCT_DEPTH):
+        """
+        Args:
+            node_limit: 节点数上限
+            time_ms: 时间上限(毫秒), None表示不限时间
+            vcf_depth: VCF最多进攻步数
+            vct_depth: VCT最多进攻步数, 0表示不做VCT
+        """
+        self.node_limit = node_limit
+        self.time_ms = time_ms
+        self.vcf_depth = vcf_depth
+        self.vct_depth = vct_depth
+        self.board = None
+        self.node_num = 0
+        self.max_node_num = node_limit
+        self.deadline = None
+
+    def solve(self, board, player, deadline=None):
+        """
+        按以下顺序查找player的落点:
+        (1)five: 我方成五 (2)block: 堵对手的成五点 (3)open_four: 我方成活四
+        (4)vcf: 我方VCF (5)block_vcf: 对手有VCF时占据其第一步 (6)vct: 我方VCT
+        Args:
+            board: FastBoard, 搜索结束后恢复原局面
+            deadline: 截止时刻(time.perf_counter), 由调用方的思考时间决定, 为None时使用time_ms
+
+        Returns:
+            落点(row, column), 类型. 都不满足时为None, None
+        """
+        other = 1 if player == 2 else 2
+        own = board.threats[player]
+        opp = board.threats[other]
+        if own[FIVE]:
+            return board.get_point(min(own[FIVE])), "five"
+        if opp[FIVE]:
+            return board.get_point(min(opp[FIVE])), "block"
+        if own[OPEN_FOUR]:
+            return board.get_point(min(own[OPEN_FOUR])), "open_four"
+        self.start(board, self.node_limit, self.time_ms)
+        if deadline is not None:
+            self.deadline = deadline if self.deadline is None else min(self.deadline, deadline)
+        try:
+            for kind, attacker, max_depth, allow_three in (("vcf", player, self.vcf_depth, False),
+                                                           ("block_vcf", other, self.vcf_depth, False),
+                                                           ("vct", player, self.vct_depth, True)):
+                for depth in range(1, max_depth + 1):
+                    cell = self.attack(attacker, depth, allow_three)
+                    if cell is not None:
+                        return board.get_point(cell), kind
+        except SearchLimit:
+            pass
+        return None, None
+
+    def vcf(self, board, player, node_limit):
+        """
+        只做一次固定深度的VCF, 不计时, 用于仿真中快速判断
+        Returns:
+            VCF的第一步位置编号(FastBoard下标), 没有找到时为None
+        """
+        self.start(board, node_limit, None)
+        try:
+            return self.attack(player, self.vcf_depth, False)
+        except SearchLimit:
+            return None
+
+    def start(self, board, node_limit, time_ms):
+        self.board = board
+        self.node_num = 0
+        self.max_node_num = node_limit
+        self.deadline = None if time_ms is None else time.perf_counter() + time_ms / 1000
+
+    def count_node(self):
+        self.node_num += 1
+        if self.node_num > self.max_node_num:
+            raise SearchLimit()
+        if self.deadline is not None and self.node_num % self.TIME_CHECK_INTERVAL == 0 and \
+                time.perf_counter() > self.deadline:
+            raise SearchLimit()
+
+    def attack(self, player, depth, allow_three):
+        """
+        player先手连续进攻
+        Returns:
+            能强制取胜的第一步位置编号, 否则为None
+        """
+        self.count_node()
+        board = self.board
+        other = 1 if player == 2 else 2
+        own = board.threats[player]
+        opp = board.threats[other]
+        if own[FIVE]:
+            return min(own[FIVE])
+        min_level = BROKEN_THREE if allow_three else FOUR  # 进攻着法落子后的最低棋型
+        if opp[FIVE]:
+            # 必须先堵对手的成五点, 只有堵的同时形成威胁才能继续进攻
+            if len(opp[FIVE]) > 1 or depth == 0:
+                return None
+            cell = min(opp[FIVE])
+            if board.cell_level[player][cell] < min_level:
+                return None
+            return cell if self.defend(player, cell, depth, allow_three) else None
+        if own[OPEN_FOUR]:
+            return min(own[OPEN_FOUR])
+        if depth == 0:
+            return None
+        cells = sorted(own[FOUR])
+        if allow_three:
+            cells += sorted(own[OPEN_THREE]) + sorted(own[BROKEN_THREE])
+        for cell in cells:
+            if self.defend(player, cell, depth, allow_three):
+                return cell
+        return None
+
+    def defend(self, player, cell, depth, allow_three):
+        """
+        player在cell落子后, 对方的所有应对都仍能被攻破时返回True
+        """
+        board = self.board
+        other = 1 if player == 2 else 2
+        board.put(player, board.get_point(cell))
+        try:
+            own = board.threats[player]
+            opp = board.threats[other]
+            if opp[FIVE]:  # 对手直接成五
+                return False
+            if len(own[FIVE]) >= 2:  # 活四或双四
+                return True
+            if own[FIVE]:
+                defenses = own[FIVE]  # 冲四只能堵
+            elif allow_three and own[OPEN_FOUR]:
+                # 成三后对手可以堵活四点、冲四点, 或者用自己的冲四反击
+                defenses = own[OPEN_FOUR] | own[FOUR] | opp[FOUR] | opp[OPEN_FOUR]
+            else:  # 没有形成威胁
+                return False
+            for defense in sorted(defenses):
+                board.put(other, board.get_point(defense))
+                try:
+                    if self.attack(player, depth - 1, allow_three) is None:
+                        return False
+                finally:
+                    board.undo()
+            return True
+        finally:
+            board.undo()
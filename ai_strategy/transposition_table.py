@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    """
+    置换表
+    以局面的Zobrist哈希值为键缓存搜索信息, 不同落子顺序到达的同一局面共用一个条目
+    条目数超过max_size时淘汰最久未使用的条目
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.table = OrderedDict()
+        self.hit_num = 0  # 命中次数
+        self.miss_num = 0  # 未命中次数
+
+    def __len__(self):
+        return len(self.table)
+
+    def get(self, key):
+        """
+        查询条目, 不存在时返回None
+        """
+        entry = self.table.get(key)
+        if entry is None:
+            self.miss_num += 1
+            return None
+        self.table.move_to_end(key)
+        self.hit_num += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        写入条目, 超出容量时淘汰最久未使用的条目
+        """
+        self.table[key] = entry
+        self.table.move_to_end(key)
+        if len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+
+    def clear(self):
+        self.table.clear()
+        self.hit_num = 0
+        self.miss_num = 0
@@ -0,0 +1,217 @@
+"""
+无界面的模型对战平台
+两个模型交替执黑对弈N局, 在进程池中并行执行, 统计胜率、和棋率、置信区间、Elo差及每步耗时分位数
+
+用法:
+    python arena.py mcts:simulation_times=100 rule -n 200
+    python arena.py "mcts:think_ms=200,batch_size=8" mcts:think_ms=200 -n 100 --workers 8 --json result.json
+模型写作 名称[:参数=值,...], 名称见STRATEGIES, 参数按Python字面量解析后传给模型的构造函数
+"""
+import argparse
+import ast
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ai_strategy.alpha_beta_strategy import AlphaBetaStrategy
+from ai_strategy.mcts_strategy import MCTSStrategy
+from ai_strategy.pattern import get_pattern_table
+from ai_strategy.random_strategy import RandomStrategy
+from ai_strategy.rule_strategy import RuleStrategy
+from gobang import BOARD_SIZE, GoBangGame
+
+STRATEGIES = {
+    "random": RandomStrategy,
+    "rule": RuleStrategy,
+    "mcts": MCTSStrategy,
+    "alphabeta": AlphaBetaStrategy,
+}
+Z = 1.96  # 95%置信区间
+
+
+def parse_strategy(spec):
+    """
+    解析模型描述, 例如"mcts:simulation_times=100,batch_size=8"
+    Returns:
+        名称, 构造参数
+    """
+    name, _, params = spec.partition(":")
+    if name not in STRATEGIES:
+        raise ValueError(f"未知模型{name}, 可选{list(STRATEGIES)}")
+    kwargs = {}
+    for item in filter(None, params.split(",")):
+        key, _, value = item.partition("=")
+        try:
+            kwargs[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            kwargs[key.strip()] = value.strip()
+    return name, kwargs
+
+
+def create_strategy(spec):
+    name, kwargs = parse_strategy(spec)
+    return STRATEGIES[name](**kwargs)
+
+
+def play_game(spec_a, spec_b, a_player, seed, board_size=BOARD_SIZE):
+    """
+    进程池中的单局任务, 每局新建模型, 避免上一局的状态影响本局
+    Args:
+        a_player: 模型a执子的玩家, 1为黑(先手), 2为白
+
+    Returns:
+        {"result": 对局结果(1/2/0), "a_player": a_player, "move_num": 总步数, "times": {"a": [...], "b": [...]}}
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    strategies = {a_player: ("a", create_strategy(spec_a)), 3 - a_player: ("b", create_strategy(spec_b))}
+    times = {"a": [], "b": []}
+    game = GoBangGame(board_size, verbose=False)
+    while game.result is None:
+        key, strategy = strategies[game.cur_player]
+        start = time.perf_counter()
+        action = strategy.model(game.board.position, game.cur_player, history_actions=game.history_actions)
+        times[key].append(time.perf_counter() - start)
+        game.proceed(list(action))
+    for _, strategy in strategies.values():
+        if hasattr(strategy, "shutdown"):
+            strategy.shutdown()
+    return {"result": game.result, "a_player": a_player, "move_num": len(game.history_actions), "times": times}
+
+
+def wilson_interval(k, n, z=Z):
+    """
+    二项比例的Wilson置信区间
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = k / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def elo_diff(score):
+    """
+    由得分率计算Elo差, 得分率为0或1时截断到±800
+    """
+    if score <= 0:
+        return -800.0
+    if score >= 1:
+        return 800.0
+    return max(-800.0, min(800.0, -400 * math.log10(1 / score - 1)))
+
+
+def latency(times):
+    if len(times) == 0:
+        return {}
+    times = np.array(times) * 1000
+    return {"mean_ms": float(times.mean()), "p50_ms": float(np.percentile(times, 50)),
+            "p90_ms": float(np.percentile(times, 90)), "p99_ms": float(np.percentile(times, 99)),
+            "max_ms": float(times.max())}
+
+
+def summarize(spec_a, spec_b, games):
+    """
+    汇总对局结果, 胜负均以模型a的角度统计
+    """
+    n = len(games)
+    win = sum(game["result"] == game["a_player"] for game in games)
+    draw = sum(game["result"] == 0 for game in games)
+    loss = n - win - draw
+    score = (win + 0.5 * draw) / n
+    score_low, score_high = wilson_interval(win + 0.5 * draw, n)  # 和棋记半分
+    by_color = {}
+    for a_player, color in ((1, "black"), (2, "white")):
+        color_games = [game for game in games if game["a_player"] == a_player]
+        by_color[color] = {"games": len(color_games),
+                           "win": sum(game["result"] == a_player for game in color_games),
+                           "draw": sum(game["result"] == 0 for game in color_games)}
+    return {
+        "a": spec_a,
+        "b": spec_b,
+        "games": n,
+        "win": win,
+        "draw": draw,
+        "loss": loss,
+        "win_rate": win / n,
+        "win_rate_ci": wilson_interval(win, n),
+        "draw_rate": draw / n,
+        "draw_rate_ci": wilson_interval(draw, n),
+        "score": score,
+        "score_ci": (score_low, score_high),
+        "elo": elo_diff(score),
+        "elo_ci": (elo_diff(score_low), elo_diff(score_high)),
+        "a_by_color": by_color,
+        "mean_moves": float(np.mean([game["move_num"] for game in games])),
+        "latency": {"a": latency([t for game in games for t in game["times"]["a"]]),
+                    "b": latency([t for game in games for t in game["times"]["b"]])},
+    }
+
+
+def run(spec_a, spec_b, game_num, workers=None, seed=0, board_size=BOARD_SIZE):
+    """
+    对弈game_num局, 第i局模型a在i为偶数时执黑
+    进程启动时预先生成棋型表, 避免首步耗时计入统计
+    """
+    create_strategy(spec_a)  # 提前检查参数
+    create_strategy(spec_b)
+    workers = workers or os.cpu_count()
+    a_players = [1 if i % 2 == 0 else 2 for i in range(game_num)]
+    seeds = [seed * 1000003 + i for i in range(game_num)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_pattern_table) as executor:
+        games = list(executor.map(play_game, [spec_a] * game_num, [spec_b] * game_num, a_players, seeds,
+                                  [board_size] * game_num))
+    summary = summarize(spec_a, spec_b, games)
+    summary["board_size"] = board_size
+    return summary
+
+
+def format_report(summary):
+    def pct(x):
+        return f"{x * 100:.1f}%"
+
+    lines = [f"{summary['a']}  vs  {summary['b']}  ({summary['board_size']}路, {summary['games']}局)",
+             f"胜 {summary['win']}  和 {summary['draw']}  负 {summary['loss']}",
+             f"胜率 {pct(summary['win_rate'])} [{pct(summary['win_rate_ci'][0])}, {pct(summary['win_rate_ci'][1])}]",
+             f"和棋率 {pct(summary['draw_rate'])} "
+             f"[{pct(summary['draw_rate_ci'][0])}, {pct(summary['draw_rate_ci'][1])}]",
+             f"得分率 {pct(summary['score'])} [{pct(summary['score_ci'][0])}, {pct(summary['score_ci'][1])}]",
+             f"Elo差 {summary['elo']:+.0f} [{summary['elo_ci'][0]:+.0f}, {summary['elo_ci'][1]:+.0f}]"]
+    for color, name in (("black", "执黑"), ("white", "执白")):
+        c = summary["a_by_color"][color]
+        lines.append(f"a{name}: {c['games']}局 胜{c['win']} 和{c['draw']}")
+    lines.append(f"平均每局{summary['mean_moves']:.1f}步")
+    for key in ("a", "b"):
+        t = summary["latency"][key]
+        if t:
+            lines.append(f"{key}每步耗时(ms): 平均{t['mean_ms']:.1f} p50 {t['p50_ms']:.1f} p90 {t['p90_ms']:.1f} "
+                         f"p99 {t['p99_ms']:.1f} 最大{t['max_ms']:.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("a", help="模型a")
+    parser.add_argument("b", help="模型b")
+    parser.add_argument("-n", "--games", type=int, default=100, help="对局数")
+    parser.add_argument("--workers", type=int, help="进程数, 默认为CPU核数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--board-size", type=int, default=BOARD_SIZE, help="棋盘边长")
+    parser.add_argument("--json", help="结果保存路径")
+    args = parser.parse_args()
+
+    summary = run(args.a, args.b, args.games, args.workers, args.seed, args.board_size)
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+引擎基础操作和各模型的性能基准测试
+使用固定随机种子和保存在benchmark_positions.json中的局面集合, 结果以JSON输出, 便于不同版本之间比较
+
+用法:
+    python benchmark.py                               # 运行全部基准, 结果打印到标准输出
+    python benchmark.py --output result.json          # 结果保存到文件
+    python benchmark.py --baseline result.json        # 与之前的结果比较, 吞吐量下降超过阈值时返回非0
+    python benchmark.py --generate                    # 重新生成局面集合
+    python benchmark.py --generate --sizes 13         # 只重新生成指定尺寸的局面, 其他尺寸保持不变
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ai_strategy.fast_board import FastBoard
+from ai_strategy.mcts_strategy import NODE_FIELDS, MCTSStrategy
+from ai_strategy.rule_strategy import RuleStrategy
+from gobang import GoBangBoard, GoBangGame
+
+BOARD_SIZES = (6, 10, 15, 19)
+POSITION_NUM = 20  # 每种尺寸的局面数
+POSITIONS_FILE = "benchmark_positions.json"
+SEED = 2024
+MCTS_ITERATIONS = 200
+MCTS_POSITION_NUM = 5  # MCTS耗时较长, 只取前几个局面
+REGRESSION_THRESHOLD = 0.2  # 吞吐量下降超过20%视为性能回退
+
+
+def generate_positions(board_size, num, seed=SEED):
+    """
+    用规则模型自我对弈生成局面, 每局在随机步数处截断, 保证截断时胜负未分
+    Returns:
+        落子序列列表, 玩家1先手, 双方交替落子
+    """
+    rng = random.Random(seed + board_size)
+    random.seed(seed + board_size)
+    rule_strategy = RuleStrategy()
+    positions = []
+    while len(positions) < num:
+        length = rng.randint(1, board_size * board_size // 3)
+        board = FastBoard(board_size, board_size)
+        player = 1
+        moves = []
+        while len(moves) < length:
+            action = tuple(rule_strategy.model(board.position, player, candidates=board.get_candidates()))
+            board.put(player, action)
+            if board.win or board.empty_num == 0:
+                break
+            moves.append(list(action))
+            player = 1 if player == 2 else 2
+        positions.append(moves)
+    return positions
+
+
+def load_positions(path=POSITIONS_FILE):
+    with open(path) as f:
+        return {int(size): positions for size, positions in json.load(f).items()}
+
+
+def to_board(moves, board_size):
+    board = [[0 for _ in range(board_size)] for _ in range(board_size)]
+    for i, (row, column) in enumerate(moves):
+        board[row][column] = 1 if i % 2 == 0 else 2
+    return board
+
+
+def percentile_ms(times):
+    times = np.array(times) * 1000
+    return {"mean_ms": float(times.mean()), "p50_ms": float(np.percentile(times, 50)),
+            "p95_ms": float(np.percentile(times, 95))}
+
+
+def bench_check_winner(positions, board_size, repeat):
+    """
+    全盘胜负判断的吞吐量, 分别测试逐个判断和批量判断
+    """
+    boards = [to_board(moves, board_size) for moves in positions]
+    players = [1 if len(moves) % 2 == 1 else 2 for moves in positions]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board, player in zip(boards, players):
+            GoBangGame.check_winner(board, player)
+    single = repeat * len(boards) / (time.perf_counter() - start)
+    stack = np.array(boards)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        GoBangGame.check_winner_batch(stack, np.array(players))
+    batch = repeat * len(boards) / (time.perf_counter() - start)
+    return {"checks_per_sec": single, "batch_checks_per_sec": batch}
+
+
+def bench_proceed(positions, board_size, repeat):
+    """
+    GoBangGame.proceed的吞吐量, 在各棋盘实现上重放局面的落子序列
+    """
+    res = {}
+    for name, board_cls in (("board", GoBangBoard), ("fast_board", FastBoard)):
+        move_num = 0
+        elapsed = 0
+        for _ in range(repeat):
+            for moves in positions:
+                game = GoBangGame(board_size, board_cls)
+                start = time.perf_counter()
+                for move in moves:
+                    game.proceed(move)
+                elapsed += time.perf_counter() - start
+                move_num += len(moves)
+        res[f"{name}_moves_per_sec"] = move_num / elapsed
+    return res
+
+
+def bench_rule(positions, board_size, repeat):
+    """
+    RuleStrategy.model的单步耗时
+    """
+    strategy = RuleStrategy()
+    times = []
+    for _ in range(repeat):
+        for moves in positions:
+            board = to_board(moves, board_size)
+            player = 1 if len(moves) % 2 == 0 else 2
+            start = time.perf_counter()
+            strategy.model(board, player)
+            times.append(time.perf_counter() - start)
+    return percentile_ms(times)
+
+
+def bench_mcts(positions, board_size, iterations):
+    """
+    MCTS每秒迭代次数和仿真次数, 以及搜索树占用的内存: 已使用节点的字节数和预分配容量的字节数
+    """
+    iteration_num = rollout_num = 0
+    elapsed = 0
+    tree_bytes = capacity_bytes = node_num = 0
+    for moves in positions[:MCTS_POSITION_NUM]:
+        strategy = MCTSStrategy(simulation_times=iterations)
+        strategy.set_root(to_board(moves, board_size), 1 if len(moves) % 2 == 1 else 2)
+        start = time.perf_counter()
+        strategy.search()
+        elapsed += time.perf_counter() - start
+        stats = strategy.stats
+        iteration_num += stats.iteration_num
+        rollout_num += stats.rollout_num
+        tree = strategy.tree
+        node_num += tree.size
+        tree_bytes += sum(tree.size * getattr(tree, name).itemsize for name in NODE_FIELDS)
+        capacity_bytes += sum(getattr(tree, name).nbytes for name in NODE_FIELDS)
+    return {"iterations_per_sec": iteration_num / elapsed, "rollouts_per_sec": rollout_num / elapsed,
+            "tree_nodes": node_num / MCTS_POSITION_NUM, "tree_bytes": tree_bytes / MCTS_POSITION_NUM,
+            "tree_capacity_bytes": capacity_bytes / MCTS_POSITION_NUM, "bytes_per_node": tree_bytes / max(node_num, 1)}
+
+
+def run(positions, board_sizes, repeat, mcts_iterations, seed=SEED):
+    results = {}
+    for board_size in board_sizes:
+        random.seed(seed)
+        size_positions = positions[board_size]
+        results[str(board_size)] = {
+            "check_winner": bench_check_winner(size_positions, board_size, repeat),
+            "proceed": bench_proceed(size_positions, board_size, repeat),
+            "rule_strategy": bench_rule(size_positions, board_size, repeat),
+            "mcts": bench_mcts(size_positions, board_size, mcts_iterations),
+        }
+    return {"meta": {"time": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                     "numpy": np.__version__, "platform": platform.platform(), "seed": seed, "repeat": repeat,
+                     "mcts_iterations": mcts_iterations},
+            "results": results}
+
+
+def compare(result, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    与基线比较吞吐量(名称以_per_sec结尾的指标)
+    Returns:
+        性能回退的指标列表, 每项为(尺寸, 基准, 指标, 基线值, 当前值)
+    """
+    regressions = []
+    for board_size, benches in result["results"].items():
+        for bench, metrics in benches.items():
+            for metric, value in metrics.items():
+                if not metric.endswith("_per_sec"):
+                    continue
+                old = baseline["results"].get(board_size, {}).get(bench, {}).get(metric)
+                if old is not None and value < old * (1 - threshold):
+                    regressions.append((board_size, bench, metric, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=BOARD_SIZES, help="棋盘尺寸")
+    parser.add_argument("--repeat", type=int, default=5, help="基础操作的重复轮数")
+    parser.add_argument("--mcts-iterations", type=int, default=MCTS_ITERATIONS, help="MCTS每个局面的迭代次数")
+    parser.add_argument("--positions", default=POSITIONS_FILE, help="局面集合文件")
+    parser.add_argument("--output", help="结果保存路径, 默认打印到标准输出")
+    parser.add_argument("--baseline", help="用于比较的基线结果")
+    parser.add_argument("--generate", action="store_true", help="重新生成局面集合")
+    args = parser.parse_args()
+
+    if args.generate:
+        positions = {}
+        if os.path.exists(args.positions):  # 保留未指定尺寸的局面
+            positions = {str(size): moves for size, moves in load_positions(args.positions).items()}
+        positions.update({str(size): generate_positions(size, POSITION_NUM) for size in args.sizes})
+        positions = {size: positions[size] for size in sorted(positions, key=int)}
+        with open(args.positions, "w") as f:
+            json.dump(positions, f, separators=(",", ":"))
+        return
+    result = run(load_positions(args.positions), args.sizes, args.repeat, args.mcts_iterations)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f))
+        for board_size, bench, metric, old, value in regressions:
+            print(f"性能回退: {board_size}x{board_size} {bench}.{metric} {old:.1f} -> {value:.1f}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+由棋谱生成开局库文件, 文件格式和查询见ai_strategy/opening_book模块
+统计每局前max_ply步中每个局面(按规范哈希值合并对称局面)下各落点的出现次数、落子方胜局数和和棋数
+
+用法:
+    python build_book.py -o opening_book.bin               # 统计data/下的全部棋谱
+    python build_book.py data/20240101.bin -o opening_book.bin
+"""
+import argparse
+import glob
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from ai_strategy.opening_book import HEADER, MAGIC, MOVE_DTYPE, SLOT_DTYPE, get_canonical_hash
+from dataset import iter_games
+from gobang import BOARD_SIZE, get_symmetry_tables
+
+MAX_PLY = 12  # 只统计每局前MAX_PLY步
+
+
+def build(paths, board_size=BOARD_SIZE, max_ply=MAX_PLY, min_count=1):
+    """
+    统计棋谱开局阶段的落点
+    Returns:
+        {规范哈希值: {规范落点: [次数, 落子方胜局数, 和棋数]}}
+    """
+    _, dst = get_symmetry_tables(board_size)
+    book = defaultdict(lambda: defaultdict(lambda: [0, 0, 0]))
+    for game_size, result, cells in iter_games(paths):
+        if game_size != board_size:
+            continue
+        board = np.zeros((board_size, board_size), dtype=np.int8)
+        for ply, cell in enumerate(cells[:max_ply].tolist()):
+            player = 1 if ply % 2 == 0 else 2
+            key, k = get_canonical_hash(board)
+            entry = book[key][int(dst[k][cell])]
+            entry[0] += 1
+            entry[1] += result == player
+            entry[2] += result == 0
+            board.flat[cell] = player
+    if min_count > 1:
+        for key in list(book):
+            moves = {move: entry for move, entry in book[key].items() if entry[0] >= min_count}
+            if moves:
+                book[key] = moves
+            else:
+                del book[key]
+    return book
+
+
+def save(book, path, board_size=BOARD_SIZE):
+    """
+    保存为开放寻址哈希表, 装载因子不超过0.5
+    """
+    slot_num = 1
+    while slot_num < 2 * max(len(book), 1):
+        slot_num *= 2
+    slots = np.zeros(slot_num, dtype=SLOT_DTYPE)
+    moves = np.zeros(sum(len(entry) for entry in book.values()), dtype=MOVE_DTYPE)
+    offset = 0
+    for key, entry in book.items():
+        i = key & (slot_num - 1)
+        while slots[i]["move_num"] != 0:
+            i = (i + 1) & (slot_num - 1)
+        slots[i] = (key, offset, len(entry), 0)
+        for move, (count, win, draw) in sorted(entry.items()):
+            moves[offset] = (move, count, win, draw)
+            offset += 1
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, board_size, slot_num, len(moves)))
+        f.write(slots.tobytes())
+        f.write(moves.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="二进制棋谱文件, 默认为data/下的全部棋谱")
+    parser.add_argument("-o", "--output", default="opening_book.bin", help="开局库保存路径")
+    parser.add_argument("--board-size", type=int, default=BOARD_SIZE)
+    parser.add_argument("--max-ply", type=int, default=MAX_PLY, help="只统计每局前max_ply步")
+    parser.add_argument("--min-count", type=int, default=1, help="丢弃出现次数少于此值的落点")
+    args = parser.parse_args()
+    paths = args.paths or sorted(glob.glob(os.path.join("data", "*.bin")))
+    book = build(paths, args.board_size, args.max_ply, args.min_count)
+    save(book, args.output, args.board_size)
+    print(f"开局库共{len(book)}个局面, {sum(len(entry) for entry in book.values())}个落点")
+
+
+if __name__ == '__main__':
+    main()
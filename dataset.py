@@ -0,0 +1,138 @@
+"""
+训练数据流水线
+从二进制棋谱(见record模块)中逐局回放, 生成(棋盘, 落子方, 下一步落点, 最终结果)样本, 按批次输出numpy数组
+棋盘的8种对称变换(旋转、翻转)通过预先计算的位置置换表整批向量化完成
+全流程为生成器, 内存占用只与batch_size和shuffle_size有关, 与数据集大小无关
+
+用法:
+    for batch in iter_batches(["data/20240101.bin"], board_size=10, batch_size=256, symmetry="random"):
+        batch["board"], batch["player"], batch["move"], batch["result"], batch["value"]
+"""
+import numpy as np
+
+from gobang import BOARD_SIZE, get_symmetry_tables
+from record import RecordReader
+
+FIELDS = {  # 样本字段及类型
+    "board": np.int8,  # 落子前的棋盘, 形状为(batch, board_size, board_size), 0为空, 1、2为玩家
+    "player": np.int8,  # 落子方
+    "move": np.int16,  # 下一步落点的位置编号row * board_size + column
+    "result": np.int8,  # 对局结果, 0为和棋, 1、2为胜者
+    "value": np.int8,  # 从落子方看的结果, 1为胜, -1为负, 0为和棋
+}
+
+
+def transform(batch, symmetry_ids):
+    """
+    对批次中的每个样本做指定的对称变换
+    Args:
+        batch: 样本批次, 见FIELDS
+        symmetry_ids: 每个样本的变换编号, 取值0-7
+    """
+    boards = batch["board"]
+    n, board_size, _ = boards.shape
+    src, dst = get_symmetry_tables(board_size)
+    res = dict(batch)
+    res["board"] = np.take_along_axis(boards.reshape(n, -1), src[symmetry_ids], axis=1).reshape(boards.shape)
+    res["move"] = dst[symmetry_ids, batch["move"]].astype(FIELDS["move"])
+    return res
+
+
+def augment(batch, symmetry="random", rng=None):
+    """
+    Args:
+        symmetry: None不变换, "random"每个样本随机选择一种变换, "all"每个样本扩展为8种变换(批次扩大为8倍)
+    """
+    n = len(batch["move"])
+    if symmetry is None or n == 0:
+        return batch
+    if symmetry == "random":
+        rng = np.random.default_rng() if rng is None else rng
+        return transform(batch, rng.integers(0, 8, size=n))
+    if symmetry == "all":
+        repeated = {key: np.repeat(value, 8, axis=0) for key, value in batch.items()}
+        return transform(repeated, np.tile(np.arange(8), n))
+    raise ValueError(f"未知的对称变换方式{symmetry}")
+
+
+def iter_games(paths):
+    """
+    依次读取多个棋谱文件中的对局
+    RecordReader返回的动作数组不引用映射内存, 消费方提前停止迭代时文件也能正常关闭
+    """
+    for path in paths:
+        with RecordReader(path) as reader:
+            yield from reader
+
+
+def replay(board_size, result, cells):
+    """
+    回放一局, 一次生成这一局所有步的样本
+    第t步落子前的棋盘包含前t步的棋子, 由下三角掩码一次性填充
+    """
+    cells = np.asarray(cells, dtype=np.int64)
+    move_num = len(cells)
+    players = np.where(np.arange(move_num) % 2 == 0, 1, 2).astype(np.int8)
+    boards = np.zeros((move_num, board_size * board_size), dtype=np.int8)
+    steps, moves = np.tril_indices(move_num, -1)  # 第steps步之前已落下第moves步的棋子
+    boards[steps, cells[moves]] = players[moves]
+    value = np.zeros(move_num, dtype=np.int8)
+    if result != 0:
+        value = np.where(players == result, 1, -1).astype(np.int8)
+    return {
+        "board": boards.reshape(move_num, board_size, board_size),
+        "player": players,
+        "move": cells.astype(FIELDS["move"]),
+        "result": np.full(move_num, result, dtype=np.int8),
+        "value": value,
+    }
+
+
+def iter_batches(paths, board_size=BOARD_SIZE, batch_size=256, symmetry="random", shuffle_size=0, seed=None):
+    """
+    Args:
+        paths: 棋谱文件列表
+        board_size: 只使用此尺寸的对局
+        batch_size: 每批次样本数(对称变换前), 最后一批可能不足
+        symmetry: 对称变换方式, 见augment
+        shuffle_size: 打乱缓冲区的样本数, 缓冲区满时整体打乱后输出, 0表示不打乱
+
+    Returns:
+        批次生成器, 每个批次为{字段: 数组}, 字段见FIELDS
+    """
+    rng = np.random.default_rng(seed)
+    capacity = max(batch_size, shuffle_size)
+    buffer = {key: np.zeros((capacity,) + ((board_size, board_size) if key == "board" else ()), dtype=dtype)
+              for key, dtype in FIELDS.items()}
+    size = 0  # 缓冲区中的样本数
+
+    def drain(final):
+        # 输出缓冲区中的完整批次, 剩余样本移到缓冲区开头
+        nonlocal size
+        if shuffle_size:
+            order = rng.permutation(size)
+            for key in buffer:
+                buffer[key][:size] = buffer[key][order]
+        begin = 0
+        while size - begin >= batch_size or (final and begin < size):
+            end = min(begin + batch_size, size)
+            yield augment({key: value[begin:end].copy() for key, value in buffer.items()}, symmetry, rng)
+            begin = end
+        for key in buffer:
+            buffer[key][:size - begin] = buffer[key][begin:size]
+        size -= begin
+
+    for game_size, result, cells in iter_games(paths):
+        if game_size != board_size or len(cells) == 0:
+            continue
+        samples = replay(game_size, result, cells)
+        begin = 0
+        while begin < len(cells):
+            n = min(len(cells) - begin, capacity - size)
+            for key in buffer:
+                buffer[key][size:size + n] = samples[key][begin:begin + n]
+            size += n
+            begin += n
+            if size == capacity:
+                yield from drain(False)
+    yield from drain(True)
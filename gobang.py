@@ -1,9 +1,44 @@
-import json
+import os
 from datetime import datetime
 
 import numpy as np
 
+from record import RecordWriter
+
 BOARD_SIZE = 10
+ZOBRIST_SEED = 2024  # Zobrist随机数种子, 固定后同一局面在不同进程中的哈希值一致
+_zobrist_tables = {}
+_symmetry_tables = {}
+
+
+def get_zobrist_table(height, width):
+    """
+    Zobrist哈希随机数表, table[player][row * width + column]为player在该位置落子对应的64位随机数
+    table[0]全为0. 同一尺寸的棋盘共用一张表
+    """
+    key = (height, width)
+    if key not in _zobrist_tables:
+        rng = np.random.default_rng([ZOBRIST_SEED, height, width])
+        table = rng.integers(0, 2 ** 64, size=(3, height * width), dtype=np.uint64)
+        table[0] = 0
+        _zobrist_tables[key] = table.tolist()
+    return _zobrist_tables[key]
+
+
+def get_symmetry_tables(board_size):
+    """
+    8种对称变换的位置置换表
+    Returns:
+        src, dst. 形状均为(8, board_size * board_size)
+        变换后的棋盘board_t.ravel() = board.ravel()[src[k]], 原位置cell变换后为dst[k][cell]
+        k=0为恒等变换
+    """
+    if board_size not in _symmetry_tables:
+        grid = np.arange(board_size * board_size).reshape(board_size, board_size)
+        src = np.array([np.rot90(g, r).ravel() for g in (grid, grid.T) for r in range(4)])
+        dst = np.argsort(src, axis=1)
+        _symmetry_tables[board_size] = src, dst
+    return _symmetry_tables[board_size]
 
 
 class GoBangBoard:
@@ -11,21 +46,189 @@ class GoBangBoard:
     棋盘
     """
 
-    def __init__(self):
-        self.position = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]  # 当前棋盘位置
-        self.round_num = 0  # 已对局轮数
+    # 四个方向的步长,与check_winner中的连续类型1-4一一对应
+    DIRECTIONS = ((1, 0, 1), (2, 1, 0), (3, 1, 1), (4, -1, 1))
+    CANDIDATE_RADIUS = 2  # 候选落点半径: 与已有棋子横纵距离均不超过此值的空位置
+
+    def __init__(self, height=BOARD_SIZE, width=BOARD_SIZE, candidate_radius=CANDIDATE_RADIUS):
+        """
+        Args:
+            height: 棋盘行数
+            width: 棋盘列数
+            candidate_radius: 候选落点半径, None或0表示所有空位置都是候选落点
+        """
+        self.candidate_radius = candidate_radius
+        self.position = [[0 for _ in range(width)] for _ in range(height)]  # 当前棋盘位置
+
+    @classmethod
+    def from_position(cls, position, candidate_radius=CANDIDATE_RADIUS):
+        """
+        由列表形式的棋盘创建
+        """
+        board = cls.__new__(cls)
+        board.candidate_radius = candidate_radius
+        board.position = position
+        return board
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        """
+        直接替换棋盘时重新统计已落子数和空位置数,保证增量胜负判断正确
+        """
+        self._position = position
+        self.height = len(position)
+        self.width = len(position[0])
+        self.empty_num = sum(row.count(0) for row in position)  # 剩余空位置数,用于和棋判断
+        self.round_num = self.height * self.width - self.empty_num  # 已对局轮数
+        self.moves = []  # 落子栈,用于悔棋. 直接替换的棋盘无法悔棋到替换之前
+        self.init_candidates()
+        self.init_hash()
+
+    def init_hash(self):
+        """
+        按当前棋盘重新计算Zobrist哈希值, 之后落子和悔棋时增量更新
+        同一局面的落子数决定了下一步的玩家, 因此哈希值不区分下一步玩家
+        """
+        self.zobrist = get_zobrist_table(self.height, self.width)
+        self.hash = 0
+        for row, line in enumerate(self.position):
+            for column, player in enumerate(line):
+                self.hash ^= self.zobrist[player][row * self.width + column]
+
+    def is_empty(self, row, column):
+        return self.position[row][column] == 0
+
+    def init_candidates(self):
+        """
+        按当前棋盘重新统计候选落点
+        neighbor_num[row][column]: 半径范围内的棋子数
+        candidates: neighbor_num大于0的空位置集合, 落子和悔棋时增量维护
+        """
+        self.neighbor_num = [[0 for _ in range(self.width)] for _ in range(self.height)]
+        self.clear_candidates()
+        for row, line in enumerate(self.position):
+            for column, player in enumerate(line):
+                if player != 0:
+                    self.update_candidates(row, column, 1)
+
+    def clear_candidates(self):
+        self.candidates = set()
+
+    def add_candidate(self, point):
+        self.candidates.add(point)
+
+    def discard_candidate(self, point):
+        self.candidates.discard(point)
+
+    def update_candidates(self, row, column, delta):
+        """
+        增量维护候选落点, 落子后delta为1, 悔棋后delta为-1
+        """
+        radius = self.candidate_radius
+        if not radius:
+            return
+        if delta == 1:
+            self.discard_candidate((row, column))
+        for x in range(max(0, row - radius), min(self.height, row + radius + 1)):
+            line = self.neighbor_num[x]
+            for y in range(max(0, column - radius), min(self.width, column + radius + 1)):
+                line[y] += delta
+                if delta == 1:
+                    if line[y] == 1 and self.is_empty(x, y):
+                        self.add_candidate((x, y))
+                elif line[y] == 0:
+                    self.discard_candidate((x, y))
+        if delta == -1 and self.neighbor_num[row][column] > 0:
+            self.add_candidate((row, column))
+
+    def get_candidates(self):
+        """
+        候选落点列表
+        未设置半径时返回所有空位置; 空棋盘返回中心点; 候选落点都已落子时退化为所有空位置
+        """
+        if self.candidate_radius:
+            if len(self.candidates) > 0:
+                return list(self.candidates)
+            if self.round_num == 0:
+                return [(self.height // 2, self.width // 2)]
+        return [(row, column) for row in range(self.height) for column in range(self.width)
+                if self.is_empty(row, column)]
 
     def put(self, player, position):
         """
         落子
         """
         row, column = position
-        assert 0 <= row <= BOARD_SIZE
-        assert 0 <= column <= BOARD_SIZE
+        assert 0 <= row < self.height
+        assert 0 <= column < self.width
         if self.position[row][column] != 0:
             raise ValueError(f"{row,column}处已有棋子")
         self.position[row][column] = player
         self.round_num += 1
+        self.empty_num -= 1
+        self.moves.append(position)
+        self.hash ^= self.zobrist[player][row * self.width + column]
+        self.update_candidates(row, column, 1)
+
+    def undo(self):
+        """
+        悔棋: 撤销最后一次落子
+        Returns:
+            被撤销的落子位置
+        """
+        position = self.moves.pop()
+        row, column = position
+        self.hash ^= self.zobrist[self.position[row][column]][row * self.width + column]
+        self.position[row][column] = 0
+        self.round_num -= 1
+        self.empty_num += 1
+        self.update_candidates(row, column, -1)
+        return position
+
+    def check_winner_last(self, position, n=5):
+        """
+        增量判断胜负: 只检查经过最后落子位置的四条线,结果与GoBangGame.check_winner一致
+        落子前棋局未分胜负时,新出现的n连一定经过最后落子位置
+        Args:
+            position: 最后落子位置
+            n: 连续棋子数
+
+        Returns:
+            winner, con_list. 格式同GoBangGame.check_winner
+        """
+        a = self.position
+        row, column = position
+        player = a[row][column]
+        height, width = len(a), len(a[0])
+        con_list = []
+        for con_type, dx, dy in self.DIRECTIONS:
+            # 向两个方向延伸,统计连续同色棋子数(最多n-1个)
+            back = 0
+            x, y = row - dx, column - dy
+            while back < n - 1 and 0 <= x < height and 0 <= y < width and a[x][y] == player:
+                back += 1
+                x, y = x - dx, y - dy
+            forward = 0
+            x, y = row + dx, column + dy
+            while forward < n - 1 and 0 <= x < height and 0 <= y < width and a[x][y] == player:
+                forward += 1
+                x, y = x + dx, y + dy
+            offsets = range(-back, forward - n + 2)
+            if con_type == 4:  # 左下右上类型的起点行号递减,倒序后与全盘扫描的顺序一致
+                offsets = reversed(offsets)
+            for k in offsets:
+                x1, y1 = row + k * dx, column + k * dy
+                con_list.append([con_type, [x1, y1], [x1 + (n - 1) * dx, y1 + (n - 1) * dy]])
+        winner = None
+        if len(con_list) > 0:
+            winner = player
+        elif self.empty_num == 0:
+            winner = 0  # 和棋
+        return winner, con_list
 
     def print_board(self):
         """
@@ -42,34 +245,58 @@ class GoBangGame:
     history_actions: 对弈历史动作
     result: None, 1, 2, 0. 分别表示:对局进行中、玩家1胜、玩家2胜、和棋
     start_time: 开始时间
+    board_size: 棋盘边长
 
     函数:
-    dump: 对局结束后, 将对弈历史动作保存下来. 不考虑和棋
+    dump: 对局结束后, 将对弈历史动作和结果以二进制棋谱格式保存下来(见record模块), 包括和棋
     proceed: 继续对局, 玩家1、2交替进行
+    undo: 悔棋, 撤销最后一步
     check_end: 判断对局是否结束(获胜或和棋)
     """
 
-    def __init__(self):
+    def __init__(self, board_size=BOARD_SIZE, board_cls=GoBangBoard, verbose=True):
+        """
+        Args:
+            board_size: 棋盘边长, 常用10、15、19
+            board_cls: 棋盘实现, GoBangBoard或其子类ai_strategy.fast_board.FastBoard(增量维护棋型, 基准见benchmark.py)
+            verbose: 对局结束时是否打印胜者
+        """
         self.start_time = datetime.now().strftime("%Y%m%d%H%M%S")
         self.cur_player = 1
         self.history_actions = []
         self.result = None
-        self.board = GoBangBoard()
+        self.board_size = board_size
+        self.board_cls = board_cls
+        self.verbose = verbose
+        self.board = board_cls(board_size, board_size)
 
     def reset(self):
-        self.__init__()
+        self.__init__(self.board_size, self.board_cls, self.verbose)
+
+    def undo(self):
+        """
+        悔棋: 撤销最后一步,恢复对局状态并轮换回该步的玩家
+        """
+        position = self.history_actions.pop()
+        row, column = position
+        self.cur_player = self.board.position[row][column]
+        self.board.undo()
+        self.result = None
 
-    def dump(self):
+    def dump(self, writer=None):
         """
         将对局保存
+        Args:
+            writer: record.RecordWriter. 大量自我对弈时由调用方持有writer批量写入,
+                为None时追加到data/<日期>.bin
         """
         if self.result is None:
             raise ValueError("对局未结束无法保存")
-        if self.result == 0:
+        if writer is not None:
+            writer.write(self.history_actions, self.result, self.board_size)
             return
-        with open(f"data/{self.start_time[:8]}", "a") as f:
-            f.write(json.dumps(self.history_actions) + ";" + str(self.result) + "\n")
-            # json.dump(self.history_actions, f)
+        with RecordWriter(os.path.join("data", f"{self.start_time[:8]}.bin")) as writer:
+            writer.write(self.history_actions, self.result, self.board_size)
 
     def proceed(self, position: [int, int], is_dump=0):
         """
@@ -83,9 +310,10 @@ class GoBangGame:
             raise ValueError("对局已结束, 无法落子")
         self.board.put(self.cur_player, position)
         self.history_actions.append(position)
-        self.result, _ = self.check_winner(self.board.position, self.cur_player)
+        self.result, _ = self.board.check_winner_last(position)
         if self.result is not None:
-            print(f"胜者为{self.cur_player}")
+            if self.verbose:
+                print(f"胜者为{self.cur_player}")
             if is_dump:
                 self.dump()
             return
@@ -165,54 +393,51 @@ class GoBangGame:
         返回所有连续的位置列表,包括[连续类型,起点坐标,终点坐标]
         其中连续类型取值范围是1-4,分别代表横向,纵向,左上右下斜向,左下右上斜向
         """
-        con_list = []
-        # 横向类型
-        con_type = 1
-        a = np.array(board_position)
-        for i in range(len(a)):
-            for j in range(len(a[0]) - n + 1):
-                if np.all(a[i, j:j + n] == player):
-                    con_list.append([con_type, [i, j], [i, j + n - 1]])
-        # 纵向类型
-        con_type = 2
-        for i in range(len(a) - n + 1):
-            for j in range(len(a[0])):
-                if np.all(a[i:i + n, j] == player):
-                    con_list.append([con_type, [i, j], [i + n - 1, j]])
-        # 左上右下斜向类型
-        con_type = 3
-        for i in range(len(a)):
-            for j in range(len(a[0])):
-                begin = a[i, j]
-                neighbors = [begin]
-                for k in range(1, n):
-                    x = i + k
-                    y = j + k
-                    if x >= len(a[0]) or y >= len(a):
-                        break
-                    neighbors.append(a[x, y])
-                if np.all(np.array(neighbors) == player) and len(neighbors) == n:
-                    con_list.append([con_type, [i, j], [i + n - 1, j + n - 1]])
-        # 左下右上斜向类型
-        con_type = 4
-        for i in range(len(a)):
-            for j in range(len(a[0])):
-                begin = a[i, j]
-                neighbors = [begin]
-                for k in range(1, n):
-                    x = i - k
-                    y = j + k
-                    if x < 0 or y >= len(a):
-                        break
-                    neighbors.append(a[x, y])
-                if np.all(np.array(neighbors) == player) and len(neighbors) == n:
-                    con_list.append([con_type, [i, j], [i - n + 1, j + n - 1]])
-        winner = None
-        if len(con_list) > 0:
-            winner = player
-        elif (np.array(board_position) == 0).sum() == 0:
-            winner = 0  # 和棋
-        return winner, con_list
+        winners, con_lists = cls.check_winner_batch([board_position], player, n)
+        return winners[0], con_lists[0]
+
+    @staticmethod
+    def check_winner_batch(boards, player, n=5):
+        """
+        批量判断多个棋盘是否n个棋子相连
+        对每个方向把n个错位切片相加,和等于n的位置即为一个连续起点,全部棋盘一次向量化计算
+        Args:
+            boards: 棋盘堆叠, 形状为(batch, 行, 列)
+            player: 玩家, 可以是单个值或长度为batch的数组
+            n: 连续棋子数
+
+        Returns:
+            winners, con_lists. 每个棋盘的胜者(含义同check_winner)及连续位置列表,格式同check_winner
+        """
+        a = np.asarray(boards)
+        player = np.asarray(player)
+        batch, height, width = a.shape
+        mask = (a == player.reshape(-1, 1, 1)).astype(np.uint8)
+        con_lists = [[] for _ in range(batch)]
+        for con_type, dx, dy in GoBangBoard.DIRECTIONS:
+            # 起点的行列范围,保证n个棋子都在棋盘内
+            x_begin, x_end = (n - 1, height) if dx < 0 else (0, height - dx * (n - 1))
+            y_begin, y_end = 0, width - dy * (n - 1)
+            if x_end <= x_begin or y_end <= y_begin:
+                continue
+            total = np.zeros((batch, x_end - x_begin, y_end - y_begin), dtype=np.uint16)
+            for k in range(n):
+                total += mask[:, x_begin + k * dx:x_end + k * dx, y_begin + k * dy:y_end + k * dy]
+            for b, i, j in np.argwhere(total == n).tolist():
+                i += x_begin
+                j += y_begin
+                con_lists[b].append([con_type, [i, j], [i + (n - 1) * dx, j + (n - 1) * dy]])
+        full = (a != 0).reshape(batch, -1).all(axis=1).tolist()
+        players = np.broadcast_to(player, (batch,)).tolist()
+        winners = []
+        for b in range(batch):
+            if len(con_lists[b]) > 0:
+                winners.append(players[b])
+            elif full[b]:
+                winners.append(0)  # 和棋
+            else:
+                winners.append(None)
+        return winners, con_lists
 
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+"""
+对局服务器(server.py)的压力测试客户端
+建立多个连接, 每个连接上同时进行多局对局, 人类一方在已有棋子附近随机落子, 统计吞吐量和请求延迟分位数,
+结束时查询服务器的统计
+
+用法:
+    python load_client.py --port 8765 --connections 8 --sessions 32 --games 2 --ai rule
+    python load_client.py --unix /tmp/gobang.sock --duration 30 --json result.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from arena import latency
+from gobang import BOARD_SIZE
+
+
+class Connection:
+    """
+    一个连接, 请求带自增id, 由后台读取任务按id分发响应, 同一连接上可以同时有多个请求
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.waiters = {}
+        self.read_task = asyncio.create_task(self.read_loop())
+
+    async def read_loop(self):
+        try:
+            while 1:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.waiters.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.waiters.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("连接已断开"))
+
+    async def request(self, **request):
+        request["id"] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[request["id"]] = future
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.read_task.cancel()
+
+
+def choose_move(board_size, occupied, rng):
+    """
+    在已有棋子周围2格内随机选择空位置, 棋盘为空时下在中心
+    """
+    if not occupied:
+        return [board_size // 2, board_size // 2]
+    candidates = {(row + dr, column + dc) for row, column in occupied for dr in range(-2, 3) for dc in range(-2, 3)}
+    candidates = [[row, column] for row, column in sorted(candidates)
+                  if 0 <= row < board_size and 0 <= column < board_size and (row, column) not in occupied]
+    return rng.choice(candidates)
+
+
+async def play(conn, args, records, errors, deadline, rng):
+    """
+    在一个连接上连续对局, 直到达到局数或时间限制
+    """
+    game_num = 0
+    while game_num < args.games if deadline is None else time.perf_counter() < deadline:
+        ai_player = rng.choice([1, 2])
+        start = time.perf_counter()
+        response = await conn.request(op="new", ai=args.ai, board_size=args.board_size, ai_player=ai_player)
+        records.append(("new", time.perf_counter() - start, response["ok"]))
+        if not response["ok"]:
+            errors.add(response["error"])
+            await asyncio.sleep(0.1)
+            continue
+        session = response["session"]
+        occupied = set()
+        if "ai_move" in response:
+            occupied.add(tuple(response["ai_move"]))
+        result = response["result"]
+        while result is None and len(occupied) < args.board_size * args.board_size:
+            move = choose_move(args.board_size, occupied, rng)
+            start = time.perf_counter()
+            response = await conn.request(op="move", session=session, move=move)
+            records.append(("move", time.perf_counter() - start, response["ok"]))
+            if not response["ok"]:
+                errors.add(response["error"])
+                break
+            occupied.add(tuple(move))
+            if "ai_move" in response:
+                occupied.add(tuple(response["ai_move"]))
+            result = response["result"]
+        await conn.request(op="close", session=session)
+        game_num += 1
+    return game_num
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    records = []  # (请求类型, 延迟秒数, 是否成功)
+    errors = set()  # 错误信息
+    conns = []
+    for _ in range(args.connections):
+        if args.unix:
+            reader, writer = await asyncio.open_unix_connection(args.unix)
+        else:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+        conns.append(Connection(reader, writer))
+    start = time.perf_counter()
+    deadline = None if args.duration is None else start + args.duration
+    games = await asyncio.gather(*[play(conn, args, records, errors, deadline, random.Random(rng.random()))
+                                   for conn in conns for _ in range(args.sessions)])
+    elapsed = time.perf_counter() - start
+    server_stats = await conns[0].request(op="stats")
+    for conn in conns:
+        await conn.close()
+    moves = [seconds for op, seconds, ok in records if op == "move" and ok]
+    return {
+        "connections": args.connections,
+        "sessions": args.connections * args.sessions,
+        "games": sum(games),
+        "requests": len(records),
+        "errors": sum(not ok for _, _, ok in records),
+        "error_messages": sorted(errors),
+        "elapsed": elapsed,
+        "moves_per_second": len(moves) / elapsed,
+        "latency": {"new": latency([seconds for op, seconds, ok in records if op == "new"]), "move": latency(moves)},
+        "server": server_stats,
+    }
+
+
+def format_report(summary):
+    lines = [f"{summary['connections']}个连接, {summary['sessions']}个并发对局, 完成{summary['games']}局, "
+             f"用时{summary['elapsed']:.1f}秒",
+             f"请求{summary['requests']}个, 失败{summary['errors']}个, 每秒{summary['moves_per_second']:.1f}步"]
+    for op, t in summary["latency"].items():
+        if t:
+            lines.append(f"{op}延迟(ms): 平均{t['mean_ms']:.1f} p50 {t['p50_ms']:.1f} p90 {t['p90_ms']:.1f} "
+                         f"p99 {t['p99_ms']:.1f} 最大{t['max_ms']:.1f}")
+    engine = summary["server"].get("engine")
+    if engine:
+        lines.append(f"服务器AI计算(ms): 平均{engine['mean_ms']:.1f} p50 {engine['p50_ms']:.1f} "
+                     f"p99 {engine['p99_ms']:.1f}")
+    for message in summary["error_messages"]:
+        lines.append(f"错误: {message}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix套接字路径")
+    parser.add_argument("--connections", type=int, default=4, help="连接数")
+    parser.add_argument("--sessions", type=int, default=16, help="每个连接上同时进行的对局数")
+    parser.add_argument("--games", type=int, default=1, help="每个并发对局连续进行的局数")
+    parser.add_argument("--duration", type=float, help="持续时间(秒), 设置后忽略--games")
+    parser.add_argument("--ai", default="rule", help="服务器上的模型名称")
+    parser.add_argument("--board-size", type=int, default=BOARD_SIZE, help="棋盘边长")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", help="结果保存路径")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Piskvork/Gomocup协议的引擎入口
+从标准输入逐行读取命令, 向标准输出写回应答, 可由Piskvork等比赛管理器或本地脚本驱动. 支持的命令:
+    START size / RESTART / BEGIN / TURN x,y / BOARD ... DONE / TAKEBACK x,y / INFO key value / ABOUT / END
+坐标x为列, y为行. 对局状态(GoBangGame和模型的内部状态, 如MCTS的搜索树)在命令之间保持, TURN只增量更新
+时间控制: 每步的思考时间取 timeout_turn 和 剩余局时/MOVES_TO_GO 中的较小值, 再扣除安全余量,
+通过AIStrategy.set_think_time传给模型, timeout_turn为0时尽快落子. 剩余局时由引擎自行按每步实际耗时扣减,
+收到INFO time_left时以其为准
+对局不打印胜者, 模型使用默认的verbose=False, 标准输出只有协议应答
+
+用法:
+    python pbrain.py                                  # 默认使用MCTS模型
+    python pbrain.py "alphabeta:max_depth=8"          # 模型写法见arena模块
+"""
+import argparse
+import sys
+import time
+from itertools import zip_longest
+
+from ai_strategy.pattern import get_pattern_table
+from arena import create_strategy
+from gobang import GoBangGame
+
+ABOUT = 'name="gobang", version="1.0", author="cufewxy", country="China"'
+MIN_SIZE = 5
+MAX_SIZE = 32
+TIMEOUT_TURN = 5000  # 没有任何时间限制时的每步思考时间(毫秒)
+TIMEOUT_MATCH = 0  # 默认每局时限(毫秒), 0表示不限
+MOVES_TO_GO = 25  # 按剩余局时分配时间时, 假设还需走的步数
+SAFETY_MS = 50  # 每步预留给通信和建树的时间(毫秒)
+SAFETY_RATIO = 0.1  # 每步预留的时间比例
+MIN_THINK_MS = 10
+
+
+class PiskvorkEngine:
+    """
+    协议状态机, handle每次处理一行命令, 返回需要输出的各行
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.game = None
+        self.timeout_turn = None  # 每步时限(毫秒), None表示未设置, 0表示尽快落子
+        self.timeout_match = TIMEOUT_MATCH
+        self.time_left = None  # 剩余局时(毫秒), None表示不限
+        self.board_lines = None  # 正在读取的BOARD命令中的棋子, 不为None时表示处于BOARD模式
+
+    def get_think_ms(self):
+        """
+        本步的思考时间(毫秒)
+        """
+        if self.timeout_turn == 0:
+            return MIN_THINK_MS
+        budget = float("inf") if self.timeout_turn is None else self.timeout_turn
+        if self.time_left is not None:
+            budget = min(budget, self.time_left / MOVES_TO_GO)
+        if budget == float("inf"):  # 没有任何时间限制
+            budget = TIMEOUT_TURN
+        return max(MIN_THINK_MS, int(budget * (1 - SAFETY_RATIO) - SAFETY_MS))
+
+    def new_game(self, size):
+        self.game = GoBangGame(size, verbose=False)
+        self.strategy.reset()
+        self.time_left = self.timeout_match if self.timeout_match > 0 else None
+
+    def play(self):
+        """
+        轮到引擎落子, 按时间控制计算并落子
+        Returns:
+            落子的应答 "x,y"
+        """
+        start = time.perf_counter()
+        self.strategy.set_think_time(self.get_think_ms())
+        row, column = self.strategy.model(self.game.board.position, self.game.cur_player,
+                                          history_actions=self.game.history_actions)
+        self.game.proceed([int(row), int(column)])
+        if self.time_left is not None:
+            self.time_left = max(0, self.time_left - (time.perf_counter() - start) * 1000)
+        return f"{column},{row}"
+
+    def parse_point(self, text):
+        """
+        Returns:
+            [row, column]
+        """
+        x, y = (int(v) for v in text.split(",")[:2])
+        size = self.game.board_size
+        if not (0 <= x < size and 0 <= y < size):
+            raise ValueError(f"坐标{text}超出棋盘")
+        return [y, x]
+
+    def opponent_move(self, text):
+        row, column = self.parse_point(text)
+        if self.game.board.position[row][column] != 0:
+            raise ValueError(f"位置{text}已有棋子")
+        if self.game.result is not None:
+            raise ValueError("对局已结束")
+        self.game.proceed([row, column])
+
+    def load_board(self, stones):
+        """
+        按BOARD命令重建对局, stones为[(row, column, 1为己方/2为对方)]
+        双方棋子数相等时己方先手(执黑), 对方多一子时己方后手, 其他情况不合法
+        棋盘不记录落子顺序, 双方棋子交替排列作为落子历史, 保证history_actions是一个合法的对局过程
+        """
+        own = [[row, column] for row, column, field in stones if field == 1]
+        opp = [[row, column] for row, column, field in stones if field == 2]
+        if len(own) == len(opp):
+            black, white = own, opp
+        elif len(opp) == len(own) + 1:
+            black, white = opp, own
+        else:
+            raise ValueError("双方棋子数不合法")
+        game = GoBangGame(self.game.board_size, verbose=False)
+        for point in [point for pair in zip_longest(black, white) for point in pair if point is not None]:
+            if game.result is not None or game.board.position[point[0]][point[1]] != 0:
+                raise ValueError("棋盘上已分胜负或有重复的棋子")
+            game.proceed(point)
+        if game.result is not None:
+            raise ValueError("棋盘上已分胜负")
+        self.game = game
+        self.strategy.reset()
+
+    def handle(self, line):
+        line = line.strip()
+        if not line:
+            return []
+        if self.board_lines is not None:
+            if line.upper() == "DONE":
+                lines = self.board_lines
+                self.board_lines = None
+                stones = []
+                try:
+                    for text in lines:
+                        row, column = self.parse_point(text)
+                        stones.append((row, column, int(text.split(",")[2])))
+                except (ValueError, IndexError):
+                    return ["ERROR 无效的BOARD命令"]
+                if any(field not in (1, 2) for _, _, field in stones):
+                    return ["ERROR 不支持连续对局(field为3)的棋子"]
+                try:
+                    self.load_board(stones)
+                except ValueError as e:
+                    return [f"ERROR {e}"]
+                return [self.play()]
+            self.board_lines.append(line)
+            return []
+        command, _, arg = line.partition(" ")
+        command = command.upper()
+        arg = arg.strip()
+        if command == "START":
+            try:
+                size = int(arg)
+            except ValueError:
+                return ["ERROR 无效的棋盘大小"]
+            if not MIN_SIZE <= size <= MAX_SIZE:
+                return [f"ERROR 只支持{MIN_SIZE}-{MAX_SIZE}路棋盘"]
+            get_pattern_table()  # 预先生成棋型表, 避免计入第一步的耗时
+            self.new_game(size)
+            return ["OK"]
+        if command == "RECTSTART":
+            return ["ERROR 只支持正方形棋盘"]
+        if command == "INFO":
+            self.info(arg)
+            return []
+        if command == "ABOUT":
+            return [ABOUT]
+        if command == "END":
+            raise EOFError()
+        if self.game is None:
+            return ["ERROR 需要先发送START"]
+        if command == "RESTART":
+            self.new_game(self.game.board_size)
+            return ["OK"]
+        if command == "BEGIN":
+            return [self.play()]
+        if command == "TURN":
+            try:
+                self.opponent_move(arg)
+            except ValueError as e:
+                return [f"ERROR {e}"]
+            if self.game.result is not None:
+                return ["MESSAGE 对局已结束"]
+            return [self.play()]
+        if command == "BOARD":
+            self.board_lines = []
+            return []
+        if command == "TAKEBACK":
+            try:
+                point = self.parse_point(arg)
+            except ValueError as e:
+                return [f"ERROR {e}"]
+            if not self.game.history_actions or self.game.history_actions[-1] != point:
+                return ["ERROR 只能撤销最后一步"]
+            self.game.undo()
+            self.strategy.reset()
+            return ["OK"]
+        return ["UNKNOWN"]
+
+    def info(self, arg):
+        key, _, value = arg.partition(" ")
+        key = key.lower()
+        try:
+            value = int(value)
+        except ValueError:
+            return
+        if key == "timeout_turn":
+            self.timeout_turn = value
+        elif key == "timeout_match":
+            self.timeout_match = value
+            if self.game is not None and value > 0 and self.time_left is None:
+                self.time_left = value
+            elif value == 0:
+                self.time_left = None
+        elif key == "time_left":
+            if self.timeout_match > 0:
+                self.time_left = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("strategy", nargs="?", default="mcts", help="模型描述")
+    args = parser.parse_args()
+
+    engine = PiskvorkEngine(create_strategy(args.strategy))
+    for line in sys.stdin:
+        try:
+            responses = engine.handle(line)
+        except EOFError:
+            break
+        for response in responses:
+            sys.stdout.write(response + "\n")
+        sys.stdout.flush()
+    if hasattr(engine.strategy, "shutdown"):  # 关闭根并行进程池
+        engine.strategy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
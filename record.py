@@ -0,0 +1,253 @@
+"""
+二进制棋谱格式
+数据文件(.bin): 文件头MAGIC之后依次存放每局棋谱, 每局为
+    头部: 棋盘边长(u8), 结果(u8, 0为和棋, 1、2为胜者), 步数(u16)
+    动作: 每步一个位置编号row * board_size + column, 棋盘不超过256格时为u8, 否则为u16
+索引文件(.idx): 每局在数据文件中的偏移量(u64), 用于随机访问. 缺失或与数据文件不一致时由数据文件重建
+所有整数均为小端序
+
+用法:
+    python record.py convert data/20240101 data/20240101.bin     # 将旧的文本棋谱转换为二进制格式
+    python record.py index data/20240101.bin                     # 重建索引文件
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"GBR1"
+HEADER = struct.Struct("<BBH")  # 棋盘边长, 结果, 步数
+INDEX_DTYPE = np.dtype("<u8")
+
+
+def get_move_dtype(board_size):
+    return np.dtype("<u1") if board_size * board_size <= 256 else np.dtype("<u2")
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def scan_offsets(data):
+    """
+    顺序扫描数据文件的内容, 只读取每局的头部
+    Args:
+        data: 数据文件的全部内容(bytes或mmap)
+
+    Returns:
+        每局偏移量的数组
+    """
+    offsets = []
+    offset = len(MAGIC)
+    while offset < len(data):
+        board_size, _, move_num = HEADER.unpack_from(data, offset)
+        offsets.append(offset)
+        offset += HEADER.size + move_num * get_move_dtype(board_size).itemsize
+    return np.array(offsets, dtype=INDEX_DTYPE)
+
+
+def check_index(path):
+    """
+    索引文件是否与数据文件一致: 只检查首尾, 最后一个偏移量处的棋谱需正好结束于数据文件末尾,
+    可以发现索引文件缺失、被截断或属于其他数据文件
+    """
+    idx = index_path(path)
+    if not os.path.exists(idx) or os.path.getsize(idx) % INDEX_DTYPE.itemsize != 0:
+        return False
+    size = os.path.getsize(path)
+    if os.path.getsize(idx) == 0:
+        return size <= len(MAGIC)
+    with open(idx, "rb") as f:
+        first = int(np.frombuffer(f.read(INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)[0])
+        f.seek(-INDEX_DTYPE.itemsize, os.SEEK_END)
+        last = int(np.frombuffer(f.read(INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)[0])
+    if first != len(MAGIC) or last + HEADER.size > size:
+        return False
+    with open(path, "rb") as f:
+        f.seek(last)
+        board_size, _, move_num = HEADER.unpack(f.read(HEADER.size))
+    return last + HEADER.size + move_num * get_move_dtype(board_size).itemsize == size
+
+
+def rebuild_index(path):
+    """
+    扫描数据文件重建索引文件
+    Returns:
+        对局数
+    """
+    with open(path, "rb") as f:
+        offsets = scan_offsets(f.read())
+    with open(index_path(path), "wb") as f:
+        f.write(offsets.tobytes())
+    return len(offsets)
+
+
+class RecordWriter:
+    """
+    追加写入二进制棋谱, 棋谱先缓存在内存中, 每积累buffer_size局或关闭时批量写入数据文件和索引文件
+    支持with语句
+    """
+    BUFFER_SIZE = 1024
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.offsets = []  # 缓存中各局的偏移量
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+            open(index_path(path), "wb").close()
+        elif not check_index(path):  # 索引文件缺失或不一致, 追加前先重建
+            rebuild_index(path)
+        self.size = os.path.getsize(path)  # 已写入文件的字节数
+
+    def write(self, actions, result, board_size):
+        """
+        Args:
+            actions: 动作列表, 每个动作为(row, column)
+            result: 对局结果, 0为和棋, 1、2为胜者
+            board_size: 棋盘边长
+        """
+        cells = np.array([row * board_size + column for row, column in actions], dtype=np.int64)
+        self.offsets.append(self.size + len(self.buffer))
+        self.buffer += HEADER.pack(board_size, result, len(cells))
+        self.buffer += cells.astype(get_move_dtype(board_size)).tobytes()
+        if len(self.offsets) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.offsets:
+            return
+        with open(self.path, "ab") as f:
+            f.write(self.buffer)
+        with open(index_path(self.path), "ab") as f:
+            f.write(np.array(self.offsets, dtype=INDEX_DTYPE).tobytes())
+        self.size += len(self.buffer)
+        self.buffer = bytearray()
+        self.offsets = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordReader:
+    """
+    以内存映射方式读取二进制棋谱, 每局的动作从映射内存中切片复制为只读numpy数组,
+    不持有映射内存的引用, 因此关闭时不受调用方是否还持有数组的影响
+    支持按编号随机访问: 索引文件与数据文件一致时以内存映射方式读取索引,
+    否则在首次随机访问时扫描数据文件, 在内存中重建偏移量. 顺序遍历时不需要索引
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}不是二进制棋谱文件")
+        self.offsets = None
+        if check_index(path):
+            idx = index_path(path)
+            if os.path.getsize(idx) == 0:
+                self.offsets = np.zeros(0, dtype=INDEX_DTYPE)
+            else:
+                self.offsets = np.memmap(idx, dtype=INDEX_DTYPE, mode="r")
+
+    def read(self, offset):
+        """
+        Returns:
+            (棋盘边长, 结果, 位置编号数组), 下一局的偏移量
+        """
+        board_size, result, move_num = HEADER.unpack_from(self.data, offset)
+        dtype = get_move_dtype(board_size)
+        begin = offset + HEADER.size
+        end = begin + move_num * dtype.itemsize
+        cells = np.frombuffer(self.data[begin:end], dtype=dtype)
+        return (board_size, result, cells), end
+
+    def get_offsets(self):
+        if self.offsets is None:  # 索引文件缺失或不一致
+            self.offsets = scan_offsets(self.data)
+        return self.offsets
+
+    def __len__(self):
+        return len(self.get_offsets())
+
+    def __getitem__(self, i):
+        return self.read(int(self.get_offsets()[i]))[0]
+
+    def __iter__(self):
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            game, offset = self.read(offset)
+            yield game
+
+    def get_actions(self, i):
+        """
+        第i局的动作列表, 格式同GoBangGame.history_actions
+        """
+        board_size, result, cells = self[i]
+        return [list(divmod(int(cell), board_size)) for cell in cells], result
+
+    def close(self):
+        self.offsets = None
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_text(text_path, record_path, board_size):
+    """
+    将GoBangGame.dump之前保存的文本棋谱(每行为"动作JSON;结果")转换为二进制格式
+    Returns:
+        转换的对局数
+    """
+    num = 0
+    with open(text_path) as f, RecordWriter(record_path) as writer:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            actions, result = line.rsplit(";", 1)
+            writer.write(json.loads(actions), int(result), board_size)
+            num += 1
+    return num
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="将文本棋谱转换为二进制格式")
+    convert_parser.add_argument("text_path")
+    convert_parser.add_argument("record_path")
+    convert_parser.add_argument("--board-size", type=int, default=10, help="棋盘边长, 旧的文本棋谱均为10路")
+    index_parser = subparsers.add_parser("index", help="由数据文件重建索引文件")
+    index_parser.add_argument("record_path")
+    args = parser.parse_args()
+    if args.command == "convert":
+        num = convert_text(args.text_path, args.record_path, args.board_size)
+        print(f"已转换{num}局")
+    elif args.command == "index":
+        num = rebuild_index(args.record_path)
+        print(f"索引共{num}局")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+五子棋对局服务器
+基于asyncio, 协议为按行分隔的JSON(NDJSON), 监听TCP端口或Unix套接字, 同时托管大量对局(GoBangGame)
+AI计算在有界的进程池中执行: 每个工作进程是一个单进程执行器, 对局创建时分配给当前对局数最少的进程,
+对局的模型实例常驻在该进程中, 因此每局有独立的模型状态(如MCTS的搜索树), 各局之间互不影响
+
+请求(可带id字段, 原样返回在响应中):
+    {"op": "new", "ai": "mcts", "board_size": 10, "ai_player": 2}   新建对局, ai为服务器配置的模型名称
+    {"op": "move", "session": 1, "move": [4, 5]}                     人类落子, 对局未结束时返回AI的落子
+    {"op": "close", "session": 1}                                    结束对局, 释放模型
+    {"op": "stats"}                                                  服务器统计, 包括各类请求的延迟分位数
+响应: {"ok": true, ...} 或 {"ok": false, "error": 错误信息}
+    AI计算失败时撤销本次人类落子, 对局保持原状, 可以重新发送move; AI先手的对局在new失败时直接关闭
+    new和move的响应中, ai_move为AI的落子, result为对局结果(None为进行中, 1、2为胜者, 0为和棋)
+
+背压: 每个连接最多同时处理max_inflight个请求, 达到上限后暂停读取该连接, 由TCP流控反压到客户端;
+提交到进程池的AI请求总数不超过max_pending, 超出的请求排队等待; 同一对局的请求按到达顺序依次处理
+连接断开时关闭该连接创建的所有对局
+
+用法:
+    python server.py --port 8765 --workers 4
+    python server.py --unix /tmp/gobang.sock --ai mcts=mcts:think_ms=100 --ai rule=rule
+    python load_client.py --port 8765 --connections 8 --sessions 32       # 压力测试
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai_strategy.pattern import get_pattern_table
+from arena import create_strategy, latency
+from gobang import BOARD_SIZE, GoBangGame
+
+DEFAULT_AI = {  # 模型名称 -> 模型描述(格式见arena模块)
+    "mcts": "mcts:think_ms=200",
+    "alphabeta": "alphabeta:think_ms=200",
+    "rule": "rule",
+    "random": "random",
+}
+MAX_SESSIONS = 10000
+MAX_INFLIGHT = 64  # 每个连接同时处理的请求数上限
+PENDING_PER_WORKER = 4  # 每个工作进程排队的AI请求数上限
+LATENCY_WINDOW = 10000  # 延迟统计只保留最近这么多个请求
+MAX_LINE = 1 << 16  # 单行请求的最大字节数
+
+_strategies = {}  # 工作进程中的模型实例, 对局编号 -> 模型
+
+
+def engine_move(session_id, spec, position, player, history_actions):
+    """
+    工作进程中的任务: 计算对局的AI落子, 首次调用时创建模型
+    Returns:
+        落子位置, 计算耗时(秒)
+    """
+    strategy = _strategies.get(session_id)
+    if strategy is None:
+        strategy = _strategies[session_id] = create_strategy(spec)
+    start = time.perf_counter()
+    action = strategy.model(position, player, history_actions=history_actions)
+    return [int(x) for x in action], time.perf_counter() - start
+
+
+def engine_close(session_id):
+    strategy = _strategies.pop(session_id, None)
+    if strategy is not None and hasattr(strategy, "shutdown"):
+        strategy.shutdown()
+
+
+class RequestError(Exception):
+    """
+    请求不合法, 错误信息返回给客户端
+    """
+
+
+class Session:
+    def __init__(self, session_id, spec, board_size, ai_player, worker, owner):
+        self.id = session_id
+        self.spec = spec
+        self.game = GoBangGame(board_size, verbose=False)
+        self.ai_player = ai_player
+        self.worker = worker  # 工作进程编号
+        self.owner = owner  # 创建对局的连接
+        self.lock = asyncio.Lock()  # 同一对局的请求依次处理
+        self.closed = False
+
+
+class Metrics:
+    """
+    服务器统计: 请求数、错误数, 各类请求的端到端延迟和AI计算耗时(最近LATENCY_WINDOW个)
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.request_num = defaultdict(int)
+        self.error_num = defaultdict(int)
+        self.latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.engine_time = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, op, seconds, ok):
+        self.request_num[op] += 1
+        if not ok:
+            self.error_num[op] += 1
+        self.latency[op].append(seconds)
+
+    def as_dict(self):
+        uptime = time.perf_counter() - self.start_time
+        return {
+            "uptime": uptime,
+            "requests": dict(self.request_num),
+            "errors": dict(self.error_num),
+            "qps": sum(self.request_num.values()) / max(uptime, 1e-9),
+            "latency": {op: latency(list(times)) for op, times in self.latency.items()},
+            "engine": latency(list(self.engine_time)),
+        }
+
+
+class GameServer:
+    def __init__(self, ai=None, workers=None, max_sessions=MAX_SESSIONS, max_inflight=MAX_INFLIGHT,
+                 max_pending=None):
+        """
+        Args:
+            ai: {模型名称: 模型描述}, 客户端只能选择其中的模型
+            workers: 工作进程数, 默认为CPU核数
+            max_sessions: 同时存在的对局数上限
+            max_inflight: 每个连接同时处理的请求数上限
+            max_pending: 提交到进程池的AI请求数上限, 默认为workers * PENDING_PER_WORKER
+        """
+        self.ai = dict(DEFAULT_AI if ai is None else ai)
+        for spec in self.ai.values():
+            create_strategy(spec)  # 提前检查参数
+        self.workers = workers or os.cpu_count()
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.max_pending = max_pending or self.workers * PENDING_PER_WORKER
+        self.executors = []
+        self.worker_sessions = [0] * self.workers  # 各工作进程的对局数
+        self.sessions = {}
+        self.next_id = 1
+        self.connection_num = 0
+        self.pending = None
+        self.pending_num = 0  # 已提交到进程池的AI请求数
+        self.metrics = Metrics()
+
+    def start_workers(self):
+        self.executors = [ProcessPoolExecutor(max_workers=1, initializer=get_pattern_table)
+                          for _ in range(self.workers)]
+        self.pending = asyncio.Semaphore(self.max_pending)
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executors = []
+
+    async def run_engine(self, session, func, *args):
+        async with self.pending:
+            self.pending_num += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executors[session.worker], func, *args)
+            finally:
+                self.pending_num -= 1
+
+    async def ai_move(self, session):
+        """
+        Returns:
+            AI的落子, 计算耗时(毫秒)
+        """
+        game = session.game
+        action, seconds = await self.run_engine(session, engine_move, session.id, session.spec, game.board.position,
+                                                session.ai_player, game.history_actions)
+        self.metrics.engine_time.append(seconds)
+        game.proceed(action)
+        return action, seconds * 1000
+
+    def get_session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise RequestError("对局不存在")
+        return session
+
+    async def op_new(self, request, owner):
+        name = request.get("ai", next(iter(self.ai)))
+        if name not in self.ai:
+            raise RequestError(f"未知模型{name}, 可选{list(self.ai)}")
+        board_size = request.get("board_size", BOARD_SIZE)
+        if not isinstance(board_size, int) or not 5 <= board_size <= 19:
+            raise RequestError("棋盘边长需为5-19的整数")
+        ai_player = request.get("ai_player", 2)
+        if ai_player not in (1, 2):
+            raise RequestError("ai_player需为1或2")
+        if len(self.sessions) >= self.max_sessions:
+            raise RequestError("对局数已达上限")
+        worker = min(range(self.workers), key=self.worker_sessions.__getitem__)
+        session = Session(self.next_id, self.ai[name], board_size, ai_player, worker, owner)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        self.worker_sessions[worker] += 1
+        owner.add(session.id)
+        response = {"session": session.id, "board_size": board_size, "ai_player": ai_player}
+        if ai_player == 1:
+            try:
+                async with session.lock:
+                    response["ai_move"], response["ai_ms"] = await self.ai_move(session)
+            except Exception:
+                await self.close_session(session)  # AI先手却无法落子, 对局无法继续
+                raise
+        response["result"] = session.game.result
+        return response
+
+    async def op_move(self, request, owner):
+        session = self.get_session(request)
+        async with session.lock:
+            if session.closed:
+                raise RequestError("对局不存在")
+            game = session.game
+            if game.result is not None:
+                raise RequestError("对局已结束")
+            if game.cur_player == session.ai_player:
+                raise RequestError("未轮到人类落子")
+            move = request.get("move")
+            if not (isinstance(move, list) and len(move) == 2 and all(isinstance(x, int) for x in move)):
+                raise RequestError("move需为[row, column]")
+            row, column = move
+            if not (0 <= row < game.board_size and 0 <= column < game.board_size) or \
+                    game.board.position[row][column] != 0:
+                raise RequestError("不合法的落子位置")
+            game.proceed(move)
+            response = {}
+            if game.result is None:
+                try:
+                    response["ai_move"], response["ai_ms"] = await self.ai_move(session)
+                except Exception:
+                    game.undo()  # 撤销人类的落子, 客户端可以重新发送move
+                    raise
+            response["result"] = game.result
+            return response
+
+    async def op_close(self, request, owner):
+        await self.close_session(self.get_session(request))
+        return {}
+
+    async def op_stats(self, request, owner):
+        stats = self.metrics.as_dict()
+        stats.update(sessions=len(self.sessions), connections=self.connection_num, pending=self.pending_num,
+                     workers=self.workers, worker_sessions=list(self.worker_sessions))
+        return stats
+
+    async def close_session(self, session):
+        async with session.lock:
+            if session.closed:
+                return
+            session.closed = True
+            del self.sessions[session.id]
+            session.owner.discard(session.id)
+            self.worker_sessions[session.worker] -= 1
+            if self.executors:
+                await self.run_engine(session, engine_close, session.id)
+
+    async def handle_request(self, line, owner):
+        start = time.perf_counter()
+        request_id = None
+        op = "invalid"
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("请求需为JSON对象")
+            request_id = request.get("id")
+            op = request.get("op")
+            handler = getattr(self, f"op_{op}", None) if isinstance(op, str) else None
+            if handler is None:
+                op = "invalid"
+                raise RequestError("未知的op")
+            response = {"ok": True}
+            response.update(await handler(request, owner))
+        except (RequestError, ValueError) as e:
+            response = {"ok": False, "error": str(e)}
+        except Exception as e:  # 工作进程异常等, 不影响其他请求
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if request_id is not None:
+            response["id"] = request_id
+        self.metrics.record(op, time.perf_counter() - start, response["ok"])
+        return response
+
+    async def handle_connection(self, reader, writer):
+        self.connection_num += 1
+        owner = set()  # 本连接创建的对局
+        inflight = asyncio.Semaphore(self.max_inflight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def serve(line):
+            try:
+                response = await self.handle_request(line, owner)
+                async with write_lock:
+                    writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                inflight.release()
+
+        try:
+            while 1:
+                await inflight.acquire()  # 达到上限时不再读取, 形成背压
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):  # 连接断开或单行过长
+                    inflight.release()
+                    break
+                if not line:
+                    inflight.release()
+                    break
+                if not line.strip():
+                    inflight.release()
+                    continue
+                task = asyncio.create_task(serve(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for session_id in list(owner):
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    await self.close_session(session)
+            self.connection_num -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix=None):
+        self.start_workers()
+        try:
+            if unix is not None:
+                server = await asyncio.start_unix_server(self.handle_connection, unix, limit=MAX_LINE)
+            else:
+                server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+            print(f"服务器已启动: {unix or f'{host}:{port}'}, {self.workers}个工作进程")
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix套接字路径, 设置后不监听TCP端口")
+    parser.add_argument("--workers", type=int, help="工作进程数, 默认为CPU核数")
+    parser.add_argument("--ai", action="append", help="可选模型, 格式为 名称=模型描述, 可重复. 默认为DEFAULT_AI")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS, help="同时存在的对局数上限")
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT, help="每个连接同时处理的请求数上限")
+    parser.add_argument("--max-pending", type=int, help="提交到进程池的AI请求数上限")
+    args = parser.parse_args()
+
+    ai = None
+    if args.ai:
+        ai = dict(item.split("=", 1) for item in args.ai)
+    server = GameServer(ai, args.workers, args.max_sessions, args.max_inflight, args.max_pending)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+测试共用的对局生成函数
+"""
+import random
+
+from gobang import GoBangGame
+
+
+def random_game(board_size, rng=None, max_moves=None):
+    """
+    随机对局直到分出胜负、下满或达到max_moves步
+    Returns:
+        落子列表, 结果(1/2/0, 未结束为None)
+    """
+    rng = rng or random.Random(0)
+    game = GoBangGame(board_size, verbose=False)
+    cells = [[row, column] for row in range(board_size) for column in range(board_size)]
+    rng.shuffle(cells)
+    for action in cells[:max_moves]:
+        game.proceed(action)
+        if game.result is not None:
+            break
+    return game.history_actions, game.result
+
+
+def to_position(actions, board_size):
+    """
+    按落子顺序(黑先)摆出棋盘
+    """
+    position = [[0] * board_size for _ in range(board_size)]
+    for i, (row, column) in enumerate(actions):
+        position[row][column] = 1 if i % 2 == 0 else 2
+    return position
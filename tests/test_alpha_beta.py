@@ -0,0 +1,60 @@
+"""
+AlphaBetaStrategy: 必胜、必防、时间限制
+"""
+import random
+import time
+
+import pytest
+
+from ai_strategy.alpha_beta_strategy import AlphaBetaStrategy
+from ai_strategy.pattern import get_pattern_table
+from tests.helpers import random_game, to_position
+
+
+def make_position(black, white, board_size=10):
+    position = [[0] * board_size for _ in range(board_size)]
+    for row, column in black:
+        position[row][column] = 1
+    for row, column in white:
+        position[row][column] = 2
+    return position
+
+
+@pytest.mark.parametrize("threat_search", [True, False])
+def test_win_and_block(threat_search):
+    """
+    白方有活三时黑方仍应直接成五
+    """
+    position = make_position([(4, 1), (4, 2), (4, 3), (4, 4)], [(4, 0), (6, 6), (6, 7), (6, 8)])
+    strategy = AlphaBetaStrategy(think_ms=200, threat_search=threat_search)
+    assert strategy.model(position, 1) == [4, 5]
+    strategy.reset()
+    assert strategy.model(position, 2) == [4, 5]
+
+
+def test_block_open_three():
+    """
+    对手有活三且我方无冲四时, 必须在活三的成活四点或冲四点落子
+    """
+    position = make_position([(4, 3), (4, 4), (4, 5), (9, 9)], [(0, 0), (0, 2), (9, 0)])
+    strategy = AlphaBetaStrategy(think_ms=200, threat_search=False)
+    assert tuple(strategy.model(position, 2)) in {(4, 1), (4, 2), (4, 6), (4, 7)}
+
+
+@pytest.mark.parametrize("think_ms", [20, 100])
+def test_time_limit(think_ms):
+    """
+    超时后返回已完成迭代的着法, 不修改传入的局面
+    """
+    get_pattern_table()  # 棋型表只在首次使用时计算, 不计入思考时间
+    rng = random.Random(0)
+    actions, _ = random_game(15, rng, max_moves=20)
+    position = to_position(actions, 15)
+    expected = [list(line) for line in position]
+    player = 1 if len(actions) % 2 == 0 else 2
+    strategy = AlphaBetaStrategy(think_ms=think_ms)
+    start = time.perf_counter()
+    row, column = strategy.model(position, player)
+    assert time.perf_counter() - start < think_ms / 1000 + 0.1
+    assert position == expected and position[row][column] == 0
+    assert strategy.last_stats.action == (row, column)
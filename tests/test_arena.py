@@ -0,0 +1,58 @@
+"""
+arena模块: 模型描述解析、单局对弈和统计
+"""
+import pytest
+
+from ai_strategy.mcts_strategy import MCTSStrategy
+from arena import (create_strategy, elo_diff, format_report, parse_strategy, play_game, run, summarize,
+                   wilson_interval)
+
+
+def test_parse_strategy():
+    assert parse_strategy("mcts:simulation_times=100,batch_size=8") == ("mcts", {"simulation_times": 100,
+                                                                               "batch_size": 8})
+    strategy = create_strategy("mcts:think_ms=50")
+    assert isinstance(strategy, MCTSStrategy) and strategy.think_ms == 50
+    with pytest.raises(ValueError):
+        create_strategy("unknown")
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert low == pytest.approx(1 - high) and low == pytest.approx(0.4038, abs=1e-3)
+    assert wilson_interval(10, 10)[1] == 1.0 and wilson_interval(0, 10)[0] == 0.0
+
+
+def test_elo_diff():
+    assert elo_diff(0.5) == 0
+    assert elo_diff(0.75) == pytest.approx(190.85, abs=0.01)
+    assert elo_diff(0.25) == pytest.approx(-elo_diff(0.75))
+    assert elo_diff(0) == -800 and elo_diff(1) == 800
+
+
+def test_summarize():
+    games = [{"result": 1, "a_player": 1, "move_num": 9, "times": {"a": [0.001], "b": [0.002]}},
+             {"result": 1, "a_player": 2, "move_num": 11, "times": {"a": [0.003], "b": []}},
+             {"result": 0, "a_player": 1, "move_num": 100, "times": {"a": [], "b": []}},
+             {"result": 1, "a_player": 2, "move_num": 20, "times": {"a": [], "b": []}}]
+    summary = summarize("a", "b", games)
+    assert (summary["win"], summary["draw"], summary["loss"]) == (1, 1, 2)
+    assert summary["score"] == pytest.approx(1.5 / 4)
+    assert summary["a_by_color"] == {"black": {"games": 2, "win": 1, "draw": 1},
+                                     "white": {"games": 2, "win": 0, "draw": 0}}
+    assert summary["mean_moves"] == 35
+    assert summary["latency"]["a"]["max_ms"] == pytest.approx(3)
+
+
+def test_play_game_and_run(capsys):
+    """
+    单局对弈结果合法, 对局不向标准输出打印; run交替执黑
+    """
+    game = play_game("rule", "random", 2, 0, board_size=8)
+    assert game["result"] in (0, 1, 2) and game["a_player"] == 2
+    assert len(game["times"]["a"]) + len(game["times"]["b"]) == game["move_num"]
+    assert capsys.readouterr().out == ""
+    summary = run("rule", "random", 4, workers=1, board_size=8)
+    assert summary["games"] == 4 and summary["a_by_color"]["black"]["games"] == 2
+    assert "rule  vs  random" in format_report(summary)
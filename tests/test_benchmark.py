@@ -0,0 +1,32 @@
+"""
+benchmark模块
+"""
+import json
+
+import benchmark
+from ai_strategy.mcts_strategy import NODE_FIELDS, Tree
+
+
+def test_tree_bytes():
+    """
+    搜索树内存按全部字段和已使用的节点数统计, 预分配容量单独统计
+    """
+    positions = benchmark.generate_positions(6, 3, 0)
+    result = benchmark.bench_mcts(positions, 6, 20)
+    tree = Tree(1, 6)
+    assert result["bytes_per_node"] == sum(getattr(tree, name).itemsize for name in NODE_FIELDS)
+    assert result["tree_bytes"] <= result["tree_capacity_bytes"]
+
+
+def test_generate_sizes(tmp_path, monkeypatch):
+    """
+    --generate只重新生成--sizes指定的尺寸, 保留文件中的其他尺寸
+    """
+    path = tmp_path / "positions.json"
+    path.write_text(json.dumps({"10": [[[4, 4]]]}))
+    monkeypatch.setattr(benchmark, "POSITION_NUM", 2)
+    monkeypatch.setattr("sys.argv", ["benchmark.py", "--generate", "--sizes", "6", "--positions", str(path)])
+    benchmark.main()
+    positions = json.loads(path.read_text())
+    assert list(positions) == ["6", "10"]
+    assert positions["10"] == [[[4, 4]]] and len(positions["6"]) == 2
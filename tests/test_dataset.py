@@ -0,0 +1,131 @@
+"""
+dataset模块: 对称变换、样本回放和批次流水线
+"""
+import random
+
+import numpy as np
+import pytest
+
+from dataset import FIELDS, augment, iter_batches, iter_games, replay, transform
+from gobang import get_symmetry_tables
+from record import RecordWriter
+from tests.helpers import random_game, to_position
+
+BOARD_SIZES = (6, 10, 15)
+
+
+@pytest.fixture
+def record_path(tmp_path):
+    """
+    10路和6路对局混合的棋谱文件
+    """
+    rng = random.Random(0)
+    path = str(tmp_path / "games.bin")
+    games = []
+    with RecordWriter(path) as writer:
+        for board_size in (10, 6, 10, 10):
+            actions, result = random_game(board_size, rng)
+            writer.write(actions, result, board_size)
+            games.append((actions, result, board_size))
+    return path, games
+
+
+@pytest.mark.parametrize("board_size", BOARD_SIZES)
+def test_symmetry_tables(board_size):
+    """
+    8种对称变换互不相同且为置换, src和dst互逆, 与numpy的旋转和转置一致
+    """
+    src, dst = get_symmetry_tables(board_size)
+    cell_num = board_size * board_size
+    assert src.shape == dst.shape == (8, cell_num)
+    assert len({tuple(row) for row in src.tolist()}) == 8
+    np.testing.assert_array_equal(src[0], np.arange(cell_num))
+    for k in range(8):
+        np.testing.assert_array_equal(np.sort(src[k]), np.arange(cell_num))
+        np.testing.assert_array_equal(src[k][dst[k]], np.arange(cell_num))
+    grid = np.arange(cell_num).reshape(board_size, board_size)
+    expected = [np.rot90(g, r).ravel() for g in (grid, grid.T) for r in range(4)]
+    np.testing.assert_array_equal(src, np.array(expected))
+
+
+def test_replay():
+    actions, result = random_game(10, random.Random(1))
+    cells = [row * 10 + column for row, column in actions]
+    samples = replay(10, result, cells)
+    for t, (row, column) in enumerate(actions):
+        assert samples["board"][t].tolist() == to_position(actions[:t], 10)
+        assert samples["player"][t] == (1 if t % 2 == 0 else 2)
+        assert samples["move"][t] == row * 10 + column
+        assert samples["value"][t] == (0 if result == 0 else 1 if samples["player"][t] == result else -1)
+    assert set(samples) == set(FIELDS) and all(samples[key].dtype == dtype for key, dtype in FIELDS.items())
+
+
+def test_transform():
+    """
+    变换后落点仍落在变换后棋盘的同一颗棋子对应的空位上
+    """
+    actions, result = random_game(10, random.Random(2))
+    samples = replay(10, result, [row * 10 + column for row, column in actions])
+    for k in range(8):
+        res = transform(samples, np.full(len(actions), k))
+        for t in range(len(actions)):
+            expected = np.rot90(samples["board"][t] if k < 4 else samples["board"][t].T, k % 4)
+            np.testing.assert_array_equal(res["board"][t], expected)
+            board = samples["board"][t].copy()
+            board.flat[samples["move"][t]] = 3  # 标记落点
+            marked = np.rot90(board if k < 4 else board.T, k % 4)
+            assert marked.flat[res["move"][t]] == 3
+    np.testing.assert_array_equal(transform(samples, np.zeros(len(actions), dtype=int))["board"], samples["board"])
+
+
+def test_augment():
+    actions, result = random_game(6, random.Random(3))
+    samples = replay(6, result, [row * 6 + column for row, column in actions])
+    assert augment(samples, None) is samples
+    all_samples = augment(samples, "all")
+    assert len(all_samples["move"]) == 8 * len(actions)
+    np.testing.assert_array_equal(all_samples["board"][::8], samples["board"])  # 每组第一个为恒等变换
+    randomized = augment(samples, "random", np.random.default_rng(0))
+    assert len(randomized["move"]) == len(actions)
+    np.testing.assert_array_equal(np.sort(randomized["board"].reshape(len(actions), -1), axis=1),
+                                  np.sort(samples["board"].reshape(len(actions), -1), axis=1))
+    with pytest.raises(ValueError):
+        augment(samples, "unknown")
+
+
+@pytest.mark.parametrize("shuffle_size", [0, 7, 100])
+def test_iter_batches(record_path, shuffle_size):
+    """
+    只输出指定尺寸的对局, 每个样本恰好输出一次, 不打乱时顺序与回放一致
+    """
+    path, games = record_path
+    expected = [replay(board_size, result, [row * board_size + column for row, column in actions])
+                for actions, result, board_size in games if board_size == 10]
+    expected_moves = np.concatenate([samples["move"] for samples in expected])
+    batches = list(iter_batches([path], board_size=10, batch_size=16, symmetry=None, shuffle_size=shuffle_size,
+                                seed=0))
+    assert all(len(batch["move"]) == 16 for batch in batches[:-1]) and 0 < len(batches[-1]["move"]) <= 16
+    moves = np.concatenate([batch["move"] for batch in batches])
+    boards = np.concatenate([batch["board"] for batch in batches])
+    assert len(moves) == len(expected_moves)
+    if shuffle_size == 0:
+        np.testing.assert_array_equal(moves, expected_moves)
+        np.testing.assert_array_equal(boards, np.concatenate([samples["board"] for samples in expected]))
+    else:
+        keys = sorted(zip(moves.tolist(), boards.sum(axis=(1, 2)).tolist()))
+        expected_boards = np.concatenate([samples["board"] for samples in expected])
+        assert keys == sorted(zip(expected_moves.tolist(), expected_boards.sum(axis=(1, 2)).tolist()))
+    symmetric = list(iter_batches([path], board_size=10, batch_size=16, symmetry="all"))
+    assert sum(len(batch["move"]) for batch in symmetric) == 8 * len(expected_moves)
+
+
+def test_iter_games_early_stop(record_path):
+    """
+    提前停止迭代时文件正常关闭, 已取出的数组仍可用
+    """
+    path, games = record_path
+    iterator = iter_games([path])
+    board_size, result, cells = next(iterator)
+    iterator.close()
+    actions = games[0][0]
+    assert cells.tolist() == [row * board_size + column for row, column in actions]
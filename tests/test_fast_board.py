@@ -0,0 +1,86 @@
+"""
+FastBoard: 增量维护的棋型、候选落点、哈希值和快速仿真
+"""
+import random
+
+import numpy as np
+import pytest
+
+from ai_strategy.fast_board import FastBoard
+from ai_strategy.pattern import FIVE, scan_threats
+from ai_strategy.threat_search import ThreatSearch
+from gobang import GoBangBoard
+from tests.helpers import random_game
+
+BOARD_SIZES = (6, 10, 15)
+
+
+def assert_same_board(fast, board):
+    assert fast.position == board.position
+    assert fast.hash == board.hash
+    assert fast.hash == GoBangBoard.from_position(board.position).hash
+    assert sorted(fast.get_candidates()) == sorted(board.get_candidates())
+    levels = scan_threats(board.position).max(axis=1)  # [player - 1, row, column]
+    for player in (1, 2):
+        cell_levels = np.zeros((board.height, board.width), dtype=np.int8)
+        for level, cells in enumerate(fast.threats[player]):
+            for cell in cells:
+                assert fast.cell_level[player][cell] == level
+                cell_levels[fast.get_point(cell)] = level
+        np.testing.assert_array_equal(cell_levels, levels[player - 1])
+
+
+@pytest.mark.parametrize("board_size", BOARD_SIZES)
+def test_fast_board_put_undo(board_size):
+    """
+    FastBoard随机落子和悔棋后, 棋型、候选落点和哈希值与GoBangBoard及全盘扫描一致
+    """
+    rng = random.Random(board_size)
+    fast = FastBoard(board_size, board_size)
+    board = GoBangBoard(board_size, board_size)
+    player = 1
+    for _ in range(board_size * board_size * 2):
+        if board.moves and (board.empty_num == 0 or rng.random() < 0.3):
+            assert fast.undo() == board.undo()
+            player = 1 if player == 2 else 2
+        else:
+            action = rng.choice(board.get_candidates())
+            fast.put(player, action)
+            board.put(player, action)
+            player = 1 if player == 2 else 2
+        assert_same_board(fast, board)
+
+
+@pytest.mark.parametrize("solver", [None, ThreatSearch()])
+def test_rollout_restores_board(solver):
+    """
+    仿真结束后悔棋恢复局面, 胜者为成五的一方或未分胜负
+    """
+    rng = random.Random(0)
+    random.seed(0)
+    for _ in range(20):
+        actions, _ = random_game(10, rng, max_moves=12)
+        board = FastBoard(10, 10)
+        for i, action in enumerate(actions):
+            board.put(1 if i % 2 == 0 else 2, action)
+        if board.win:
+            continue
+        expected = GoBangBoard.from_position([list(line) for line in board.position])
+        step_num = board.rollout_step_num
+        winner = board.rollout(1 if len(actions) % 2 == 0 else 2, 30, solver)
+        assert winner in (None, 0, 1, 2)
+        assert board.rollout_step_num > step_num or winner is not None
+        assert_same_board(board, expected)
+        assert not board.win
+
+
+def test_win_flag():
+    board = FastBoard(6, 6)
+    for column in range(4):
+        board.put(1, (0, column))
+        board.put(2, (1, column))
+    assert board.cell_level[1][board.get_index(0, 4)] == FIVE
+    board.put(1, (0, 4))
+    assert board.win and board.check_winner_last((0, 4))[0] == 1
+    board.undo()
+    assert not board.win
@@ -0,0 +1,95 @@
+"""
+gobang模块: 胜负判断和对局流程
+"""
+import random
+
+import pytest
+
+from ai_strategy.fast_board import FastBoard
+from gobang import GoBangBoard, GoBangGame
+from tests.helpers import random_game, to_position
+
+BOARD_SIZES = (6, 10, 15)
+GAME_NUM = 5
+
+
+@pytest.mark.parametrize("board_size", BOARD_SIZES)
+@pytest.mark.parametrize("board_cls", [GoBangBoard, FastBoard])
+def test_check_winner_last(board_size, board_cls):
+    """
+    增量胜负判断与全盘扫描一致
+    """
+    rng = random.Random(board_size)
+    for _ in range(GAME_NUM):
+        actions, _ = random_game(board_size, rng)
+        board = board_cls(board_size, board_size)
+        for i, action in enumerate(actions):
+            player = 1 if i % 2 == 0 else 2
+            board.put(player, action)
+            winner, con_list = board.check_winner_last(action)
+            expected_winner, expected_con_list = GoBangGame.check_winner(board.position, player)
+            if expected_winner is None and board.empty_num == 0:
+                expected_winner = 0
+            assert winner == expected_winner
+            assert sorted(con_list) == sorted(expected_con_list)
+
+
+def test_proceed_result():
+    game = GoBangGame(6, verbose=False)
+    for action in [[0, 0], [1, 0], [0, 1], [1, 1], [0, 2], [1, 2], [0, 3], [1, 3]]:
+        game.proceed(action)
+    assert game.result is None and game.cur_player == 1
+    game.proceed([0, 4])
+    assert game.result == 1
+    with pytest.raises(ValueError):
+        game.proceed([2, 2])
+    game.undo()
+    assert game.result is None and game.cur_player == 1 and game.board.position[0][4] == 0
+
+
+def test_draw():
+    """
+    下满且无人成五时判和棋
+    """
+    rows = [[1, 1, 2, 2, 1, 1], [2, 2, 1, 1, 2, 2]] * 3  # 每行、每列、斜线都不超过两子相连
+    order = sorted(((row, column) for row in range(6) for column in range(6)), key=lambda p: rows[p[0]][p[1]])
+    black = [p for p in order if rows[p[0]][p[1]] == 1]
+    white = [p for p in order if rows[p[0]][p[1]] == 2]
+    game = GoBangGame(6, verbose=False)
+    for b, w in zip(black, white):
+        game.proceed(list(b))
+        game.proceed(list(w))
+    assert game.result == 0
+
+
+def test_check_winner_batch():
+    """
+    批量判断与逐个判断一致, player可以逐个棋盘指定
+    """
+    rng = random.Random(0)
+    boards, players = [], []
+    for _ in range(20):
+        actions, _ = random_game(10, rng)
+        boards.append(to_position(actions, 10))
+        players.append(1 if len(actions) % 2 == 1 else 2)
+    winners, con_lists = GoBangGame.check_winner_batch(boards, players)
+    for board, player, winner, con_list in zip(boards, players, winners, con_lists):
+        assert (winner, con_list) == GoBangGame.check_winner(board, player)
+        assert winner in (player, 0, None)
+    assert any(winner == player for winner, player in zip(winners, players))
+
+
+def test_board_cls():
+    """
+    GoBangGame在两种棋盘实现上的对局结果一致, 悔棋后状态相同
+    """
+    for seed in range(5):
+        actions, result = random_game(10, random.Random(seed))
+        game = GoBangGame(10, board_cls=FastBoard, verbose=False)
+        for action in actions:
+            game.proceed(action)
+        assert game.result == result
+        game.undo()
+        expected = GoBangBoard.from_position(game.board.position)
+        assert game.board.hash == expected.hash
+        assert sorted(game.board.get_candidates()) == sorted(expected.get_candidates())
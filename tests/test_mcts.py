@@ -0,0 +1,283 @@
+"""
+MCTSStrategy: 搜索棋盘、预算、搜索树、置换表、叶并行和搜索树复用
+"""
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from ai_strategy.mcts_strategy import MCTSStrategy, Tree
+from gobang import GoBangBoard, GoBangGame
+
+OPENING = [[4, 4], [4, 5], [5, 5]]  # 规则和威胁空间搜索都不会命中的平稳局面
+
+
+def play(actions, board_size=10):
+    game = GoBangGame(board_size, verbose=False)
+    for action in actions:
+        game.proceed(action)
+    return game
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    random.seed(0)
+    np.random.seed(0)
+
+
+def test_search_board_restored():
+    """
+    搜索在同一个搜索棋盘上落子悔棋, 不修改传入的棋盘, 结束后搜索棋盘处于落子后的局面
+    """
+    game = play(OPENING)
+    position = copy.deepcopy(game.board.position)
+    strategy = MCTSStrategy(simulation_times=200)
+    action = strategy.model(game.board.position, game.cur_player, game.history_actions)
+    assert strategy.last_stats.rule is None  # 经过了搜索
+    assert game.board.position == position
+    game.proceed(list(action))
+    assert strategy.cur_board == game.board.position
+    assert strategy.search_board.hash == GoBangBoard.from_position(game.board.position).hash
+    assert tuple(strategy.search_board.moves[-1]) == tuple(action)
+
+
+def test_simulation_budget():
+    game = play(OPENING)
+    strategy = MCTSStrategy(simulation_times=150)
+    strategy.model(game.board.position, game.cur_player, game.history_actions)
+    assert 0 < strategy.last_stats.iteration_num <= 150
+
+
+def test_time_budget():
+    """
+    时间预算从进入model开始计算, 包括规则和威胁空间搜索
+    """
+    game = play(OPENING)
+    strategy = MCTSStrategy(think_ms=100)
+    strategy.model(game.board.position, game.cur_player, game.history_actions)
+    assert strategy.last_stats.iteration_num > 0
+    assert strategy.last_stats.total_time < 0.1 + 0.1
+    strategy.model(game.board.position, game.cur_player, game.history_actions, think_ms=30)  # 覆盖初始化时的设置
+    assert strategy.last_stats.total_time < 0.03 + 0.1
+
+
+def assert_tree_consistent(tree):
+    """
+    根节点子树中每个节点的访问次数不少于其子节点访问次数之和, 没有残留的虚拟损失
+    """
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        children = tree.children(node)
+        assert (tree.visit_num[node] >= 0) and tree.win_num[node] <= tree.visit_num[node]
+        if len(children):
+            assert tree.visit_num[children.start:children.stop].sum() <= tree.visit_num[node]
+            assert np.all(tree.parent[children.start:children.stop] == node)
+            stack.extend(children)
+
+
+def set_root(strategy, actions, board_size=10):
+    game = play(actions, board_size)
+    strategy.set_root(game.board.position, 1 if game.cur_player == 2 else 2)
+    return game
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_batch_search(workers):
+    """
+    叶并行: 回溯后撤销全部虚拟损失, 根节点访问次数等于仿真次数
+    """
+    strategy = MCTSStrategy(batch_size=8, workers=workers, threat_search=False)
+    set_root(strategy, OPENING)
+    try:
+        iteration_num = strategy.search(simulation_times=64)
+    finally:
+        strategy.shutdown()
+    assert iteration_num >= 64
+    tree = strategy.tree
+    assert tree.visit_num[tree.root_node] == iteration_num
+    assert strategy.stats.rollout_num > 0
+    assert_tree_consistent(tree)
+    assert strategy.cur_board == play(OPENING).board.position
+
+
+def test_virtual_loss_spreads_batch():
+    """
+    同一批次的叶子节点因虚拟损失而互不相同
+    """
+    strategy = MCTSStrategy(batch_size=8, threat_search=False)
+    set_root(strategy, OPENING)
+    strategy.search(simulation_times=1)  # 第一批次扩展根节点
+    tree = strategy.tree
+    children = tree.children(tree.root_node)
+    assert (tree.visit_num[children.start:children.stop] > 0).sum() == 8
+
+
+def test_tree_children():
+    tree = Tree(2, 10)
+    root = tree.root_node
+    tree.add_children(root, [(4, 4), (4, 5), (5, 5)])
+    assert [tree.get_action(child) for child in tree.children(root)] == [(4, 4), (4, 5), (5, 5)]
+    assert all(tree.player[child] == 1 and tree.parent[child] == root for child in tree.children(root))
+    child = tree.find_child(root, (4, 5))
+    tree.add_children(child, [(3, 3), (6, 6)])
+    tree.visit_num[child] = 5
+    assert tree.find_child(root, (9, 9)) is None
+    new_node = tree.append_child(root, (0, 0))
+    assert [tree.get_action(c) for c in tree.children(root)] == [(4, 4), (4, 5), (5, 5), (0, 0)]
+    assert tree.get_action(new_node) == (0, 0) and tree.parent[new_node] == root
+    moved = tree.find_child(root, (4, 5))
+    assert tree.visit_num[moved] == 5  # 搬迁后保留统计量, 孙节点指向新位置
+    assert all(tree.parent[grandchild] == moved for grandchild in tree.children(moved))
+    for _ in range(Tree.INIT_CAPACITY):  # 扩容后数据不变
+        tree.add_nodes(-1, 1, [-1])
+    assert [tree.get_action(c) for c in tree.children(moved)] == [(3, 3), (6, 6)]
+
+
+def test_ucb_selection():
+    """
+    向量化UCB: 先选未访问的子节点, 都访问过后选UCB值最大的
+    """
+    strategy = MCTSStrategy(threat_search=False)
+    set_root(strategy, OPENING)
+    tree = strategy.tree
+    root = tree.root_node
+    tree.add_children(root, [(0, 0), (0, 1), (0, 2)])
+    first = tree.first_child[root]
+    tree.visit_num[root] = 20
+    tree.visit_num[first:first + 3] = [10, 10, 0]
+    tree.win_num[first:first + 3] = [9, 1, 0]
+    assert strategy.get_child_max_ucb(root) == first + 2
+    tree.visit_num[first + 2] = 10
+    assert strategy.get_child_max_ucb(root) == first
+    assert strategy.get_child_max_visit(root) == first  # 访问次数相同时选胜率高的
+
+
+def test_transposition_prior():
+    """
+    置换表条目累计经各路径回溯的结果, 同一局面经不同落子顺序扩展出的节点以条目为先验,
+    先验只影响UCB, 不计入visit_num, 不影响最终选择
+    """
+    strategy = MCTSStrategy(threat_search=False, candidate_radius=1)  # 候选落点少, 搜索树较深, 容易出现置换
+    set_root(strategy, OPENING)
+    strategy.search(simulation_times=1000)
+    tree, tt = strategy.tree, strategy.tt
+    root = tree.root_node
+    assert tt.get(int(tree.hash[root]))[0] == tree.visit_num[root]
+    for child in tree.children(root):  # 根节点的子节点只经一条路径到达
+        entry = tt.get(int(tree.hash[child]))
+        if tree.visit_num[child]:
+            assert entry[:2] == [tree.visit_num[child], tree.win_num[child]]
+    assert tree.prior_visit[:tree.size].sum() > 0  # 出现了置换
+    transposed = np.flatnonzero(tree.prior_visit[:tree.size])
+    assert np.all(tree.visit_num[transposed] <= [tt.get(int(tree.hash[node]))[0] for node in transposed])
+    assert_tree_consistent(tree)
+    first = tree.first_child[root]
+    tree.prior_visit[first] = tree.prior_win[first] = 10 ** 6  # 先验很大的子节点
+    best = strategy.get_child_max_visit(root)
+    assert tree.visit_num[best] == tree.visit_num[tree.children(root).start:tree.children(root).stop].max()
+
+
+def test_no_transposition_table():
+    strategy = MCTSStrategy(threat_search=False, tt_size=0)
+    set_root(strategy, OPENING)
+    strategy.search(simulation_times=100)
+    assert strategy.tt is None and strategy.tree.prior_visit[:strategy.tree.size].sum() == 0
+
+
+def subtree_stats(tree):
+    """
+    Returns:
+        根节点子树中各节点的{动作路径: (访问次数, 获胜次数)}
+    """
+    stats = {}
+    stack = [(tree.root_node, ())]
+    while stack:
+        node, path = stack.pop()
+        stats[path] = (int(tree.visit_num[node]), int(tree.win_num[node]))
+        stack.extend((child, path + (tree.get_action(child),)) for child in tree.children(node))
+    return stats
+
+
+def subtree_stats_from(tree, node):
+    """
+    以node为根的子树的subtree_stats
+    """
+    root_node = tree.root_node
+    tree.root_node = node
+    try:
+        return subtree_stats(tree)
+    finally:
+        tree.root_node = root_node
+
+
+def test_compact():
+    """
+    压缩后只保留根节点子树, 优先保留访问次数多的子树, 保留的节点统计量不变
+    """
+    strategy = MCTSStrategy(threat_search=False)
+    game = set_root(strategy, OPENING)
+    strategy.search(simulation_times=300)
+    tree = strategy.tree
+    root_child = strategy.get_child_max_visit(tree.root_node)
+    action = tree.get_action(root_child)
+    strategy.move_root(action)  # 原根节点和其他子树成为无用节点
+    before = subtree_stats(tree)
+    old_size = tree.size
+    assert tree.compact(old_size) == len(before) < old_size
+    assert tree.root_node == 0 and tree.parent[0] == -1 and subtree_stats(tree) == before
+    assert tree.get_size_depth()[0] == tree.size
+    max_nodes = len(before) // 2
+    size = tree.compact(max_nodes)
+    assert size == tree.size <= max_nodes
+    after = subtree_stats(tree)
+    assert all(before[path] == stat for path, stat in after.items())
+    assert_tree_consistent(tree)
+    assert len(tree.children(0)) == len([path for path in before if len(path) == 1])  # 先保留访问多的上层节点
+    game.proceed(list(action))
+    assert strategy.cur_board == game.board.position
+    strategy.search(simulation_times=100)  # 被剪掉子树的节点可以重新扩展
+    assert_tree_consistent(strategy.tree)
+
+
+@pytest.mark.parametrize("use_history", [True, False])
+def test_sync_root_reuse(use_history):
+    """
+    对手落子后根节点走到对应的子节点, 保留其子树的搜索结果
+    """
+    game = play(OPENING)
+    strategy = MCTSStrategy(simulation_times=300, threat_search=False)
+    history = game.history_actions if use_history else None
+    action = strategy.model(game.board.position, game.cur_player, history)
+    game.proceed(list(action))
+    tree = strategy.tree
+    node = strategy.get_child_max_visit(tree.root_node)  # 对手选择搜索最多的应手
+    reply = tree.get_action(node)
+    visit_num = int(tree.visit_num[node])
+    expected = subtree_stats_from(tree, node)
+    game.proceed(list(reply))
+    history = game.history_actions if use_history else None
+    strategy.sync_root(game.board.position, game.cur_player, history)
+    assert visit_num > 0 and strategy.tree.visit_num[strategy.tree.root_node] == visit_num
+    assert subtree_stats(strategy.tree) == expected
+    assert strategy.cur_board == game.board.position
+    game.undo()
+    game.undo()
+    history = game.history_actions if use_history else None
+    strategy.sync_root(game.board.position, game.cur_player, history)  # 悔棋时重新建树
+    assert strategy.tree.size == 1 and strategy.cur_board == game.board.position
+
+
+def test_limit_tree():
+    """
+    搜索中节点数超过max_nodes时压缩搜索树
+    """
+    game = play(OPENING)
+    strategy = MCTSStrategy(simulation_times=1000, threat_search=False, max_nodes=500)
+    strategy.model(game.board.position, game.cur_player, game.history_actions)
+    tree = strategy.tree
+    assert strategy.last_stats.compact_num > 0
+    assert tree.size <= 500 + game.board_size ** 2  # 只在迭代之间压缩, 最多超出一次扩展的节点数
+    assert_tree_consistent(tree)
+    assert tree.visit_num[tree.root_node] > 0
@@ -0,0 +1,90 @@
+"""
+开局库: 规范哈希、由棋谱生成开局库和查询
+"""
+import random
+
+import numpy as np
+import pytest
+
+from ai_strategy.opening_book import OpeningBook, get_canonical_hash
+from build_book import build, save
+from gobang import get_symmetry_tables
+from record import RecordWriter
+from tests.helpers import random_game
+
+BOARD_SIZES = (6, 10, 15)
+
+
+@pytest.mark.parametrize("board_size", BOARD_SIZES)
+def test_canonical_hash(board_size):
+    """
+    对称的局面规范哈希值相同, 规范落点换算回原局面后位置一致
+    """
+    rng = random.Random(board_size)
+    src, dst = get_symmetry_tables(board_size)
+    actions, _ = random_game(board_size, rng)
+    board = np.zeros(board_size * board_size, dtype=np.int8)
+    for i, (row, column) in enumerate(actions[:8]):
+        board[row * board_size + column] = 1 if i % 2 == 0 else 2
+    key, k = get_canonical_hash(board.reshape(board_size, board_size))
+    for t in range(8):
+        transformed = board[src[t]].reshape(board_size, board_size)
+        t_key, t_k = get_canonical_hash(transformed)
+        assert t_key == key
+        cell = int(np.flatnonzero(board)[0])
+        assert src[t_k][dst[k][cell]] == dst[t][cell]  # 同一个棋子在规范局面中的位置相同
+
+
+GAME = [[4, 3], [4, 5], [5, 5], [0, 0], [6, 6], [0, 9], [7, 7], [9, 0], [3, 3]]  # 黑胜
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    """
+    GAME和它的转置各3局, 两者的局面互为对称
+    """
+    record_path = str(tmp_path / "games.bin")
+    with RecordWriter(record_path) as writer:
+        for i in range(6):
+            actions = GAME if i % 2 == 0 else [[column, row] for row, column in GAME]
+            writer.write(actions, 1, 10)
+        writer.write([[2, 2], [4, 4]], 2, 10)  # 只出现一次的开局
+        writer.write([[1, 1]], 1, 6)  # 其他尺寸不统计
+    path = str(tmp_path / "book.bin")
+    book = build([record_path], 10, max_ply=4)
+    save(book, path, 10)
+    return path, book
+
+
+def test_build(book_path):
+    _, book = book_path
+    key, k = get_canonical_hash(np.zeros((10, 10), dtype=int))
+    _, dst = get_symmetry_tables(10)
+    assert {int(move): entry for move, entry in book[key].items()} == {
+        int(dst[k][43]): [3, 3, 0], int(dst[k][34]): [3, 3, 0], int(dst[k][22]): [1, 0, 0]}
+    for black in ((4, 3), (3, 4)):  # 对称的局面合并为同一条记录
+        position = np.zeros((10, 10), dtype=int)
+        position[black] = 1
+        key, _ = get_canonical_hash(position)
+        assert [entry for entry in book[key].values()] == [[6, 0, 0]]
+
+
+def test_probe(book_path):
+    path, _ = book_path
+    opening_book = OpeningBook(path)
+    position = [[0] * 10 for _ in range(10)]
+    assert opening_book.probe(position) in ([4, 3], [3, 4])
+    position[4][3] = 1
+    assert opening_book.probe(position) is None  # 白方得分率为0
+    position[4][5] = 2
+    assert opening_book.probe(position) == [5, 5]
+    position = [[0] * 10 for _ in range(10)]
+    position[3][4] = 1
+    position[5][4] = 2
+    assert opening_book.probe(position) == [5, 5]  # 规范落点换算回原棋盘
+    assert opening_book.probe([[0] * 6 for _ in range(6)]) is None  # 尺寸不同
+    assert OpeningBook(path, min_count=4).probe([[0] * 10 for _ in range(10)]) is None
+
+
+def test_missing_book(tmp_path):
+    assert OpeningBook(str(tmp_path / "missing.bin")).probe([[0] * 10 for _ in range(10)]) is None
@@ -0,0 +1,115 @@
+"""
+Piskvork协议引擎: 命令处理、BOARD解析和时间控制
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import pbrain
+from arena import create_strategy
+from pbrain import PiskvorkEngine
+
+
+def make_engine(spec="rule", size=10):
+    engine = PiskvorkEngine(create_strategy(spec))
+    assert engine.handle(f"START {size}") == ["OK"]
+    return engine
+
+
+def parse_move(response):
+    x, y = (int(v) for v in response.split(","))
+    return [y, x]
+
+
+def send_board(engine, stones):
+    """
+    stones为"x,y,field"列表
+    """
+    assert engine.handle("BOARD") == []
+    for stone in stones:
+        assert engine.handle(stone) == []
+    return engine.handle("DONE")
+
+
+def test_turn_and_takeback():
+    engine = make_engine()
+    assert engine.handle("TURN 4,5") != []
+    game = engine.game
+    assert game.history_actions[0] == [5, 4] and len(game.history_actions) == 2
+    own = game.history_actions[1]
+    assert engine.handle("TAKEBACK 4,5") == ["ERROR 只能撤销最后一步"]
+    assert engine.handle(f"TAKEBACK {own[1]},{own[0]}") == ["OK"]
+    assert engine.handle("TAKEBACK 4,5") == ["OK"] and game.history_actions == []
+    assert engine.handle("TURN 4,5") != [] and engine.handle("TURN 4,5")[0].startswith("ERROR")
+    assert engine.handle("TURN 10,0")[0].startswith("ERROR")
+
+
+@pytest.mark.parametrize("own_num, opp_num, ai_player", [(2, 2, 1), (2, 3, 2), (0, 0, 1)])
+def test_board_color(own_num, opp_num, ai_player):
+    """
+    双方棋子数相等时引擎执黑, 对方多一子时执白
+    """
+    engine = make_engine()
+    stones = [f"{i},0,1" for i in range(own_num)] + [f"{i},9,2" for i in range(opp_num)]
+    row, column = parse_move(send_board(engine, stones)[0])
+    game = engine.game
+    assert len(game.history_actions) == own_num + opp_num + 1
+    assert game.board.position[row][column] == ai_player
+    for i in range(own_num):
+        assert game.board.position[0][i] == ai_player
+    for i in range(opp_num):
+        assert game.board.position[9][i] == 3 - ai_player
+
+
+def test_board_errors():
+    engine = make_engine()
+    assert send_board(engine, ["0,0,1", "1,0,1"]) == ["ERROR 双方棋子数不合法"]
+    assert send_board(engine, ["0,0,1", "1,0,3"]) == ["ERROR 不支持连续对局(field为3)的棋子"]
+    assert send_board(engine, ["0,0", "1,0,2"]) == ["ERROR 无效的BOARD命令"]
+    assert send_board(engine, ["0,0,1", "10,0,2"]) == ["ERROR 无效的BOARD命令"]
+    assert send_board(engine, [f"{i},0,2" for i in range(5)] + [f"{i},9,1" for i in range(4)])[0].startswith("ERROR")
+    assert engine.handle("BEGIN") != []  # 出错后对局不受影响, 仍可继续
+
+
+def test_commands():
+    engine = PiskvorkEngine(create_strategy("random"))
+    assert engine.handle("BEGIN") == ["ERROR 需要先发送START"]
+    assert engine.handle("ABOUT") == [pbrain.ABOUT]
+    assert engine.handle("START 4") == [f"ERROR 只支持{pbrain.MIN_SIZE}-{pbrain.MAX_SIZE}路棋盘"]
+    assert engine.handle("START 15") == ["OK"]
+    assert engine.handle("   ") == [] and engine.handle("FOO") == ["UNKNOWN"]
+    assert engine.handle("BEGIN") != [] and len(engine.game.history_actions) == 1
+    assert engine.handle("RESTART") == ["OK"] and engine.game.history_actions == []
+    with pytest.raises(EOFError):
+        engine.handle("END")
+
+
+def test_think_time():
+    engine = make_engine("random")
+    assert engine.get_think_ms() == pbrain.TIMEOUT_TURN * (1 - pbrain.SAFETY_RATIO) - pbrain.SAFETY_MS
+    engine.handle("INFO timeout_turn 1000")
+    assert engine.get_think_ms() == 1000 * (1 - pbrain.SAFETY_RATIO) - pbrain.SAFETY_MS
+    engine.handle("INFO timeout_match 10000")
+    engine.handle("INFO time_left 5000")
+    assert engine.get_think_ms() == int(5000 / pbrain.MOVES_TO_GO * (1 - pbrain.SAFETY_RATIO) - pbrain.SAFETY_MS)
+    engine.handle("INFO time_left abc")  # 无效值忽略
+    assert engine.time_left == 5000
+    engine.handle("INFO timeout_turn 0")
+    assert engine.get_think_ms() == pbrain.MIN_THINK_MS
+    engine.handle("INFO timeout_match 0")
+    assert engine.time_left is None
+
+
+def test_main():
+    """
+    通过标准输入输出驱动引擎
+    """
+    commands = "START 10\nINFO timeout_turn 0\nBEGIN\nTURN 0,0\nABOUT\nEND\n"
+    result = subprocess.run([sys.executable, "pbrain.py", "random"], input=commands, capture_output=True,
+                            text=True, cwd=Path(__file__).parents[1], timeout=60)
+    lines = result.stdout.splitlines()
+    assert result.returncode == 0 and len(lines) == 4
+    assert lines[0] == "OK" and lines[3] == pbrain.ABOUT
+    assert parse_move(lines[1]) != parse_move(lines[2])
@@ -0,0 +1,77 @@
+"""
+record模块: 二进制棋谱的写入、读取和索引
+"""
+import os
+import random
+
+import pytest
+
+from record import RecordReader, RecordWriter, check_index, index_path
+from tests.helpers import random_game
+
+BOARD_SIZES = (6, 10, 15, 19)
+GAME_NUM = 5
+
+
+def write_games(path, games, buffer_size=4):
+    with RecordWriter(path, buffer_size=buffer_size) as writer:
+        for actions, result, board_size in games:
+            writer.write(actions, result, board_size)
+
+
+def make_games(seed=0):
+    rng = random.Random(seed)
+    return [random_game(board_size, rng) + (board_size,) for board_size in BOARD_SIZES for _ in range(GAME_NUM)]
+
+
+def test_record_round_trip(tmp_path):
+    """
+    二进制棋谱写入后顺序读取和按编号读取的结果与写入一致
+    """
+    games = make_games()
+    path = str(tmp_path / "games.bin")
+    write_games(path, games)
+    assert check_index(path)
+    with RecordReader(path) as reader:
+        assert len(reader) == len(games)
+        for (board_size, result, cells), (actions, expected_result, expected_size) in zip(reader, games):
+            assert (board_size, result) == (expected_size, expected_result)
+            assert [list(divmod(int(cell), board_size)) for cell in cells] == actions
+        for i, (actions, result, _) in enumerate(games):
+            assert reader.get_actions(i) == (actions, result)
+        cells = reader[0][2]
+    assert cells.tolist() == [row * games[0][2] + column for row, column in games[0][0]]  # 关闭后数组仍可用
+
+
+@pytest.mark.parametrize("damage", ["delete", "truncate"])
+def test_rebuild_index(tmp_path, damage):
+    """
+    索引文件缺失或被截断时, 读取方在内存中重建偏移量, 写入方追加前重建索引文件
+    """
+    games = make_games()
+    path = str(tmp_path / "games.bin")
+    write_games(path, games[:10])
+    idx = index_path(path)
+    if damage == "delete":
+        os.remove(idx)
+    else:
+        with open(idx, "r+b") as f:
+            f.truncate(8 * 3)
+    assert not check_index(path)
+    with RecordReader(path) as reader:
+        assert len(reader) == 10
+        assert reader.get_actions(9) == games[9][:2]
+    write_games(path, games[10:])
+    assert check_index(path)
+    with RecordReader(path) as reader:
+        assert len(reader) == len(games)
+        for i, (actions, result, _) in enumerate(games):
+            assert reader.get_actions(i) == (actions, result)
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / "games.bin")
+    RecordWriter(path).close()
+    assert check_index(path)
+    with RecordReader(path) as reader:
+        assert len(reader) == 0 and list(reader) == []
@@ -0,0 +1,190 @@
+"""
+对局服务器: 协议、错误处理、背压和AI失败时的回滚
+"""
+import asyncio
+import json
+
+import pytest
+
+from server import GameServer, RequestError
+
+AI = {"rule": "rule", "random": "random"}
+
+
+def run(game_server, tmp_path, client, start_workers=True):
+    """
+    在Unix套接字上启动服务器, 执行client(reader, writer)后关闭服务器, 返回client的结果
+    """
+
+    async def main():
+        if start_workers:
+            game_server.start_workers()
+            loop = asyncio.get_running_loop()
+            for executor in game_server.executors:  # 在建立连接前启动工作进程, 避免其继承客户端的套接字
+                await loop.run_in_executor(executor, int)
+        else:
+            game_server.pending = asyncio.Semaphore(game_server.max_pending)
+        path = str(tmp_path / "gobang.sock")
+        server = await asyncio.start_unix_server(game_server.handle_connection, path)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            try:
+                return await client(reader, writer)
+            finally:
+                writer.close()
+                await writer.wait_closed()
+                while game_server.connection_num:  # 等待服务器处理完连接断开
+                    await asyncio.sleep(0.01)
+        finally:
+            server.close()
+            await server.wait_closed()
+            game_server.shutdown()
+
+    return asyncio.run(main())
+
+
+def send(writer, **request):
+    writer.write(json.dumps(request).encode() + b"\n")
+
+
+async def recv(reader, timeout=10):
+    return json.loads(await asyncio.wait_for(reader.readline(), timeout))
+
+
+async def request(reader, writer, **request):
+    send(writer, **request)
+    await writer.drain()
+    return await recv(reader)
+
+
+def test_protocol(tmp_path):
+    game_server = GameServer(ai=AI, workers=1)
+    human_moves = []
+
+    async def client(reader, writer):
+        response = await request(reader, writer, id="a", op="new", ai="rule", board_size=9, ai_player=1)
+        assert response["ok"] and response["id"] == "a" and response["result"] is None
+        session = response["session"]
+        ai_moves = [response["ai_move"]]
+        cells = [[row, column] for row in range(9) for column in range(9)]
+        for _ in range(3):
+            move = next(cell for cell in cells if cell not in ai_moves and cell not in human_moves)
+            human_moves.append(move)
+            response = await request(reader, writer, op="move", session=session, move=move)
+            assert response["ok"] and "id" not in response
+            ai_moves.append(response["ai_move"])
+        game = game_server.sessions[session].game
+        assert game.history_actions == [action for pair in zip(ai_moves, human_moves) for action in pair] + \
+            ai_moves[-1:]
+        stats = await request(reader, writer, op="stats")
+        assert stats["sessions"] == 1 and stats["connections"] == 1 and stats["requests"]["move"] == 3
+        assert (await request(reader, writer, op="close", session=session))["ok"]
+        assert game_server.sessions == {} and game_server.worker_sessions == [0]
+
+    run(game_server, tmp_path, client)
+
+
+def test_errors(tmp_path):
+    game_server = GameServer(ai=AI, workers=1, max_sessions=1)
+
+    async def client(reader, writer):
+        errors = [
+            (await request(reader, writer, op="move", session=5, move=[0, 0]))["error"],
+            (await request(reader, writer, op="fly"))["error"],
+            (await request(reader, writer, op="new", ai="unknown"))["error"],
+            (await request(reader, writer, op="new", board_size=30))["error"],
+            (await request(reader, writer, op="new", ai_player=3))["error"],
+        ]
+        assert errors[:2] == ["对局不存在", "未知的op"]
+        writer.write(b"not json\n")
+        assert not (await recv(reader))["ok"]
+        session = (await request(reader, writer, op="new", ai="random"))["session"]
+        assert (await request(reader, writer, op="new", ai="random"))["error"] == "对局数已达上限"
+        for move in ([0], [0, 15], [0, "a"]):
+            assert not (await request(reader, writer, op="move", session=session, move=move))["ok"]
+        stats = await request(reader, writer, op="stats")
+        assert stats["errors"]["invalid"] == 2 and stats["errors"]["new"] == 4 and stats["errors"]["move"] == 4
+
+    run(game_server, tmp_path, client)
+    assert game_server.sessions == {}  # 连接断开时关闭其对局
+
+
+def test_rollback(tmp_path):
+    """
+    AI计算失败时撤销人类的落子, 之后可以重新落子
+    """
+    game_server = GameServer(ai=AI, workers=1)
+    fail = [True]
+
+    async def ai_move(session):
+        if fail[0]:
+            raise RuntimeError("engine failed")
+        session.game.proceed([0, 0])
+        return [0, 0], 0
+
+    game_server.ai_move = ai_move
+
+    async def client(reader, writer):
+        session = (await request(reader, writer, op="new", ai="random"))["session"]
+        game = game_server.sessions[session].game
+        response = await request(reader, writer, op="move", session=session, move=[4, 4])
+        assert response == {"ok": False, "error": "RuntimeError: engine failed"}
+        assert game.history_actions == [] and game.board.position[4][4] == 0 and game.cur_player == 1
+        fail[0] = False
+        response = await request(reader, writer, op="move", session=session, move=[4, 4])
+        assert response["ok"] and response["ai_move"] == [0, 0]
+        assert game.history_actions == [[4, 4], [0, 0]]
+
+    run(game_server, tmp_path, client, start_workers=False)
+
+
+@pytest.mark.parametrize("max_inflight", [1, 2])
+def test_backpressure(tmp_path, max_inflight):
+    """
+    达到max_inflight后不再读取该连接的请求, 直到有请求处理完
+    """
+    game_server = GameServer(ai=AI, workers=1, max_inflight=max_inflight)
+    release = None
+
+    async def ai_move(session):
+        await release.wait()
+        session.game.proceed([0, 0])
+        return [0, 0], 0
+
+    game_server.ai_move = ai_move
+
+    async def client(reader, writer):
+        nonlocal release
+        release = asyncio.Event()
+        session = (await request(reader, writer, op="new", ai="random"))["session"]
+        send(writer, id=1, op="move", session=session, move=[4, 4])
+        send(writer, id=2, op="stats")
+        await writer.drain()
+        if max_inflight == 1:
+            with pytest.raises(asyncio.TimeoutError):
+                await recv(reader, timeout=0.2)
+            release.set()
+            assert [(await recv(reader))["id"] for _ in range(2)] == [1, 2]
+        else:
+            stats = await recv(reader)
+            assert stats["id"] == 2 and stats["requests"] == {"new": 1}
+            release.set()
+            assert (await recv(reader))["id"] == 1
+
+    run(game_server, tmp_path, client, start_workers=False)
+
+
+def test_ai_first_failure_closes_session(tmp_path):
+    game_server = GameServer(ai=AI, workers=1)
+
+    async def ai_move(session):
+        raise RequestError("engine failed")
+
+    game_server.ai_move = ai_move
+
+    async def client(reader, writer):
+        response = await request(reader, writer, op="new", ai="random", ai_player=1)
+        assert response == {"ok": False, "error": "engine failed"}
+        assert game_server.sessions == {} and game_server.worker_sessions == [0]
+
+    run(game_server, tmp_path, client, start_workers=False)
@@ -0,0 +1,69 @@
+"""
+RandomStrategy和RuleStrategy
+"""
+import random
+
+from ai_strategy.random_strategy import RandomStrategy
+from ai_strategy.rule_strategy import RuleStrategy
+from gobang import GoBangBoard, GoBangGame
+from tests.helpers import random_game
+
+
+def test_incremental_candidates():
+    """
+    随机模型增量维护的候选落点与重建棋盘统计的一致, 包括悔棋和换局
+    """
+    rng = random.Random(0)
+    for use_history in (True, False):
+        strategy = RandomStrategy()
+        for _ in range(3):
+            actions, _ = random_game(10, rng, max_moves=30)
+            game = GoBangGame(10, verbose=False)
+            for i, action in enumerate(actions):
+                game.proceed(action)
+                if i % 7 == 6:
+                    game.undo()
+                    game.proceed(action)
+                history = game.history_actions if use_history else None
+                candidates = strategy.sync_board(game.board.position, history)
+                expected = GoBangBoard.from_position(game.board.position).get_candidates()
+                assert sorted(candidates) == sorted(expected)
+                if i == 10:
+                    game.undo()
+                    game.undo()
+                    candidates = strategy.sync_board(game.board.position, game.history_actions if use_history else None)
+                    assert sorted(candidates) == sorted(GoBangBoard.from_position(game.board.position).get_candidates())
+                    game.proceed(actions[i - 1])
+                    game.proceed(action)
+            if game.result is None:
+                row, column = strategy.model(game.board.position, game.cur_player, game.history_actions)
+                assert game.board.position[row][column] == 0
+
+
+def rule_move(moves_black, moves_white, ai_player, board_size=10):
+    position = [[0] * board_size for _ in range(board_size)]
+    for row, column in moves_black:
+        position[row][column] = 1
+    for row, column in moves_white:
+        position[row][column] = 2
+    strategy = RuleStrategy()
+    return tuple(strategy.model(position, ai_player))
+
+
+def test_rule_five():
+    # 我方跳四, 补上空位成五; 优先于堵对手的四
+    black = [(5, 1), (5, 2), (5, 4), (5, 5)]
+    white = [(0, 0), (0, 1), (0, 2), (0, 3)]
+    assert rule_move(black, white, 1) == (5, 3)
+    assert rule_move(black, white[:3] + [(9, 9)], 2) == (5, 3)  # 对手可成五, 堵住
+
+
+def test_rule_open_four():
+    # 我方活三延伸为活四
+    black = [(5, 3), (5, 4), (5, 5)]
+    white = [(0, 0), (9, 9), (0, 9)]
+    assert rule_move(black, white, 1) in {(5, 2), (5, 6)}
+    # 对手跳三, 堵住可成活四的位置
+    white = [(5, 3), (5, 4), (5, 6)]
+    black = [(0, 0), (9, 9), (0, 9)]
+    assert rule_move(black, white, 1) == (5, 5)
@@ -0,0 +1,88 @@
+"""
+ThreatSearch: 成五、活四、VCF和VCT
+"""
+import random
+import time
+
+import pytest
+
+from ai_strategy.fast_board import FastBoard
+from ai_strategy.threat_search import ThreatSearch
+from gobang import GoBangBoard
+from tests.helpers import random_game
+
+
+def make_board(black, white, board_size=10):
+    board = FastBoard(board_size, board_size)
+    for point in black:
+        board.put(1, point)
+    for point in white:
+        board.put(2, point)
+    return board
+
+
+def solve(black, white, player, **kwargs):
+    board = make_board(black, white)
+    expected = GoBangBoard.from_position([list(line) for line in board.position])
+    res = ThreatSearch(**kwargs).solve(board, player)
+    assert board.position == expected.position and board.hash == expected.hash  # 搜索后恢复局面
+    return res
+
+
+def test_five_and_block():
+    black = [(4, 1), (4, 2), (4, 3), (4, 4)]
+    white = [(4, 0), (9, 9), (9, 8), (9, 7)]
+    assert solve(black, white, 1) == ((4, 5), "five")
+    assert solve(black, white, 2) == ((4, 5), "block")
+
+
+def test_open_four():
+    assert solve([(4, 2), (4, 3), (4, 4)], [(9, 9), (9, 8), (0, 9)], 1) == ((4, 1), "open_four")
+
+
+# 黑方在(4, 4)落子形成双冲四
+DOUBLE_FOUR_BLACK = [(4, 1), (4, 2), (4, 3), (1, 4), (2, 4), (3, 4)]
+DOUBLE_FOUR_WHITE = [(4, 0), (0, 4), (9, 9), (9, 8), (8, 9), (0, 9)]
+
+
+def test_vcf():
+    assert solve(DOUBLE_FOUR_BLACK, DOUBLE_FOUR_WHITE, 1) == ((4, 4), "vcf")
+
+
+def test_block_vcf():
+    point, kind = solve(DOUBLE_FOUR_BLACK, DOUBLE_FOUR_WHITE, 2)
+    assert kind == "block_vcf" and point == (4, 4)
+
+
+def test_vct():
+    # 黑方在(4, 4)落子形成双活三
+    black = [(4, 2), (4, 3), (2, 4), (3, 4)]
+    white = [(9, 9), (9, 0), (0, 9), (0, 0)]
+    point, kind = solve(black, white, 1)
+    assert kind == "vct" and point == (4, 4)
+    assert solve(black, white, 1, vct_depth=0) == (None, None)
+
+
+def test_vcf_only():
+    board = make_board(DOUBLE_FOUR_BLACK, DOUBLE_FOUR_WHITE)
+    assert board.get_point(ThreatSearch().vcf(board, 1, 64)) == (4, 4)
+    assert ThreatSearch().vcf(board, 2, 64) is None
+
+
+def test_deadline():
+    """
+    截止时刻已过时尽快返回, 局面恢复
+    """
+    rng = random.Random(0)
+    for _ in range(10):
+        actions, _ = random_game(15, rng, max_moves=40)
+        board = FastBoard(15, 15)
+        for i, action in enumerate(actions):
+            board.put(1 if i % 2 == 0 else 2, action)
+        if board.win:
+            continue
+        position = [list(line) for line in board.position]
+        start = time.perf_counter()
+        ThreatSearch(node_limit=10 ** 6, time_ms=10 ** 6).solve(board, 1, deadline=start)
+        assert time.perf_counter() - start < 0.05
+        assert board.position == position
@@ -1,8 +1,11 @@
 import random
-import time
+import threading
+import traceback
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
 
+from ai_strategy.alpha_beta_strategy import AlphaBetaStrategy
 from ai_strategy.mcts_strategy import MCTSStrategy
 from ai_strategy.random_strategy import RandomStrategy
 from ai_strategy.rule_strategy import RuleStrategy
@@ -10,6 +13,7 @@ from gobang import BOARD_SIZE, GoBangGame
 
 PADDING = 30  # 棋盘边距
 GRID_SIZE = 20  # 每个格子的大小
+POLL_MS = 20  # 轮询AI计算结果的间隔(毫秒)
 
 AI = "mcts"
 if AI == "random":
@@ -18,11 +22,18 @@ elif AI == "rule":
     ai_strategy = RuleStrategy()
 elif AI == "mcts":
     ai_strategy = MCTSStrategy()
+elif AI == "alphabeta":
+    ai_strategy = AlphaBetaStrategy()
 else:
     ai_strategy = None
 
 
 class GoBangUI:
+    """
+    五子棋界面
+    AI的计算(model, ponder, reset)都提交到单线程的后台执行器中按顺序执行, 界面线程通过window.after轮询结果,
+    AI思考期间界面保持响应, 忽略棋盘点击
+    """
     window = None
     game_frame = None
     canvas = None
@@ -32,15 +43,23 @@ class GoBangUI:
     human_player = None
     ai_player = None
 
-    def __init__(self, play_mode="pvp", ai_strategy=None):
+    def __init__(self, play_mode="pvp", ai_strategy=None, board_size=BOARD_SIZE, ponder=False):
         """
 
         Args:
             play_mode: pvp和pve
             ai_strategy: 如果是pve, 需要传入一个ai_strategy
+            board_size: 棋盘边长
+            ponder: 是否在人类思考时让AI后台思考(AIStrategy.ponder)
         """
         self.play_mode = play_mode
         self.ai_strategy = ai_strategy
+        self.board_size = board_size
+        self.ponder = ponder
+        self.executor = ThreadPoolExecutor(max_workers=1)  # AI计算的后台线程
+        self.ai_thinking = False
+        self.ponder_event = None  # 正在进行的后台思考的停止信号
+        self.game_id = 0  # 对局编号, 用于丢弃上一局的AI结果
         self.create_window()
         self.create_canvas()
         self.create_label()
@@ -51,37 +70,38 @@ class GoBangUI:
         self.window = tk.Tk()  # 声明窗口
         self.window.title("五子棋")  # 声明窗口标题
         # 根据棋盘格子计算得到窗口的适宜宽高
-        self.window.geometry(
-            str(BOARD_SIZE * GRID_SIZE + PADDING * 2) + "x" + str(BOARD_SIZE * GRID_SIZE + PADDING * 2 + 40))
+        length = self.board_size * GRID_SIZE + PADDING * 2
+        self.window.geometry(str(length) + "x" + str(length + 40))
         self.window.configure(bg='burlywood')  # 设置窗口背景颜色
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
 
         # 创建游戏页面
         self.game_frame = tk.Frame(self.window)
 
     def create_canvas(self):
-        self.canvas = tk.Canvas(self.game_frame, width=BOARD_SIZE * GRID_SIZE + PADDING * 2,
-                                height=BOARD_SIZE * GRID_SIZE + PADDING * 2,
+        self.canvas = tk.Canvas(self.game_frame, width=self.board_size * GRID_SIZE + PADDING * 2,
+                                height=self.board_size * GRID_SIZE + PADDING * 2,
                                 bg="burlywood")
 
         self.canvas.pack(pady=PADDING)
         # 绘制棋盘线
-        for i in range(BOARD_SIZE):
-            self.canvas.create_line(PADDING, i * GRID_SIZE + PADDING, BOARD_SIZE * GRID_SIZE + PADDING - GRID_SIZE,
-                                    i * GRID_SIZE + PADDING)
-        for i in range(BOARD_SIZE):
+        for i in range(self.board_size):
+            self.canvas.create_line(PADDING, i * GRID_SIZE + PADDING,
+                                    self.board_size * GRID_SIZE + PADDING - GRID_SIZE, i * GRID_SIZE + PADDING)
+        for i in range(self.board_size):
             self.canvas.create_line(i * GRID_SIZE + PADDING, PADDING, i * GRID_SIZE + PADDING,
-                                    BOARD_SIZE * GRID_SIZE + PADDING - GRID_SIZE)
+                                    self.board_size * GRID_SIZE + PADDING - GRID_SIZE)
 
         # 绘制棋盘上的黑点
-        for i in range(3, BOARD_SIZE, 6):
-            for j in range(3, BOARD_SIZE, 6):
+        for i in range(3, self.board_size, 6):
+            for j in range(3, self.board_size, 6):
                 self.canvas.create_oval(j * GRID_SIZE + PADDING - 3, i * GRID_SIZE + PADDING - 3,
                                         j * GRID_SIZE + PADDING + 3, i * GRID_SIZE + PADDING + 3, fill="black")
         self.canvas.bind("<Button-1>", self.on_click)  # 左键点击
 
     def create_label(self):
         self.label = tk.Label(self.window, text="黑子回合", font=("宋体", 14))
-        self.label.place(x=PADDING, y=PADDING * 2 + BOARD_SIZE * GRID_SIZE + 10)
+        self.label.place(x=PADDING, y=PADDING * 2 + self.board_size * GRID_SIZE + 10)
 
     def pack(self):
         self.game_frame.pack()
@@ -101,9 +121,51 @@ class GoBangUI:
         self.g.proceed([row, col])
 
     def ai_put(self):
-        time.sleep(0.2)
-        row, col = self.ai_strategy.model(self.g.board.position, self.ai_player)
+        """
+        在后台线程中计算AI的落子, 界面线程轮询结果
+        """
+        self.stop_ponder()
+        self.ai_thinking = True
+        position = [row[:] for row in self.g.board.position]
+        history_actions = [list(action) for action in self.g.history_actions]
+        future = self.executor.submit(self.ai_strategy.model, position, self.ai_player,
+                                      history_actions=history_actions)
+        self.window.after(POLL_MS, self.poll_ai, future, self.game_id)
+
+    def poll_ai(self, future, game_id):
+        if not future.done():
+            self.window.after(POLL_MS, self.poll_ai, future, game_id)
+            return
+        if game_id != self.game_id:  # 已开始新的一局
+            return
+        self.ai_thinking = False
+        try:
+            row, col = future.result()
+        except Exception as e:  # AI出错时打印错误, 重置AI并开始新的一局, 避免棋盘一直锁定
+            traceback.print_exc()
+            messagebox.showerror("AI出错", f"{type(e).__name__}: {e}")
+            self.reset_canvas()
+            self.executor.submit(self.ai_strategy.reset)
+            self.start_new_game()
+            return
         self.put(row, col)
+        if self.g.result is not None:
+            self.end_game()
+        elif self.ponder:
+            self.start_ponder()
+
+    def start_ponder(self):
+        self.ponder_event = threading.Event()
+        position = [row[:] for row in self.g.board.position]
+        self.executor.submit(self.ai_strategy.ponder, position, self.ai_player, self.ponder_event)
+
+    def stop_ponder(self):
+        """
+        通知后台思考停止, 不等待. 之后提交的任务在后台思考返回后才执行
+        """
+        if self.ponder_event is not None:
+            self.ponder_event.set()
+            self.ponder_event = None
 
     def reset_canvas(self):
         for id in self.id_list:
@@ -112,9 +174,11 @@ class GoBangUI:
 
     def on_click(self, event):
         # 处理鼠标点击事件
+        if self.ai_thinking:
+            return
         row = round((event.y - PADDING) / GRID_SIZE)  # 计算点击位置的行
         col = round((event.x - PADDING) / GRID_SIZE)  # 计算点击位置的列
-        if row < 0 or row >= BOARD_SIZE or col < 0 or col >= BOARD_SIZE:
+        if row < 0 or row >= self.board_size or col < 0 or col >= self.board_size:
             # 落子在棋盘外侧
             messagebox.showinfo("提示", "不可以在棋盘外落子！")
             return
@@ -124,27 +188,39 @@ class GoBangUI:
             return
 
         self.put(row, col)
-        if self.g.result is None:
-            if self.play_mode == "pve":
-                self.ai_put()
         if self.g.result is not None:
-            if self.g.result == 1:
-                messagebox.showinfo("游戏结束", "黑子获胜")
-            elif self.g.result == 2:
-                messagebox.showinfo("游戏结束", "白子获胜")
-            else:
-                messagebox.showinfo("游戏结束", "和棋")
-            # window.quit()
-            time.sleep(1)
-            self.reset_canvas()
-            ai_strategy.reset()
-            self.start_new_game()
+            self.end_game()
+        elif self.play_mode == "pve":
+            self.ai_put()
+
+    def end_game(self):
+        if self.g.result == 1:
+            messagebox.showinfo("游戏结束", "黑子获胜")
+        elif self.g.result == 2:
+            messagebox.showinfo("游戏结束", "白子获胜")
+        else:
+            messagebox.showinfo("游戏结束", "和棋")
+        self.reset_canvas()
+        self.stop_ponder()
+        if self.ai_strategy is not None:
+            self.executor.submit(self.ai_strategy.reset)
+        self.start_new_game()
 
     def start_new_game(self):
+        self.game_id += 1
+        self.ai_thinking = False
+        self.label.config(text="黑子回合")
         if self.play_mode == "pve":
             self.human_player = random.choice([1, 2])
             self.ai_player = 2 if self.human_player == 1 else 1
-        self.g = GoBangGame()
+        self.g = GoBangGame(self.board_size)
+        if self.play_mode == "pve" and self.ai_player == 1:
+            self.ai_put()
+
+    def close(self):
+        self.stop_ponder()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
 
     def run(self):
         self.start_new_game()
@@ -156,5 +232,5 @@ if __name__ == '__main__':
     g = GoBangUI()
     g.run()
     # PVE
-    g = GoBangUI("pve", ai_strategy)
+    g = GoBangUI("pve", ai_strategy, ponder=True)
     g.run()